@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+"""
+Measures how long the query services take the first time a scan touches the shop, compared to a second pass.
+Restart the interface with _prewarm:=true and _prewarm:=false to compare both.
+
+$ rosrun refills_perception_interface benchmark_first_scan.py
+"""
+from __future__ import division, print_function
+
+from time import time
+
+import rospy
+from refills_msgs.srv import QueryShelfSystems, QueryShelfSystemsRequest, QueryShelfLayers, QueryShelfLayersRequest, \
+    QueryFacings, QueryFacingsRequest, QueryDetectShelfLayersPath, QueryDetectShelfLayersPathRequest, \
+    QueryDetectFacingsPath, QueryDetectFacingsPathRequest
+
+InterfaceNodeName = 'perception_interface'
+
+
+def scan(query_shelf_systems, query_shelf_layers, query_facings, query_detect_shelf_layers_path,
+         query_detect_facings_path):
+    """
+    Calls the query services in the order of a full shop scan.
+    :return: number of calls
+    :rtype: int
+    """
+    calls = 1
+    for shelf_system_id in query_shelf_systems.call(QueryShelfSystemsRequest()).ids:
+        query_detect_shelf_layers_path.call(QueryDetectShelfLayersPathRequest(id=shelf_system_id))
+        calls += 2
+        for shelf_layer_id in query_shelf_layers.call(QueryShelfLayersRequest(id=shelf_system_id)).ids:
+            query_detect_facings_path.call(QueryDetectFacingsPathRequest(id=shelf_layer_id))
+            query_facings.call(QueryFacingsRequest(id=shelf_layer_id))
+            calls += 2
+    return calls
+
+
+if __name__ == u'__main__':
+    rospy.init_node('benchmark_first_scan')
+    rospy.wait_for_service(InterfaceNodeName + '/query_shelf_systems')
+    services = [rospy.ServiceProxy(InterfaceNodeName + '/query_shelf_systems', QueryShelfSystems),
+                rospy.ServiceProxy(InterfaceNodeName + '/query_shelf_layers', QueryShelfLayers),
+                rospy.ServiceProxy(InterfaceNodeName + '/query_facings', QueryFacings),
+                rospy.ServiceProxy(InterfaceNodeName + '/query_detect_shelf_layers_path', QueryDetectShelfLayersPath),
+                rospy.ServiceProxy(InterfaceNodeName + '/query_detect_facings_path', QueryDetectFacingsPath)]
+    for name in ['first scan', 'second scan']:
+        t = time()
+        calls = scan(*services)
+        elapsed = time() - t
+        print('{}: {} calls in {:.3f}s, {:.2f}ms per call'.format(name, calls, elapsed, elapsed / calls * 1000))
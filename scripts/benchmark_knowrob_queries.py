@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""
+Benchmarks KnowRob.all_solutions, not the ROS query services: measures the throughput of read only queries,
+while more and more threads run them at the same time. The queries skip the cache, such that every call takes
+the read lock and a session of the prolog pool. Compare different pool sizes with _prolog_pool_size.
+The script creates its own KnowRob wrapper, which needs the same environment as the perception interface,
+e.g. KnowRob and the /visualization_marker_array service, unless it runs with _fake_prolog:=true.
+
+$ rosrun refills_perception_interface benchmark_knowrob_queries.py _concurrency:=[1,2,4,8,16] _duration:=10 \
+    _prolog_pool_size:=4
+"""
+from __future__ import division, print_function
+
+from threading import Thread
+from time import time
+
+import rospy
+
+from refills_perception_interface.knowrob_wrapper import KnowRob, SHELF_SYSTEM, SHELF_FLOOR
+
+
+def make_queries(knowrob):
+    """
+    :type knowrob: KnowRob
+    :return: read only queries that touch the whole shop and one shelf layer
+    :rtype: list
+    """
+    queries = ['findall(S, instance_of(S, {}), Ss).'.format(SHELF_SYSTEM),
+               'findall([S, Floor], (instance_of(S, {}), triple(S, dul:hasComponent, Floor), '
+               'instance_of(Floor, {})), Fs).'.format(SHELF_SYSTEM, SHELF_FLOOR)]
+    floors = knowrob.once('findall(Floor, instance_of(Floor, {}), Fs).'.format(SHELF_FLOOR), read_only=True,
+                          cache=False)
+    if floors and floors['Fs']:
+        queries.append('findall([F, P], (shelf_facing(\'{}\', F), is_at(F, P)), Fs).'.format(floors['Fs'][0]))
+    return queries
+
+
+def client(knowrob, queries, deadline, latencies):
+    i = 0
+    while time() < deadline and not rospy.is_shutdown():
+        t = time()
+        knowrob.all_solutions(queries[i % len(queries)], read_only=True, cache=False)
+        latencies.append(time() - t)
+        i += 1
+
+
+def benchmark(knowrob, queries, concurrency, duration):
+    """
+    :param concurrency: number of threads running queries in parallel
+    :type concurrency: int
+    :param duration: in seconds
+    :type duration: float
+    :return: queries per second, mean latency in seconds
+    :rtype: tuple
+    """
+    latencies = []
+    deadline = time() + duration
+    clients = [Thread(target=client, args=(knowrob, queries, deadline, latencies)) for _ in range(concurrency)]
+    start = time()
+    for c in clients:
+        c.start()
+    for c in clients:
+        c.join()
+    elapsed = time() - start
+    if not latencies:
+        return 0, float('nan')
+    return len(latencies) / elapsed, sum(latencies) / len(latencies)
+
+
+if __name__ == u'__main__':
+    rospy.init_node('benchmark_knowrob_queries')
+    concurrency_levels = rospy.get_param('~concurrency', [1, 2, 4, 8, 16])
+    duration = rospy.get_param('~duration', 10.0)
+    knowrob = KnowRob()
+    queries = make_queries(knowrob)
+    print('prolog pool size: {}'.format(rospy.get_param('~prolog_pool_size', 4)))
+    print('{:>12} {:>12} {:>16}'.format('concurrency', 'queries/s', 'mean latency ms'))
+    for concurrency in concurrency_levels:
+        queries_per_sec, mean_latency = benchmark(knowrob, queries, concurrency, duration)
+        print('{:>12} {:>12.1f} {:>16.2f}'.format(concurrency, queries_per_sec, mean_latency * 1000))
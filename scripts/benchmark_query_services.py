@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+"""
+Measures the throughput of the query services of a running perception interface,
+while more and more clients call them at the same time.
+The services answer from the shop topology, to measure the prolog pool and the read lock use
+benchmark_knowrob_queries.py.
+
+$ rosrun refills_perception_interface benchmark_query_services.py _concurrency:=[1,2,4,8,16] _duration:=10
+"""
+from __future__ import division, print_function
+
+from threading import Thread
+from time import time
+
+import rospy
+from refills_msgs.srv import QueryShelfSystems, QueryShelfSystemsRequest, QueryShelfLayers, QueryShelfLayersRequest, \
+    QueryFacings, QueryFacingsRequest
+
+InterfaceNodeName = 'perception_interface'
+
+
+def make_calls():
+    """
+    :return: list of functions, each calls one query service with valid arguments
+    :rtype: list
+    """
+    rospy.wait_for_service(InterfaceNodeName + '/query_shelf_systems')
+    query_shelf_systems = rospy.ServiceProxy(InterfaceNodeName + '/query_shelf_systems', QueryShelfSystems)
+    query_shelf_layers = rospy.ServiceProxy(InterfaceNodeName + '/query_shelf_layers', QueryShelfLayers)
+    query_facings = rospy.ServiceProxy(InterfaceNodeName + '/query_facings', QueryFacings)
+
+    calls = [lambda: query_shelf_systems.call(QueryShelfSystemsRequest())]
+    shelf_system_ids = query_shelf_systems.call(QueryShelfSystemsRequest()).ids
+    if shelf_system_ids:
+        shelf_system_id = shelf_system_ids[0]
+        calls.append(lambda: query_shelf_layers.call(QueryShelfLayersRequest(id=shelf_system_id)))
+        shelf_layer_ids = query_shelf_layers.call(QueryShelfLayersRequest(id=shelf_system_id)).ids
+        if shelf_layer_ids:
+            shelf_layer_id = shelf_layer_ids[0]
+            calls.append(lambda: query_facings.call(QueryFacingsRequest(id=shelf_layer_id)))
+    return calls
+
+
+def client(calls, deadline, latencies):
+    i = 0
+    while time() < deadline and not rospy.is_shutdown():
+        t = time()
+        calls[i % len(calls)]()
+        latencies.append(time() - t)
+        i += 1
+
+
+def benchmark(concurrency, duration):
+    """
+    :param concurrency: number of clients calling the services in parallel
+    :type concurrency: int
+    :param duration: in seconds
+    :type duration: float
+    :return: calls per second, mean latency in seconds
+    :rtype: tuple
+    """
+    latencies = []
+    deadline = time() + duration
+    # every client gets its own connections
+    clients = [Thread(target=client, args=(make_calls(), deadline, latencies)) for _ in range(concurrency)]
+    start = time()
+    for c in clients:
+        c.start()
+    for c in clients:
+        c.join()
+    elapsed = time() - start
+    if not latencies:
+        return 0, float('nan')
+    return len(latencies) / elapsed, sum(latencies) / len(latencies)
+
+
+if __name__ == u'__main__':
+    rospy.init_node('benchmark_query_services')
+    concurrency_levels = rospy.get_param('~concurrency', [1, 2, 4, 8, 16])
+    duration = rospy.get_param('~duration', 10.0)
+    print('{:>12} {:>12} {:>16}'.format('concurrency', 'calls/s', 'mean latency ms'))
+    for concurrency in concurrency_levels:
+        calls_per_sec, mean_latency = benchmark(concurrency, duration)
+        print('{:>12} {:>12.1f} {:>16.2f}'.format(concurrency, calls_per_sec, mean_latency * 1000))
@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 from __future__ import division
 import functools
+from time import time
 import py_trees
 import rospy
 from refills_msgs.msg import DetectShelfLayersAction, DetectFacingsAction, CountProductsAction
@@ -103,8 +104,9 @@ if __name__ == u'__main__':
         tree_tick_rate = 2000
     else:
         tree_tick_rate = 20
+    start = time()
     tree = grow_tree(debug)
-    print('interface running')
+    print('interface running, startup took {:.3f}s'.format(time() - start))
     while not rospy.is_shutdown():
         try:
             tree.tick()
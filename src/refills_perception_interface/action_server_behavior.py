@@ -1,12 +1,14 @@
 import traceback
 from Queue import Empty, Queue
 from multiprocessing import Lock
+from threading import current_thread
 
 from actionlib import SimpleActionServer
 from refills_msgs.msg import DetectShelfLayersResult
 from py_trees import Blackboard, Status
 
 from refills_perception_interface.MyBehavior import MyBahaviour
+from refills_perception_interface.knowrob_wrapper import QueryCancelled
 from refills_perception_interface.utils import TimeoutLock, print_with_prefix
 
 
@@ -20,12 +22,20 @@ class ActionServerHandler(object):
         self.lock = Blackboard().lock
         self.action_name = action_name
         self.cancel_next_goal = False
+        # handlers are created during the setup of the tree, in the thread that ticks it
+        self.tree_thread = current_thread()
         self._as = SimpleActionServer(action_name, action_type, execute_cb=self.execute_cb, auto_start=False)
         self._as.register_preempt_callback(self.cancel_cb)
         self._as.start()
 
     def cancel_cb(self):
         self.cancel_next_goal = self._as.is_new_goal_available()
+        # a behavior that is stuck in a query would not notice the preempt until the query is done
+        Blackboard().knowrob.cancel_queries(self.tree_thread)
+        # same for async RoboSherlock calls, like count_product_async, that query KnowRob
+        worker_thread = Blackboard().robosherlock.get_worker_thread()
+        if worker_thread is not None:
+            Blackboard().knowrob.cancel_queries(worker_thread)
 
     def execute_cb(self, goal):
         """
@@ -144,6 +154,15 @@ class PerceptionBehavior(ActionServerBehavior):
         """
         pass
 
+    def perception_done(self):
+        """
+        Called on every tick while the perception is running, for perceptions that finish on their own,
+        e.g. because they wait for a RoboSherlockFuture.
+        :return: True if stop_perception should be called
+        :rtype: bool
+        """
+        return False
+
     def is_finished(self):
         """
         :rtype: bool
@@ -193,6 +212,16 @@ class PerceptionBehavior(ActionServerBehavior):
                         self.feedback_message = 'finished immediately'
                         self.get_as().send_result(result)
                         self.set_my_state(Status.SUCCESS)
+            elif self.get_my_state() == Status.RUNNING and self.perception_done():
+                result = self.__stop_perception(False)
+                if result.error != 0:
+                    self.feedback_message = 'something went wrong'
+                    self.get_as().send_aborted(result)
+                    self.set_my_state(Status.FAILURE)
+                else:
+                    self.feedback_message = 'finished'
+                    self.get_as().send_result(result)
+                    self.set_my_state(Status.SUCCESS)
             elif self.is_finished():
                 self.feedback_message = 'finished'
                 self.get_as().send_result(self.__stop_perception(False))
@@ -201,6 +230,13 @@ class PerceptionBehavior(ActionServerBehavior):
                 self.feedback_message = 'canceled'
                 self.__canceled()
                 self.set_my_state(Status.FAILURE)
+        except QueryCancelled as e:
+            print_with_prefix(str(e), self.prefix)
+            if self.get_as().is_preempt_requested():
+                self.get_as().send_preempted()
+            else:
+                self.get_as().send_aborted()
+            self.set_my_state(Status.FAILURE)
         except Exception as e:
             traceback.print_exc()
             self.get_as().send_aborted()
@@ -19,6 +19,7 @@ from visualization_msgs.msg import Marker, MarkerArray
 from rospkg import RosPack
 
 from refills_perception_interface.knowrob_wrapper import KnowRob
+from refills_perception_interface.pose_aggregation import inlier_mask, poses_to_array
 from refills_perception_interface.tfwrapper import transform_pose, lookup_transform
 
 MAP = 'map'
@@ -74,13 +75,13 @@ class BarcodeDetector(object):
 
     def cluster(self):
         """
-        Replaces the list of poses where a barcode was seen with its average
+        Replaces the list of poses where a barcode was seen with its average, without outliers
         """
         barcodes = OrderedDict()
         for barcode, poses in sorted(self.barcodes.items(), key=lambda x: -len(x[1])):
             if len(poses) > 3: # FIXME magic number to expose
-                positions = [[p.pose.position.x, p.pose.position.y, p.pose.position.z] for p in poses]
-                position = np.mean(positions, axis=0)
+                positions = poses_to_array(poses)[:, :3]
+                position = positions[inlier_mask(positions)].mean(axis=0)
                 p = PoseStamped()
                 p.header.frame_id = 'map'
                 p.pose.position = Point(*position)
@@ -0,0 +1,134 @@
+import os
+import shutil
+from collections import deque
+from threading import Thread, Event
+from time import time, strftime
+
+from Queue import Queue
+
+from refills_perception_interface.utils import print_with_prefix
+
+CHECKPOINT_PREFIX = 'checkpoint_'
+
+
+class SaveJob(object):
+    def __init__(self, path, is_checkpoint=False):
+        self.path = path
+        self.is_checkpoint = is_checkpoint
+        self.success = None
+        self.duration = None
+        self.done = Event()
+
+    def wait(self, timeout=None):
+        """
+        :param timeout: in seconds, None waits forever
+        :type timeout: float
+        :return: whether the belief state was saved, None if the job is not done yet
+        :rtype: bool
+        """
+        self.done.wait(timeout)
+        return self.success
+
+
+class BeliefStatePersister(object):
+    """
+    Saves the belief state on a worker thread, one job after the other, such that callers don't have to wait
+    for the dump. Checkpoints are saved to numbered directories in checkpoint_dir, only the newest
+    max_checkpoints of them are kept.
+    """
+    prefix = 'beliefstate_persister'
+
+    def __init__(self, save, checkpoint_dir, max_checkpoints=5):
+        """
+        :param save: dumps the belief state to a path and returns whether that worked, e.g. KnowRob.memorize
+        :param checkpoint_dir: has to be on the same machine as KnowRob, otherwise old checkpoints are not removed
+        :type checkpoint_dir: str
+        :type max_checkpoints: int
+        """
+        self.save_fn = save
+        self.checkpoint_dir = checkpoint_dir
+        self.max_checkpoints = max_checkpoints
+        self.checkpoints = deque(self.find_checkpoints())
+        self.pending_checkpoint = None
+        self.next_checkpoint_id = 0
+        if self.checkpoints:
+            self.next_checkpoint_id = int(os.path.basename(self.checkpoints[-1]).split('_')[1]) + 1
+        self.jobs = Queue()
+        self.thread = Thread(target=self.run, name='beliefstate_persister')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def find_checkpoints(self):
+        """
+        :return: paths of existing checkpoints, oldest first
+        :rtype: list
+        """
+        if not os.path.isdir(self.checkpoint_dir):
+            return []
+        names = [name for name in os.listdir(self.checkpoint_dir) if name.startswith(CHECKPOINT_PREFIX)]
+        names.sort(key=lambda name: int(name.split('_')[1]))
+        return [os.path.join(self.checkpoint_dir, name) for name in names]
+
+    def save(self, path):
+        """
+        :type path: str
+        :rtype: SaveJob
+        """
+        job = SaveJob(path)
+        self.jobs.put(job)
+        return job
+
+    def checkpoint(self):
+        """
+        Queues a checkpoint, unless one is already waiting.
+        :rtype: SaveJob
+        """
+        job = self.pending_checkpoint
+        if job is not None and not job.done.is_set():
+            return job
+        path = os.path.join(self.checkpoint_dir, '{}{}_{}'.format(CHECKPOINT_PREFIX, self.next_checkpoint_id,
+                                                                  strftime('%Y%m%d-%H%M%S')))
+        self.next_checkpoint_id += 1
+        job = SaveJob(path, is_checkpoint=True)
+        self.pending_checkpoint = job
+        self.jobs.put(job)
+        return job
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            start = time()
+            try:
+                if job.is_checkpoint and not os.path.isdir(self.checkpoint_dir):
+                    os.makedirs(self.checkpoint_dir)
+                job.success = bool(self.save_fn(job.path))
+            except Exception as e:
+                print_with_prefix('failed to save belief state to {}: {}'.format(job.path, e), self.prefix)
+                job.success = False
+            job.duration = time() - start
+            if job.success:
+                print_with_prefix('saved belief state to {} in {:.3f}s'.format(job.path, job.duration), self.prefix)
+                if job.is_checkpoint:
+                    self.checkpoints.append(job.path)
+                    self.remove_old_checkpoints()
+            job.done.set()
+
+    def remove_old_checkpoints(self):
+        while len(self.checkpoints) > self.max_checkpoints:
+            path = self.checkpoints.popleft()
+            try:
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                elif os.path.exists(path):
+                    os.remove(path)
+            except (IOError, OSError) as e:
+                print_with_prefix('failed to remove old checkpoint {}: {}'.format(path, e), self.prefix)
+
+    def shutdown(self, timeout=None):
+        """
+        Saves everything that is queued and stops the worker thread.
+        """
+        self.jobs.put(None)
+        self.thread.join(timeout)
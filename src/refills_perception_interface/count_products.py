@@ -9,20 +9,39 @@ class CountProductsBehavior(PerceptionBehavior):
     prefix = 'count products'
     def start_perception(self, goal):
         """
+        Counting runs in the background, the result is picked up on a later tick.
         :type goal: CountProductsGoal
         """
         print_with_prefix('started', self.prefix)
+        self.facing_id = goal.id
         result = CountProductsResult()
-        if self.get_knowrob().facing_exists(goal.id):
-            result.error = CountProductsResult.SUCCESS
-            result.count = self.get_robosherlock().count_product(goal.id)
-            self.get_knowrob().add_objects(goal.id, result.count)
-            print_with_prefix('counted {} times'.format(result.count), self.prefix)
-            print_with_prefix('finished', self.prefix)
-            return result
-        else:
+        if not self.get_knowrob().facing_exists(self.facing_id):
             result.error = DetectFacingsResult.INVALID_ID
             result.error_msg = 'invalid facing id: {}'.format(goal.id)
             print_with_prefix('invalid id', self.prefix)
             return result
+        self.count_future = self.get_robosherlock().count_product_async(self.facing_id)
+
+    def perception_done(self):
+        return self.count_future.done()
+
+    def stop_perception(self, interrupted):
+        result = CountProductsResult()
+        if interrupted:
+            # the count is still done, but not added to the belief state
+            result.error = DetectShelfLayersResult.ABORTED
+            print_with_prefix('interrupted', self.prefix)
+            return result
+        # count_product already stored the confidence
+        result.count = self.count_future.result()
+        self.get_knowrob().add_objects_to_facings({self.facing_id: result.count})
+        result.error = CountProductsResult.SUCCESS
+        print_with_prefix('counted {} times'.format(result.count), self.prefix)
+        print_with_prefix('finished', self.prefix)
+        return result
 
+    def canceled(self):
+        result = CountProductsResult()
+        result.error = DetectShelfLayersResult.ABORTED
+        print_with_prefix('canceled', self.prefix)
+        return result
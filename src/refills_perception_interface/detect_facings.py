@@ -37,7 +37,7 @@ class DetectFacingsBehavior(PerceptionBehavior):
             self.get_knowrob().create_unknown_barcodes(barcodes)
             self.get_knowrob().add_separators_and_barcodes(self.current_goal.id, separators, barcodes)
 
-            result.ids = self.get_knowrob().get_facing_ids_from_layer(self.current_goal.id).keys()
+            result.ids = self.get_knowrob().shop_topology.get_facing_ids(self.current_goal.id)
             print_with_prefix('finished', self.prefix)
         return result
 
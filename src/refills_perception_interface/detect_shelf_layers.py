@@ -17,7 +17,8 @@ class DetectShelfLayersBehavior(PerceptionBehavior):
             result.error_msg = 'invalid shelf id: {}'.format(goal.id)
             print_with_prefix('invalid id', self.prefix)
             return result
-        self.get_robosherlock().start_detect_shelf_layers(goal.id)
+        # RoboSherlock starts in the background, the tree keeps ticking
+        self.start_future = self.get_robosherlock().start_detect_shelf_layers_async(goal.id)
         self.current_goal = goal
 
     def stop_perception(self, interrupted):
@@ -27,9 +28,11 @@ class DetectShelfLayersBehavior(PerceptionBehavior):
             print_with_prefix('interrupted', self.prefix)
         else:
             result.error = DetectShelfLayersResult.SUCCESS
+            # raises, if the start failed
+            self.start_future.result()
             shelf_layer_heights = self.get_robosherlock().stop_detect_shelf_layers(self.current_goal.id)
             self.get_knowrob().add_shelf_layers(self.current_goal.id, shelf_layer_heights)
-            result.ids = self.get_knowrob().get_shelf_layer_from_system(self.current_goal.id).keys()
+            result.ids = self.get_knowrob().shop_topology.get_shelf_layer_ids(self.current_goal.id)
             print_with_prefix('finished', self.prefix)
         return result
 
@@ -0,0 +1,958 @@
+from __future__ import division
+
+import re
+from collections import OrderedDict
+from copy import deepcopy
+from multiprocessing import Lock
+
+import numpy as np
+
+NAMESPACES = {'knowrob': 'http://knowrob.org/kb/knowrob.owl#',
+              'shop': 'http://knowrob.org/kb/shop.owl#',
+              'dmshop': 'http://knowrob.org/kb/dm-market.owl#',
+              'dul': 'http://www.ontologydesignpatterns.org/ont/dul/DUL.owl#'}
+SHOP = NAMESPACES['shop']
+DMSHOP = NAMESPACES['dmshop']
+
+TYPE = 'rdf:type'
+SUBCLASS_OF = 'rdfs:subClassOf'
+HAS_COMPONENT = NAMESPACES['dul'] + 'hasComponent'
+FRAME_NAME = NAMESPACES['knowrob'] + 'frameName'
+DAN = SHOP + 'dan'
+ARTICLE_NUMBER_OF_LABEL = SHOP + 'articleNumberOfLabel'
+ARTICLE_NUMBER_OF_PRODUCT_TYPE = SHOP + 'articleNumberOfProductType'
+LEFT_SEPARATOR = SHOP + 'leftSeparator'
+RIGHT_SEPARATOR = SHOP + 'rightSeparator'
+PRODUCT_IN_FACING = SHOP + 'productInFacing'
+CONFIDENCE = NAMESPACES['knowrob'] + 'confidence'
+# predicates that KnowRob computes, but the fake stores
+OBJECT_FEATURE = 'object_feature'
+OBJECT_DIMENSIONS = 'object_dimensions'
+IS_AT = 'is_at'
+SHELF_FACING = 'shelf_facing'
+FACING_LABEL = 'facing_label'
+FACING_WIDTH = 'comp_facingWidth'
+BOTTOM_FLOOR_TYPE = 'shelf_bottom_floor_type'
+FLOOR_TYPE = 'shelf_floor_type'
+
+SHELF_FRAME = DMSHOP + 'DMShelfFrame'
+SHELF_T = [DMSHOP + 'DMShelfT5', DMSHOP + 'DMShelfT6', DMSHOP + 'DMShelfT7']
+NUM_OF_TILES = [5, 6, 7]
+SHELF_HEAVY = DMSHOP + 'DMShelfH'
+SHELF_LIGHT = DMSHOP + 'DMShelfL'
+SHELF_LAYER = SHOP + 'ShelfLayer'
+SHELF_FLOOR = DMSHOP + 'DMShelfFloor'
+SHELF_BOTTOM_FLOOR = DMSHOP + 'DMShelfBFloor'
+SEPARATOR = DMSHOP + 'DMShelfSeparator4Tiles'
+LABEL = DMSHOP + 'DMShelfLabel'
+FACING = SHOP + 'ProductFacingStanding'
+PRODUCT = SHOP + 'Product'
+PERCEPTION_FEATURE = DMSHOP + 'DMShelfPerceptionFeature'
+CLASS_HIERARCHY = [(SHELF_T[0], SHELF_FRAME), (SHELF_T[1], SHELF_FRAME), (SHELF_T[2], SHELF_FRAME),
+                   (SHELF_HEAVY, SHELF_FRAME), (SHELF_LIGHT, SHELF_FRAME),
+                   (SHELF_FLOOR, SHELF_LAYER), (SHELF_BOTTOM_FLOOR, SHELF_FLOOR),
+                   (LABEL, SHOP + 'ShelfLabel'), (FACING, SHOP + 'ProductFacing')]
+
+IDENTITY = (0., 0., 0., 1.)
+LAYER_THICKNESS = 0.02
+
+NUMBER = r'(-?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)'
+TEMPLATE_MARKERS = {'@A': r'\'([^\']*)\'',
+                    '@N': NUMBER,
+                    '@L': r'(\[.*?\])',
+                    '@T': r'(\w+:\'[^\']*\'|\w+:\w+|\'[^\']*\')',
+                    '@V': r'([A-Z_]\w*)'}
+TEMPLATE_MARKER_PATTERN = re.compile(r'(@[ANLTV])')
+WHITESPACE_PATTERN = re.compile(r'(\'[^\']*\')|\s+')
+QUOTED_ATOM_PATTERN = re.compile(r'\'([^\']*)\'')
+TYPE_HEIGHT_PATTERN = re.compile(r'\[u?\'([^\']*)\',' + NUMBER + r'\]')
+ID_NUMBER_PATTERN = re.compile(r'\[u?\'([^\']*)\',(\d+)\]')
+NUMBER_ID_PATTERN = re.compile(r'\(' + NUMBER + r',u?\'([^\']*)\'\)')
+NUMBER_PATTERN = re.compile(NUMBER)
+
+
+class FakePrologError(Exception):
+    pass
+
+
+def normalize(q):
+    """
+    Removes all whitespace outside of quoted atoms and the final full stop.
+    :type q: str
+    :rtype: str
+    """
+    q = WHITESPACE_PATTERN.sub(lambda m: m.group(1) or '', q)
+    if q.endswith('.'):
+        q = q[:-1]
+    return q
+
+
+def compile_template(template):
+    """
+    :param template: query without whitespace, @A matches a quoted atom, @N a number, @L a list,
+                        @T a class or property and @V a variable
+    :type template: str
+    """
+    regex = ''.join(TEMPLATE_MARKERS.get(part, re.escape(part)) for part in TEMPLATE_MARKER_PATTERN.split(template))
+    return re.compile(regex + '$')
+
+
+def expand(term):
+    """
+    :param term: e.g. dmshop:'DMShelfFrame', dul:hasComponent or 'http://knowrob.org/kb/shop.owl#ShelfLayer'
+    :type term: str
+    :return: full iri without quotes
+    :rtype: str
+    """
+    if term.startswith('\''):
+        return term[1:-1]
+    prefix, name = term.split(':', 1)
+    return NAMESPACES[prefix] + name.strip('\'')
+
+
+def local_name(iri):
+    return iri.split('#')[-1]
+
+
+def pose_matrix(position, orientation):
+    """
+    :return: 4x4 homogeneous transformation
+    :rtype: np.ndarray
+    """
+    x, y, z, w = orientation
+    return np.array([[1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w), position[0]],
+                     [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w), position[1]],
+                     [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y), position[2]],
+                     [0, 0, 0, 1]])
+
+
+class TripleStore(object):
+    """
+    Triples indexed by subject and predicate and by predicate and object, both in insertion order.
+    Objects are strings, numbers or tuples. Subjects have few objects per predicate, but objects can have
+    many subjects, e.g. classes, so only the latter are indexed with ordered dicts.
+    """
+
+    def __init__(self):
+        self.spo = {}
+        self.pos = {}
+
+    def add(self, s, p, o):
+        objects = self.spo.setdefault(s, {}).setdefault(p, [])
+        if o not in objects:
+            objects.append(o)
+            self.pos.setdefault(p, {}).setdefault(o, OrderedDict())[s] = None
+
+    def remove(self, s, p, o):
+        objects = self.spo.get(s, {}).get(p, [])
+        if o in objects:
+            objects.remove(o)
+            self.pos[p][o].pop(s, None)
+
+    def set(self, s, p, o):
+        """
+        Replaces all objects of s and p with o.
+        """
+        objects = self.spo.setdefault(s, {}).setdefault(p, [])
+        for old_o in objects:
+            self.pos[p][old_o].pop(s, None)
+        objects[:] = [o]
+        self.pos.setdefault(p, {}).setdefault(o, OrderedDict())[s] = None
+
+    def remove_subject(self, s):
+        """
+        Removes all triples with s as subject or object.
+        """
+        for p, objects in self.spo.pop(s, {}).items():
+            for o in objects:
+                self.pos[p][o].pop(s, None)
+        for p, subjects_by_o in self.pos.items():
+            for other_s in subjects_by_o.pop(s, ()):
+                self.spo[other_s][p].remove(s)
+
+    def objects(self, s, p):
+        """
+        :rtype: list
+        """
+        return list(self.spo.get(s, {}).get(p, ()))
+
+    def value(self, s, p, default=None):
+        """
+        :return: first object of s and p
+        """
+        objects = self.spo.get(s, {}).get(p)
+        if objects:
+            return objects[0]
+        return default
+
+    def subjects(self, p, o):
+        """
+        :rtype: list
+        """
+        return list(self.pos.get(p, {}).get(o, ()))
+
+    def has(self, s, p, o=None):
+        if o is None:
+            return bool(self.spo.get(s, {}).get(p))
+        return o in self.spo.get(s, {}).get(p, ())
+
+
+class FakeQuery(object):
+    def __init__(self, solutions):
+        self._solutions = solutions
+
+    def solutions(self):
+        for solution in self._solutions:
+            yield solution
+
+    def finish(self):
+        pass
+
+
+class FakeProlog(object):
+    """
+    In process stand-in for rosprolog_client.Prolog, that answers the queries of KnowRob in knowrob_wrapper
+    from an indexed triple store. Queries are matched against templates of those queries, anything else raises
+    FakePrologError. Shelf systems and layers have an object frame and a perceived frame, like in KnowRob,
+    all other objects only have poses relative to them.
+    """
+
+    def __init__(self, initial_beliefstate=None):
+        """
+        :param initial_beliefstate: called with this FakeProlog to fill the empty belief state, e.g. a SyntheticShop,
+                                        also when the belief state is dropped or an owl file is loaded
+        """
+        self.initial_beliefstate = initial_beliefstate
+        self.lock = Lock()
+        # called with get_transforms(), whenever frames of shelf systems or layers changed
+        self.on_frames_changed = None
+        self.snapshots = {}
+        self.next_id = 0
+        self.handlers = [(compile_template(template), getattr(self, name)) for template, name in [
+            ('findall(R,instance_of(R,@T),Rs)', 'q_all_individuals'),
+            ('object_feature(@A,Feature,dmshop:\'DMShelfPerceptionFeature\'),'
+             'holds(Feature,knowrob:frameName,FeatureFrame)', 'q_perceived_frame_id'),
+            ('holds(@A,knowrob:frameName,R)', 'q_object_frame_id'),
+            ('object_dimensions(@A,@V,@V,@V)', 'q_object_dimensions'),
+            ('findall(_I,(nth0(_I,@L,_T),instance_of(@A,_T)),Tiles),'
+             '(instance_of(@A,@T)->Heavy=true;Heavy=false),'
+             '(shelf_bottom_floor_type(@A,BottomLayerType)->true;BottomLayerType=none),'
+             '(shelf_floor_type(@A,LayerType)->true;LayerType=none),'
+             'object_dimensions(@A,D,W,H)', 'q_shelf_type'),
+            ('findall([O,Feature,FeatureFrame],(member(O,@L),'
+             'object_feature(O,Feature,dmshop:\'DMShelfPerceptionFeature\'),'
+             'holds(Feature,knowrob:frameName,FeatureFrame)),Xs)', 'q_bulk_perceived_frame_ids'),
+            ('findall([O,R],(member(O,@L),holds(O,knowrob:frameName,R)),Xs)', 'q_bulk_object_frame_ids'),
+            ('findall([O,D,W,H],(member(O,@L),object_dimensions(O,D,W,H)),Xs)', 'q_bulk_object_dimensions'),
+            ('findall([S,Tiles,Heavy,BottomLayerType,LayerType,D,W,H],(member(S,@L),'
+             'findall(_I,(nth0(_I,@L,_T),instance_of(S,_T)),Tiles),'
+             '(instance_of(S,@T)->Heavy=true;Heavy=false),'
+             '(shelf_bottom_floor_type(S,BottomLayerType)->true;BottomLayerType=none),'
+             '(shelf_floor_type(S,LayerType)->true;LayerType=none),'
+             'object_dimensions(S,D,W,H)),Xs)', 'q_bulk_shelf_types'),
+            ('triple(@A,dul:hasComponent,Floor),instance_of(Floor,@T),'
+             'object_feature_type(Floor,Feature,dmshop:\'DMShelfPerceptionFeature\'),'
+             'object_frame_name(Feature,FeatureFrame)', 'q_shelf_layers_of_system'),
+            ('findall([S,FeatureFrame],(instance_of(S,@T),'
+             'object_feature(S,Feature,dmshop:\'DMShelfPerceptionFeature\'),'
+             'holds(Feature,knowrob:frameName,FeatureFrame)),Ss)', 'q_all_shelf_systems'),
+            ('findall([S,Floor,FeatureFrame],(instance_of(S,@T),triple(S,dul:hasComponent,Floor),'
+             'instance_of(Floor,@T),object_feature_type(Floor,Feature,dmshop:\'DMShelfPerceptionFeature\'),'
+             'object_frame_name(Feature,FeatureFrame)),Fs)', 'q_all_shelf_layers'),
+            ('shelf_facing_product_type(@A,P)', 'q_facing_product_type'),
+            ('findall([F,P],(shelf_facing(@A,F),is_at(F,P)),Fs)', 'q_facing_poses'),
+            ('findall([F,P,W],(shelf_facing(@A,F),is_at(F,P),'
+             '(comp_facingWidth(F,W_XSD)->atom_number(W_XSD,W);W=none)),Fs)', 'q_layer_snapshot'),
+            ('findall([S,L,LayerFrame,F,P,W],(instance_of(L,@T),shelf_layer_frame(L,S),'
+             'object_feature_type(L,Feature,dmshop:\'DMShelfPerceptionFeature\'),'
+             'object_frame_name(Feature,LayerFrame),shelf_facing(L,F),is_at(F,P),'
+             '(comp_facingWidth(F,W_XSD)->atom_number(W_XSD,W);W=none)),Fs)', 'q_all_layer_snapshots'),
+            ('findall([L,X],(triple(@A,dul:hasComponent,L),instance_of(L,@T),is_at(L,[@A,[X,_,_],_])),Ls)',
+             'q_label_positions'),
+            ('triple(@A,shop:articleNumberOfLabel,_AN),triple(_AN,shop:dan,DAN)', 'q_label_dan'),
+            ('triple(_Layer,dul:hasComponent,@A),instance_of(_Layer,@T),is_at(@A,[_Layer,[Pos,_,_],_]),'
+             'object_dimensions(_Layer,_,Width,_)', 'q_label_pos'),
+            ('findall([S,L,Z,W],(instance_of(S,@T),triple(S,dul:hasComponent,L),instance_of(L,@T),'
+             'object_feature_type(S,SF,dmshop:\'DMShelfPerceptionFeature\'),'
+             'object_feature_type(L,LF,dmshop:\'DMShelfPerceptionFeature\'),'
+             'is_at(LF,[SF,[_,_,Z],_]),object_dimensions(L,_,W,_)),Ls)', 'q_all_layer_heights'),
+            ('findall([L,Label,X,DAN],(instance_of(L,@T),triple(L,dul:hasComponent,Label),instance_of(Label,@T),'
+             'is_at(Label,[L,[X,_,_],_]),'
+             '(triple(Label,shop:articleNumberOfLabel,AN),triple(AN,shop:dan,DAN)->true;DAN=none)),Ls)',
+             'q_all_labels'),
+            ('shelf_layer_frame(@A,@V)', 'q_shelf_layer_frame'),
+            ('shelf_facing(@V,@A)', 'q_shelf_layer_of_facing'),
+            ('findall([F,W,H,D,L,R,P],(shelf_facing(@A,F),'
+             '(comp_facingWidth(F,W_XSD)->atom_number(W_XSD,W);W=none),'
+             '(comp_facingHeight(F,H_XSD)->atom_number(H_XSD,H);H=none),'
+             '(comp_facingDepth(F,D_XSD)->atom_number(D_XSD,D);D=none),'
+             '(triple(F,shop:leftSeparator,L)->true;L=none),'
+             '(triple(F,shop:rightSeparator,R)->true;R=none),'
+             '(shelf_facing_product_type(F,P)->true;P=none)),Fs)', 'q_facing_table'),
+            ('is_at(@A,[_,[@A,[@N,@N,@N],[@N,@N,@N,@N]]])', 'q_set_pose'),
+            ('forall(member([Type,Height],@L),belief_shelf_part_at(@A,Type,Height,_))', 'q_add_shelf_layers'),
+            ('belief_shelf_part_at(@A,@T,@N,@V)', 'q_add_shelf_part'),
+            ('belief_shelf_barcode_at(@A,@T,dan(@A),@N,_)', 'q_add_label'),
+            ('forall(member(DAN,@L),(create_article_number(dan(DAN),AN),'
+             'create_article_type(AN,[@N,@N,@N],ProductType)))', 'q_create_articles'),
+            ('bulk_insert_floor(@A,separators(@L),labels(@L))', 'q_bulk_insert_floor'),
+            ('shelf_facings_mark_dirty(@A)', 'q_mark_facings_dirty'),
+            ('findall(C,(triple(@A,dul:hasComponent,C),(instance_of(C,@T);instance_of(C,@T))),Cs)',
+             'q_shelf_layer_parts'),
+            ('findall(DAN,triple(AN,shop:dan,DAN),DANS)', 'q_all_dans'),
+            ('forall(member([F,N],@L),forall(between(1,N,_),product_spawn_front_to_back(F,_)))', 'q_spawn_products'),
+            ('forall(member([F,C],@L),tell(holds(F,knowrob:confidence,C)))', 'q_set_confidences'),
+            ('holds(@A,knowrob:confidence,C)', 'q_confidence'),
+            ('findall(Facing,(has_type(Facing,shop:\'ProductFacingStanding\'),'
+             '\\+holds(Facing,shop:productInFacing,_)),Fs)', 'q_all_empty_facings'),
+            ('findall(F,(shelf_facing(@A,F),\\+holds(F,shop:productInFacing,_)),Fs)', 'q_empty_facings'),
+            ('shelf_layer_above(@A,Above)', 'q_shelf_layer_above'),
+            ('instance_of(@A,@T)', 'q_instance_of'),
+            ('memorize(@A)', 'q_memorize'),
+            ('mem_clear_memory,remember(@A)', 'q_remember'),
+            ('tripledb:tripledb_graph_drop(beliefstate)', 'q_load_initial_beliefstate'),
+            ('tripledb_load(@A)', 'q_load_initial_beliefstate'),
+            ('ros_logger_start(@L)', 'q_true'),
+            ('ros_logger_stop', 'q_true'),
+            ('true', 'q_true'),
+            ('1=0', 'q_false')]]
+        self.clear()
+        self.load_initial_beliefstate()
+
+    def query(self, q):
+        """
+        :type q: str
+        :rtype: FakeQuery
+        :raises FakePrologError: if q does not match any known query
+        """
+        normalized_q = normalize(q)
+        with self.lock:
+            self.frames_changed = False
+            for pattern, handler in self.handlers:
+                match = pattern.match(normalized_q)
+                if match:
+                    solutions = handler(*match.groups())
+                    break
+            else:
+                raise FakePrologError('unknown query: {}'.format(q))
+            frames_changed = self.frames_changed
+        if frames_changed and self.on_frames_changed is not None:
+            self.on_frames_changed(self.get_transforms())
+        return FakeQuery(solutions)
+
+    # belief state
+
+    def clear(self):
+        self.store = TripleStore()
+        # frame name -> (parent frame name, position, orientation)
+        self.frames = OrderedDict()
+        self.subclasses = {}
+        for subclass, superclass in CLASS_HIERARCHY:
+            self.add_subclass(subclass, superclass)
+        self.frames_changed = True
+
+    def load_initial_beliefstate(self):
+        self.clear()
+        if self.initial_beliefstate is not None:
+            self.initial_beliefstate(self)
+
+    def get_transforms(self):
+        """
+        :return: list of (parent frame, child frame, position, orientation) of all shelf system and layer frames
+        :rtype: list
+        """
+        with self.lock:
+            return [(parent, child, position, orientation)
+                    for child, (parent, position, orientation) in self.frames.items()]
+
+    def new_id(self, class_iri):
+        self.next_id += 1
+        return '{}_{}'.format(class_iri, self.next_id)
+
+    def add_subclass(self, subclass, superclass):
+        self.store.add(subclass, SUBCLASS_OF, superclass)
+        self.subclasses = {}
+
+    def get_subclasses(self, class_iri):
+        """
+        :return: class_iri and all its direct and indirect subclasses in depth first order, which doesn't depend
+                    on the hash seed, such that solutions always come in the same order.
+        :rtype: OrderedDict
+        """
+        if class_iri not in self.subclasses:
+            subclasses = OrderedDict([(class_iri, None)])
+            for subclass in self.store.subjects(SUBCLASS_OF, class_iri):
+                for x in self.get_subclasses(subclass):
+                    subclasses[x] = None
+            self.subclasses[class_iri] = subclasses
+        return self.subclasses[class_iri]
+
+    def instance_of(self, object_id, class_iri):
+        subclasses = self.get_subclasses(class_iri)
+        return any(t in subclasses for t in self.store.objects(object_id, TYPE))
+
+    def instances_of(self, class_iri):
+        instances = OrderedDict()
+        for subclass in self.get_subclasses(class_iri):
+            for object_id in self.store.subjects(TYPE, subclass):
+                instances[object_id] = None
+        return list(instances)
+
+    def add_object(self, class_iris, dimensions=None, object_id=None):
+        """
+        :param class_iris: list of classes of the new object
+        :param dimensions: (depth, width, height)
+        :return: object id
+        :rtype: str
+        """
+        if object_id is None:
+            object_id = self.new_id(class_iris[0])
+        for class_iri in class_iris:
+            self.store.add(object_id, TYPE, class_iri)
+        if dimensions is not None:
+            self.store.set(object_id, OBJECT_DIMENSIONS, tuple(float(x) for x in dimensions))
+        return object_id
+
+    def add_frames(self, object_id, parent_frame, position, perceived_offset):
+        """
+        Gives an object a frame and a perception feature with a perceived frame relative to it.
+        """
+        frame = local_name(object_id)
+        self.store.set(object_id, FRAME_NAME, frame)
+        self.frames[frame] = (parent_frame, tuple(position), IDENTITY)
+        feature_id = self.add_object([PERCEPTION_FEATURE])
+        perceived_frame = '{}_perception'.format(frame)
+        self.store.set(object_id, OBJECT_FEATURE, feature_id)
+        self.store.set(feature_id, FRAME_NAME, perceived_frame)
+        self.frames[perceived_frame] = (frame, tuple(perceived_offset), IDENTITY)
+        self.frames_changed = True
+
+    def get_frame(self, object_id):
+        return self.store.value(object_id, FRAME_NAME)
+
+    def get_perceived_frame(self, object_id):
+        return self.store.value(self.store.value(object_id, OBJECT_FEATURE), FRAME_NAME)
+
+    def frame_matrix(self, frame):
+        """
+        :return: pose of frame in its root frame, usually map
+        :rtype: np.ndarray
+        """
+        m = np.eye(4)
+        while frame in self.frames:
+            parent, position, orientation = self.frames[frame]
+            m = pose_matrix(position, orientation).dot(m)
+            frame = parent
+        return m
+
+    def relative_position(self, target_frame, source_frame):
+        """
+        :return: position of source_frame in target_frame
+        :rtype: np.ndarray
+        """
+        return np.linalg.inv(self.frame_matrix(target_frame)).dot(self.frame_matrix(source_frame))[:3, 3]
+
+    def get_dimensions(self, object_id):
+        return self.store.value(object_id, OBJECT_DIMENSIONS)
+
+    def add_shelf_system(self, object_id, position, width=1.0, depth=0.5, height=2.0, num_of_tiles=5, heavy=False,
+                         bottom_layer_type=None, layer_type=None):
+        """
+        :param position: of the center of the shelf system's bottom in map
+        :param bottom_layer_type: defaults to DMBFloorT<num_of_tiles>W<width in cm>
+        :param layer_type: defaults to DMFloorT<num_of_tiles - 1>W<width in cm>
+        :rtype: str
+        """
+        width_cm = int(round(width * 100))
+        if bottom_layer_type is None:
+            bottom_layer_type = '{}DMBFloorT{}W{}'.format(DMSHOP, num_of_tiles, width_cm)
+        if layer_type is None:
+            layer_type = '{}DMFloorT{}W{}'.format(DMSHOP, num_of_tiles - 1, width_cm)
+        self.add_object([SHELF_FRAME, SHELF_T[NUM_OF_TILES.index(num_of_tiles)],
+                         SHELF_HEAVY if heavy else SHELF_LIGHT,
+                         '{}DMShelfW{}'.format(DMSHOP, width_cm)], (depth, width, height), object_id)
+        self.store.set(object_id, BOTTOM_FLOOR_TYPE, bottom_layer_type)
+        self.store.set(object_id, FLOOR_TYPE, layer_type)
+        self.add_frames(object_id, 'map', position, (-width / 2, 0, 0))
+        return object_id
+
+    def add_shelf_layer(self, shelf_system_id, layer_type, height):
+        """
+        :param height: above the bottom of the shelf system
+        :rtype: str
+        """
+        if not self.store.has(layer_type, SUBCLASS_OF):
+            self.add_subclass(layer_type, SHELF_BOTTOM_FLOOR if 'BFloor' in layer_type else SHELF_FLOOR)
+        depth = 0.5
+        tiles = re.search(r'FloorT(\d)', layer_type)
+        if tiles:
+            depth = int(tiles.group(1)) * 0.1
+        width = self.get_dimensions(shelf_system_id)[1]
+        layer_id = self.add_object([layer_type], (depth, width, LAYER_THICKNESS))
+        self.store.add(shelf_system_id, HAS_COMPONENT, layer_id)
+        self.add_frames(layer_id, self.get_frame(shelf_system_id), (0, 0, float(height)), (-width / 2, 0, 0))
+        return layer_id
+
+    def get_shelf_system_of_layer(self, shelf_layer_id):
+        for parent in self.store.subjects(HAS_COMPONENT, shelf_layer_id):
+            if self.instance_of(parent, SHELF_FRAME):
+                return parent
+
+    def get_shelf_layers(self, shelf_system_id):
+        """
+        :return: list of (height in the perceived frame of the shelf system, shelf layer id), lowest first
+        :rtype: list
+        """
+        shelf_frame = self.get_perceived_frame(shelf_system_id)
+        return sorted((float(self.relative_position(shelf_frame, self.get_perceived_frame(layer_id))[2]), layer_id)
+                      for layer_id in self.store.objects(shelf_system_id, HAS_COMPONENT)
+                      if self.instance_of(layer_id, SHELF_LAYER))
+
+    def get_shelf_layer_above(self, shelf_layer_id):
+        layers = [layer_id for _, layer_id in self.get_shelf_layers(self.get_shelf_system_of_layer(shelf_layer_id))]
+        i = layers.index(shelf_layer_id)
+        if i + 1 < len(layers):
+            return layers[i + 1]
+
+    def get_article_number(self, dan):
+        article_numbers = self.store.subjects(DAN, dan)
+        if article_numbers:
+            return article_numbers[0]
+        article_number = self.add_object([SHOP + 'ArticleNumber'], object_id='{}ArticleNumber_{}'.format(SHOP, dan))
+        self.store.set(article_number, DAN, dan)
+        return article_number
+
+    def create_article(self, dan, dimensions):
+        """
+        :return: product type
+        :rtype: str
+        """
+        article_number = self.get_article_number(dan)
+        product_types = self.store.subjects(ARTICLE_NUMBER_OF_PRODUCT_TYPE, article_number)
+        if product_types:
+            return product_types[0]
+        product_type = '{}Product_{}'.format(SHOP, dan)
+        self.add_subclass(product_type, PRODUCT)
+        self.store.set(product_type, ARTICLE_NUMBER_OF_PRODUCT_TYPE, article_number)
+        self.store.set(product_type, OBJECT_DIMENSIONS, tuple(float(x) for x in dimensions))
+        return product_type
+
+    def add_shelf_layer_part(self, shelf_layer_id, class_iri, x, dan=None):
+        """
+        :param x: normalized position from the left edge of the shelf layer
+        :param dan: of labels
+        :rtype: str
+        """
+        part_id = self.add_object([class_iri])
+        self.store.add(shelf_layer_id, HAS_COMPONENT, part_id)
+        width = self.get_dimensions(shelf_layer_id)[1]
+        self.store.set(part_id, IS_AT, (self.get_frame(shelf_layer_id), ((float(x) - 0.5) * width, 0., 0.), IDENTITY))
+        if dan is not None:
+            self.store.set(part_id, ARTICLE_NUMBER_OF_LABEL, self.get_article_number(dan))
+        return part_id
+
+    def get_shelf_layer_parts(self, shelf_layer_id, class_iri):
+        """
+        :return: list of (x in the shelf layer frame, part id), left to right
+        :rtype: list
+        """
+        return sorted((self.store.value(part_id, IS_AT)[1][0], part_id)
+                      for part_id in self.store.objects(shelf_layer_id, HAS_COMPONENT)
+                      if self.instance_of(part_id, class_iri))
+
+    def update_facings(self, shelf_layer_id):
+        """
+        Creates a facing between every two neighbouring separators, facings between the same separators are kept.
+        """
+        old_facings = {(self.store.value(facing_id, LEFT_SEPARATOR), self.store.value(facing_id, RIGHT_SEPARATOR)):
+                           facing_id for facing_id in self.store.objects(shelf_layer_id, SHELF_FACING)}
+        separators = self.get_shelf_layer_parts(shelf_layer_id, SEPARATOR)
+        labels = self.get_shelf_layer_parts(shelf_layer_id, LABEL)
+        depth, width, _ = self.get_dimensions(shelf_layer_id)
+        for (left_x, left_id), (right_x, right_id) in zip(separators[:-1], separators[1:]):
+            facing_id = old_facings.pop((left_id, right_id), None)
+            if facing_id is None:
+                facing_id = self.add_object([FACING])
+                self.store.add(shelf_layer_id, SHELF_FACING, facing_id)
+                self.store.set(facing_id, LEFT_SEPARATOR, left_id)
+                self.store.set(facing_id, RIGHT_SEPARATOR, right_id)
+            self.store.set(facing_id, FACING_WIDTH, right_x - left_x)
+            self.store.set(facing_id, IS_AT, (self.get_perceived_frame(shelf_layer_id),
+                                              ((left_x + right_x) / 2 + width / 2, depth / 2, 0.), IDENTITY))
+            for label_x, label_id in labels:
+                if left_x <= label_x <= right_x:
+                    self.store.set(facing_id, FACING_LABEL, label_id)
+                    break
+            else:
+                for label_id in self.store.objects(facing_id, FACING_LABEL):
+                    self.store.remove(facing_id, FACING_LABEL, label_id)
+        for facing_id in old_facings.values():
+            self.store.remove_subject(facing_id)
+
+    def get_facing_product_type(self, facing_id):
+        label_id = self.store.value(facing_id, FACING_LABEL)
+        if label_id is not None:
+            article_number = self.store.value(label_id, ARTICLE_NUMBER_OF_LABEL)
+            product_types = self.store.subjects(ARTICLE_NUMBER_OF_PRODUCT_TYPE, article_number)
+            if product_types:
+                return product_types[0]
+
+    def get_facing_height(self, facing_id):
+        shelf_layer_id = self.store.subjects(SHELF_FACING, facing_id)[0]
+        shelf_system_id = self.get_shelf_system_of_layer(shelf_layer_id)
+        layers = self.get_shelf_layers(shelf_system_id)
+        heights = [z for z, _ in layers] + [self.get_dimensions(shelf_system_id)[2]]
+        i = [layer_id for _, layer_id in layers].index(shelf_layer_id)
+        return heights[i + 1] - heights[i] - LAYER_THICKNESS
+
+    def prolog_pose(self, object_id):
+        parent, position, orientation = self.store.value(object_id, IS_AT)
+        return [parent, local_name(object_id), list(position), list(orientation)]
+
+    # queries, every handler gets the groups of its template and returns a list of solutions
+
+    def q_true(self, *args):
+        return [{}]
+
+    def q_false(self, *args):
+        return []
+
+    def q_all_individuals(self, class_term):
+        return [{'Rs': self.instances_of(expand(class_term))}]
+
+    def q_perceived_frame_id(self, object_id):
+        feature_id = self.store.value(object_id, OBJECT_FEATURE)
+        if feature_id is None:
+            return []
+        return [{'Feature': feature_id, 'FeatureFrame': self.store.value(feature_id, FRAME_NAME)}]
+
+    def q_object_frame_id(self, object_id):
+        frame = self.get_frame(object_id)
+        if frame is None:
+            return []
+        return [{'R': frame}]
+
+    def q_object_dimensions(self, object_id, d, w, h):
+        dimensions = self.get_dimensions(object_id)
+        if dimensions is None:
+            return []
+        return [{var: value for var, value in zip([d, w, h], dimensions) if not var.startswith('_')}]
+
+    def shelf_type(self, shelf_system_id, tile_classes, heavy_class):
+        """
+        :return: [Tiles, Heavy, BottomLayerType, LayerType, D, W, H] or None
+        """
+        dimensions = self.get_dimensions(shelf_system_id)
+        if dimensions is None:
+            return None
+        tile_classes = [expand(term) for term in re.findall(TEMPLATE_MARKERS['@T'], tile_classes[1:-1])]
+        return [[i for i, tile_class in enumerate(tile_classes) if self.instance_of(shelf_system_id, tile_class)],
+                'true' if self.instance_of(shelf_system_id, expand(heavy_class)) else 'false',
+                self.store.value(shelf_system_id, BOTTOM_FLOOR_TYPE, 'none'),
+                self.store.value(shelf_system_id, FLOOR_TYPE, 'none')] + list(dimensions)
+
+    def q_shelf_type(self, tile_classes, shelf_system_id, *args):
+        heavy_class = args[1]
+        row = self.shelf_type(shelf_system_id, tile_classes, heavy_class)
+        if row is None:
+            return []
+        return [dict(zip(['Tiles', 'Heavy', 'BottomLayerType', 'LayerType', 'D', 'W', 'H'], row))]
+
+    def q_bulk_perceived_frame_ids(self, object_ids):
+        rows = []
+        for object_id in QUOTED_ATOM_PATTERN.findall(object_ids):
+            feature_id = self.store.value(object_id, OBJECT_FEATURE)
+            if feature_id is not None:
+                rows.append([object_id, feature_id, self.store.value(feature_id, FRAME_NAME)])
+        return [{'Xs': rows}]
+
+    def q_bulk_object_frame_ids(self, object_ids):
+        return [{'Xs': [[object_id, self.get_frame(object_id)] for object_id in QUOTED_ATOM_PATTERN.findall(object_ids)
+                        if self.get_frame(object_id) is not None]}]
+
+    def q_bulk_object_dimensions(self, object_ids):
+        return [{'Xs': [[object_id] + list(self.get_dimensions(object_id))
+                        for object_id in QUOTED_ATOM_PATTERN.findall(object_ids)
+                        if self.get_dimensions(object_id) is not None]}]
+
+    def q_bulk_shelf_types(self, shelf_system_ids, tile_classes, heavy_class):
+        rows = []
+        for shelf_system_id in QUOTED_ATOM_PATTERN.findall(shelf_system_ids):
+            row = self.shelf_type(shelf_system_id, tile_classes, heavy_class)
+            if row is not None:
+                rows.append([shelf_system_id] + row)
+        return [{'Xs': rows}]
+
+    def q_shelf_layers_of_system(self, shelf_system_id, layer_class):
+        layer_class = expand(layer_class)
+        return [{'Floor': layer_id, 'Feature': self.store.value(layer_id, OBJECT_FEATURE),
+                 'FeatureFrame': self.get_perceived_frame(layer_id)}
+                for layer_id in self.store.objects(shelf_system_id, HAS_COMPONENT)
+                if self.instance_of(layer_id, layer_class)]
+
+    def q_all_shelf_systems(self, shelf_system_class):
+        return [{'Ss': [[shelf_system_id, self.get_perceived_frame(shelf_system_id)]
+                        for shelf_system_id in self.instances_of(expand(shelf_system_class))]}]
+
+    def q_all_shelf_layers(self, shelf_system_class, layer_class):
+        layer_class = expand(layer_class)
+        return [{'Fs': [[shelf_system_id, layer_id, self.get_perceived_frame(layer_id)]
+                        for shelf_system_id in self.instances_of(expand(shelf_system_class))
+                        for layer_id in self.store.objects(shelf_system_id, HAS_COMPONENT)
+                        if self.instance_of(layer_id, layer_class)]}]
+
+    def q_facing_product_type(self, facing_id):
+        product_type = self.get_facing_product_type(facing_id)
+        if product_type is None:
+            return []
+        return [{'P': product_type}]
+
+    def q_facing_poses(self, shelf_layer_id):
+        return [{'Fs': [[facing_id, self.prolog_pose(facing_id)]
+                        for facing_id in self.store.objects(shelf_layer_id, SHELF_FACING)]}]
+
+    def q_layer_snapshot(self, shelf_layer_id):
+        return [{'Fs': [[facing_id, self.prolog_pose(facing_id), self.store.value(facing_id, FACING_WIDTH, 'none')]
+                        for facing_id in self.store.objects(shelf_layer_id, SHELF_FACING)]}]
+
+    def q_all_layer_snapshots(self, layer_class):
+        rows = []
+        for layer_id in self.instances_of(expand(layer_class)):
+            shelf_system_id = self.get_shelf_system_of_layer(layer_id)
+            layer_frame = self.get_perceived_frame(layer_id)
+            for facing_id in self.store.objects(layer_id, SHELF_FACING):
+                rows.append([shelf_system_id, layer_id, layer_frame, facing_id, self.prolog_pose(facing_id),
+                             self.store.value(facing_id, FACING_WIDTH, 'none')])
+        return [{'Fs': rows}]
+
+    def q_label_positions(self, shelf_layer_id, label_class, _):
+        return [{'Ls': [[label_id, x]
+                        for x, label_id in self.get_shelf_layer_parts(shelf_layer_id, expand(label_class))]}]
+
+    def q_label_dan(self, label_id):
+        article_number = self.store.value(label_id, ARTICLE_NUMBER_OF_LABEL)
+        if article_number is None:
+            return []
+        return [{'DAN': '\'{}\''.format(self.store.value(article_number, DAN))}]
+
+    def q_label_pos(self, label_id, layer_class, _):
+        for layer_id in self.store.subjects(HAS_COMPONENT, label_id):
+            if self.instance_of(layer_id, expand(layer_class)):
+                return [{'Pos': self.store.value(label_id, IS_AT)[1][0], 'Width': self.get_dimensions(layer_id)[1]}]
+        return []
+
+    def q_all_layer_heights(self, shelf_system_class, layer_class):
+        layer_class = expand(layer_class)
+        rows = []
+        for shelf_system_id in self.instances_of(expand(shelf_system_class)):
+            for z, layer_id in self.get_shelf_layers(shelf_system_id):
+                if self.instance_of(layer_id, layer_class):
+                    rows.append([shelf_system_id, layer_id, z, self.get_dimensions(layer_id)[1]])
+        return [{'Ls': rows}]
+
+    def q_all_labels(self, layer_class, label_class):
+        rows = []
+        for layer_id in self.instances_of(expand(layer_class)):
+            for x, label_id in self.get_shelf_layer_parts(layer_id, expand(label_class)):
+                article_number = self.store.value(label_id, ARTICLE_NUMBER_OF_LABEL)
+                dan = 'none' if article_number is None else '\'{}\''.format(self.store.value(article_number, DAN))
+                rows.append([layer_id, label_id, x, dan])
+        return [{'Ls': rows}]
+
+    def q_shelf_layer_frame(self, shelf_layer_id, var):
+        shelf_system_id = self.get_shelf_system_of_layer(shelf_layer_id)
+        if shelf_system_id is None:
+            return []
+        if var.startswith('_'):
+            return [{}]
+        return [{var: shelf_system_id}]
+
+    def q_shelf_layer_of_facing(self, var, facing_id):
+        return [{var: shelf_layer_id} for shelf_layer_id in self.store.subjects(SHELF_FACING, facing_id)]
+
+    def q_facing_table(self, shelf_layer_id):
+        rows = []
+        for facing_id in self.store.objects(shelf_layer_id, SHELF_FACING):
+            rows.append([facing_id, self.store.value(facing_id, FACING_WIDTH, 'none'),
+                         self.get_facing_height(facing_id),
+                         self.get_dimensions(shelf_layer_id)[0],
+                         self.store.value(facing_id, LEFT_SEPARATOR, 'none'),
+                         self.store.value(facing_id, RIGHT_SEPARATOR, 'none'),
+                         self.get_facing_product_type(facing_id) or 'none'])
+        return [{'Fs': rows}]
+
+    def q_set_pose(self, object_id, frame, x, y, z, qx, qy, qz, qw):
+        object_frame = self.get_frame(object_id)
+        if object_frame not in self.frames:
+            return []
+        self.frames[object_frame] = (frame, (float(x), float(y), float(z)),
+                                     (float(qx), float(qy), float(qz), float(qw)))
+        self.frames_changed = True
+        return [{}]
+
+    def q_add_shelf_layers(self, layers, shelf_system_id):
+        for layer_type, height in TYPE_HEIGHT_PATTERN.findall(layers):
+            self.add_shelf_layer(shelf_system_id, layer_type, height)
+        return [{}]
+
+    def q_add_shelf_part(self, parent_id, class_term, x, var):
+        if self.instance_of(parent_id, SHELF_FRAME):
+            part_id = self.add_shelf_layer(parent_id, expand(class_term), x)
+        else:
+            part_id = self.add_shelf_layer_part(parent_id, expand(class_term), x)
+            self.update_facings(parent_id)
+        if var.startswith('_'):
+            return [{}]
+        return [{var: part_id}]
+
+    def q_add_label(self, shelf_layer_id, class_term, dan, x):
+        self.add_shelf_layer_part(shelf_layer_id, expand(class_term), x, dan)
+        self.update_facings(shelf_layer_id)
+        return [{}]
+
+    def q_create_articles(self, dans, depth, width, height):
+        for dan in QUOTED_ATOM_PATTERN.findall(dans):
+            self.create_article(dan, (depth, width, height))
+        return [{}]
+
+    def q_bulk_insert_floor(self, shelf_layer_id, separators, labels):
+        for x in NUMBER_PATTERN.findall(separators):
+            self.add_shelf_layer_part(shelf_layer_id, SEPARATOR, x)
+        for x, dan in NUMBER_ID_PATTERN.findall(labels):
+            self.add_shelf_layer_part(shelf_layer_id, LABEL, x, dan)
+        self.update_facings(shelf_layer_id)
+        return [{}]
+
+    def q_mark_facings_dirty(self, shelf_layer_id):
+        self.update_facings(shelf_layer_id)
+        return [{}]
+
+    def q_shelf_layer_parts(self, shelf_layer_id, class_term1, class_term2):
+        class1, class2 = expand(class_term1), expand(class_term2)
+        parts = [part_id for part_id in self.store.objects(shelf_layer_id, HAS_COMPONENT)
+                 if self.instance_of(part_id, class1) or self.instance_of(part_id, class2)]
+        return [{'Cs': parts}]
+
+    def q_all_dans(self):
+        return [{'DANS': ['\'{}\''.format(dan) for dan in self.store.pos.get(DAN, {})
+                          if self.store.subjects(DAN, dan)]}]
+
+    def q_spawn_products(self, numbers):
+        for facing_id, number in ID_NUMBER_PATTERN.findall(numbers):
+            product_type = self.get_facing_product_type(facing_id) or PRODUCT
+            for _ in range(int(number)):
+                self.store.add(facing_id, PRODUCT_IN_FACING, self.add_object([product_type]))
+        return [{}]
+
+    def q_set_confidences(self, confidences):
+        for facing_id, confidence in TYPE_HEIGHT_PATTERN.findall(confidences):
+            self.store.set(facing_id, CONFIDENCE, float(confidence))
+        return [{}]
+
+    def q_confidence(self, facing_id):
+        confidence = self.store.value(facing_id, CONFIDENCE)
+        if confidence is None:
+            return []
+        return [{'C': confidence}]
+
+    def q_all_empty_facings(self):
+        return [{'Fs': [facing_id for facing_id in self.instances_of(FACING)
+                        if not self.store.has(facing_id, PRODUCT_IN_FACING)]}]
+
+    def q_empty_facings(self, shelf_layer_id):
+        return [{'Fs': [facing_id for facing_id in self.store.objects(shelf_layer_id, SHELF_FACING)
+                        if not self.store.has(facing_id, PRODUCT_IN_FACING)]}]
+
+    def q_shelf_layer_above(self, shelf_layer_id):
+        above = self.get_shelf_layer_above(shelf_layer_id)
+        if above is None:
+            return []
+        return [{'Above': above}]
+
+    def q_instance_of(self, object_id, class_term):
+        if self.instance_of(object_id, expand(class_term)):
+            return [{}]
+        return []
+
+    def q_memorize(self, path):
+        self.snapshots[path] = deepcopy((self.store, self.frames))
+        return [{}]
+
+    def q_remember(self, path):
+        if path not in self.snapshots:
+            return []
+        self.store, self.frames = deepcopy(self.snapshots[path])
+        self.subclasses = {}
+        self.frames_changed = True
+        return [{}]
+
+    def q_load_initial_beliefstate(self, *args):
+        self.load_initial_beliefstate()
+        return [{}]
+
+
+class SyntheticShop(object):
+    """
+    Initial belief state for FakeProlog: rows of shelf systems along the x axis of map, with left_right_dict
+    entries for them. If detected is True, their shelf layers, separators and labels are already in the belief state.
+    """
+
+    def __init__(self, num_of_shelf_systems=10, num_of_layers=5, num_of_facings=6, num_of_articles=100,
+                 detected=True, seed=0):
+        """
+        :type num_of_shelf_systems: int
+        :param num_of_layers: per shelf system
+        :type num_of_layers: int
+        :param num_of_facings: per shelf layer
+        :type num_of_facings: int
+        :param num_of_articles: number of known dans, labels use them round robin
+        :type num_of_articles: int
+        :type detected: bool
+        :param seed: for widths and layer heights
+        :type seed: int
+        """
+        self.num_of_shelf_systems = num_of_shelf_systems
+        self.num_of_layers = num_of_layers
+        self.num_of_facings = num_of_facings
+        self.dans = ['{0:06}'.format(i) for i in range(num_of_articles)]
+        self.detected = detected
+        self.seed = seed
+        self.shelf_system_ids = ['{}DMShelfFrame_synthetic_{}'.format(DMSHOP, i) for i in range(num_of_shelf_systems)]
+        self.left_right_dict = OrderedDict()
+        prev_id = None
+        for i, shelf_system_id in enumerate(self.shelf_system_ids):
+            self.left_right_dict[shelf_system_id] = {'side': 'left' if i % 2 == 0 else 'right',
+                                                     'starting-point': prev_id,
+                                                     'via-points': []}
+            prev_id = shelf_system_id
+
+    def __call__(self, prolog):
+        """
+        :type prolog: FakeProlog
+        """
+        rnd = np.random.RandomState(self.seed)
+        for dan in self.dans:
+            prolog.create_article(dan, (0.1, 0.05, 0.15))
+        x = 0.
+        label = 0
+        for i, shelf_system_id in enumerate(self.shelf_system_ids):
+            width = float(rnd.choice([0.6, 0.75, 1.0, 1.2]))
+            prolog.add_shelf_system(shelf_system_id, (x + width / 2, 0., 0.), width=width,
+                                    num_of_tiles=NUM_OF_TILES[i % 3], heavy=i % 4 == 0)
+            x += width
+            if not self.detected:
+                continue
+            heights = np.linspace(0.15, 1.0, self.num_of_layers) + rnd.normal(scale=0.01, size=self.num_of_layers)
+            bottom_layer_type = prolog.store.value(shelf_system_id, BOTTOM_FLOOR_TYPE)
+            layer_type = prolog.store.value(shelf_system_id, FLOOR_TYPE)
+            for j, height in enumerate(heights):
+                layer_id = prolog.add_shelf_layer(shelf_system_id, bottom_layer_type if j == 0 else layer_type, height)
+                separators = np.linspace(0, 1, self.num_of_facings + 1)
+                for separator in separators:
+                    prolog.add_shelf_layer_part(layer_id, SEPARATOR, separator)
+                for left, right in zip(separators[:-1], separators[1:]):
+                    if self.dans:
+                        prolog.add_shelf_layer_part(layer_id, LABEL, (left + right) / 2,
+                                                    self.dans[label % len(self.dans)])
+                        label += 1
+                prolog.update_facings(layer_id)
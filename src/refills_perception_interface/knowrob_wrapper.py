@@ -1,24 +1,41 @@
+import csv
 import json
-import string
+import os
 import traceback
 import yaml
-from collections import OrderedDict, defaultdict
-from multiprocessing import Lock
-from rospkg import RosPack
+from collections import OrderedDict, defaultdict, namedtuple
+from math import isnan
+from random import random
+from rospkg import RosPack, get_ros_home
+from threading import Condition, Thread, current_thread
+from time import time
 
 import rospy
-from geometry_msgs.msg import PoseStamped, Point, Quaternion
+from diagnostic_msgs.msg import DiagnosticArray, DiagnosticStatus, KeyValue
+from geometry_msgs.msg import PoseStamped, Point, Quaternion, TransformStamped
 import numpy as np
 from rospy_message_converter.message_converter import convert_dictionary_to_ros_message
 
 from std_srvs.srv import Trigger, TriggerRequest
 from tf2_geometry_msgs import do_transform_pose
+from tf2_ros import StaticTransformBroadcaster
 from visualization_msgs.msg import Marker
 
+from refills_perception_interface.beliefstate_persister import BeliefStatePersister
+from refills_perception_interface.fake_prolog import FakeProlog, SyntheticShop
+from refills_perception_interface.metadata_cache import MetadataCache, content_key
 from refills_perception_interface.not_hacks import add_separator_between_barcodes, add_edge_separators, \
-    merge_close_separators, merge_close_shelf_layers
-from refills_perception_interface.tfwrapper import transform_pose, lookup_pose, lookup_transform
-from refills_perception_interface.utils import print_with_prefix, ordered_load
+    merge_close_separators, merge_close_shelf_layers, plan_shelf_layers
+from refills_perception_interface.prolog_decoding import decode, iri, optional_iri, string as string_, \
+    optional_string, optional_float, boolean, pose, list_of, rows
+from refills_perception_interface.prolog_pool import PrologPool
+from refills_perception_interface.query_cache import QueryCache
+from refills_perception_interface.query_stats import QueryStats
+from refills_perception_interface.query_trace import QueryTraceRecorder, ReplayProlog, load_trace
+from refills_perception_interface.shop_topology import ShopTopology
+from refills_perception_interface.tfwrapper import transform_pose, lookup_pose, lookup_transform, \
+    transform_positions
+from refills_perception_interface.utils import print_with_prefix, ordered_load, ReadWriteLock
 from rosprolog_client import Prolog
 
 MAP = 'map'
@@ -50,6 +67,58 @@ DETECTED_OBJECT = '\'http://knowrob.org/kb/knowrob.owl#detectedObject\''
 
 MAX_SHELF_HEIGHT = 1.1
 
+LABEL_FIELDS = ['shelf_id', 'layer_num', 'label_num', 'dan', 'pos']
+
+ShelfType = namedtuple('ShelfType', ['num_of_tiles', 'heavy', 'bottom_layer_type', 'layer_type', 'width',
+                                     'height'])
+
+# facings of a shelf layer ordered from left to right, xs are their positions in the perceived frame of the layer
+LayerSnapshot = namedtuple('LayerSnapshot', ['frame_id', 'ids', 'xs', 'widths'])
+
+FacingInfo = namedtuple('FacingInfo', ['width', 'height', 'depth', 'left_separator', 'right_separator',
+                                       'product_type'])
+
+# tags of cached queries that become stale, when the belief state is changed in a certain way
+SHELF_LAYER_TAGS = ('shelf_layer_frame', 'shelf_layer_above', 'DMShelfBFloor', SHELF_FLOOR.replace('\'', ''))
+FACING_TAGS = ('shelf_facing', 'shelf_facing_product_type', 'comp_facingWidth', 'comp_facingHeight',
+               'comp_facingDepth', 'shop:leftSeparator', 'shop:rightSeparator')
+LABEL_TAGS = ('DMShelfLabel', 'shop:articleNumberOfLabel')
+ARTICLE_TAGS = ('shop:dan',)
+PRODUCT_TAGS = ('shop:productInFacing',)
+CONFIDENCE_TAGS = ('knowrob:confidence',)
+
+# per object queries, that prewarm fills the query cache with
+PERCEIVED_FRAME_ID_QUERY = 'object_feature(\'{}\', Feature, dmshop:\'DMShelfPerceptionFeature\'),' \
+                           'holds(Feature, knowrob:frameName, FeatureFrame).'
+PERCEIVED_FRAME_ID_SCHEMA = {'FeatureFrame': iri}
+OBJECT_FRAME_ID_QUERY = 'holds(\'{}\', knowrob:frameName, R).'
+OBJECT_FRAME_ID_SCHEMA = {'R': iri}
+OBJECT_DIMENSIONS_QUERY = 'object_dimensions(\'{}\', D, W, H).'
+# everything about the type of a shelf system, Tiles are indices of TILE_CLASSES the system is an instance of
+TILE_CLASSES = [SHELF_T5, SHELF_T6, SHELF_T7]
+NUM_OF_TILES = [5, 6, 7]
+SHELF_TYPE_GOAL = 'findall(_I, (nth0(_I, [{tile_classes}], _T), instance_of({shelf}, _T)), Tiles), ' \
+                  '(instance_of({shelf}, {heavy}) -> Heavy = true ; Heavy = false), ' \
+                  '(shelf_bottom_floor_type({shelf}, BottomLayerType) -> true ; BottomLayerType = none), ' \
+                  '(shelf_floor_type({shelf}, LayerType) -> true ; LayerType = none), ' \
+                  'object_dimensions({shelf}, D, W, H)'
+SHELF_TYPE_QUERY = SHELF_TYPE_GOAL.format(shelf='\'{0}\'', tile_classes=', '.join(TILE_CLASSES), heavy=SHELF_H) + '.'
+SHELF_TYPE_SCHEMA = {'Tiles': list_of(int), 'Heavy': boolean, 'BottomLayerType': optional_iri,
+                     'LayerType': optional_iri}
+# bump this, when the format of the solutions in the metadata cache changes
+METADATA_CACHE_VERSION = '2'
+
+FINISHED_BY_TIMEOUT = 'timeout'
+FINISHED_BY_CANCEL = 'cancel'
+
+
+class QueryCancelled(Exception):
+    pass
+
+
+class QueryTimeout(QueryCancelled):
+    pass
+
 class KnowRob(object):
     prefix = 'knowrob_wrapper'
 
@@ -57,16 +126,88 @@ class KnowRob(object):
         super(KnowRob, self).__init__()
         self.read_left_right_json()
         self.separators = {}
-        self.perceived_frame_id_map = {}
-        self.print_with_prefix('waiting for knowrob')
-        self.prolog = Prolog()
-        self.print_with_prefix('knowrob showed up')
-        self.query_lock = Lock()
-        rospy.wait_for_service('/visualization_marker_array')
-        self.reset_object_state_publisher = rospy.ServiceProxy('/visualization_marker_array',
-                                                               Trigger)
-        self.shelf_layer_from_facing = {}
-        self.shelf_system_from_layer = {}
+        self.query_cache = QueryCache()
+        self.dan_index = None
+        self.bulk_insert_timeout = rospy.get_param('~bulk_insert_timeout', 5.0)
+        # the per layer insertion is kept to compare against
+        self.bulk_insert_shelf_layers = rospy.get_param('~bulk_insert_shelf_layers', True)
+        self.last_bulk_insert_wait = None
+        # empty string disables snapshots
+        self.snapshot_dir = rospy.get_param('~beliefstate_snapshot_dir',
+                                            os.path.join(get_ros_home(), 'refills_perception_interface',
+                                                         'beliefstate_snapshot'))
+        # initial belief state that is saved in snapshot_dir
+        self.snapshot_of = None
+        # answers all queries from a trace recorded with ~query_trace instead of KnowRob, empty string disables it
+        self.replay_path = rospy.get_param('~query_trace_replay', '')
+        if self.replay_path:
+            self.print_with_prefix('replaying queries from {}'.format(self.replay_path))
+            replay = ReplayProlog(load_trace(self.replay_path), rospy.get_param('~query_trace_replay_latency', False))
+            self.prolog = replay
+            self.prolog_pool = PrologPool(rospy.get_param('~prolog_pool_size', 4), lambda: replay)
+        elif rospy.get_param('~fake_prolog', False):
+            self.prolog = self.make_fake_prolog()
+            self.prolog_pool = PrologPool(rospy.get_param('~prolog_pool_size', 4), lambda: self.prolog)
+        else:
+            self.print_with_prefix('waiting for knowrob')
+            # all writes go through this session
+            self.prolog = Prolog()
+            self.prolog_pool = PrologPool(rospy.get_param('~prolog_pool_size', 4), Prolog)
+            self.print_with_prefix('knowrob showed up')
+        # every query is recorded to this file, empty string disables it
+        query_trace_path = rospy.get_param('~query_trace', '')
+        self.query_trace = None
+        if query_trace_path:
+            self.query_trace = QueryTraceRecorder(query_trace_path)
+            rospy.on_shutdown(self.query_trace.close)
+            self.print_with_prefix('recording queries to {}'.format(query_trace_path))
+        self.query_lock = ReadWriteLock()
+        self.shop_topology = ShopTopology(self)
+        # default deadline of a query in seconds
+        self.query_timeout = rospy.get_param('~query_timeout', 30.0)
+        # loading, saving and restoring the whole belief state takes longer
+        self.beliefstate_timeout = rospy.get_param('~beliefstate_timeout', 600.0)
+        # maps running rosprolog queries to (thread, None or why they were finished early, deadline)
+        self.running_queries = {}
+        # notifies the watchdog about queries with an earlier deadline than the one it is waiting for
+        self.running_queries_lock = Condition()
+        self.next_deadline = None
+        self.query_watchdog = Thread(target=self.watch_query_deadlines, name='query_watchdog')
+        self.query_watchdog.daemon = True
+        self.query_watchdog.start()
+        # fills the query cache with the metadata of the whole shop after loading the belief state,
+        # interface.launch turns it on
+        self.prewarm_enabled = rospy.get_param('~prewarm', False)
+        # prewarmed metadata is saved here and read again on the next start, empty string disables it.
+        # Only used when prewarming.
+        self.metadata_cache_dir = rospy.get_param('~metadata_cache_dir',
+                                                  os.path.join(get_ros_home(), 'refills_perception_interface',
+                                                               'metadata_cache'))
+        self.query_stats = QueryStats(rospy.get_param('~query_stats_window', 1000))
+        # fraction of queries that are logged with their solutions
+        self.query_log_sample_rate = rospy.get_param('~query_log_sample_rate', 0.0)
+        self.diagnostics_pub = rospy.Publisher('/diagnostics', DiagnosticArray, queue_size=1)
+        self.query_stats_timer = rospy.Timer(rospy.Duration(rospy.get_param('~query_stats_period', 5.0)),
+                                             self.publish_query_stats)
+        # number of writes, checkpoints are only taken if it changed since the last one
+        self.num_of_writes = 0
+        self.num_of_writes_at_checkpoint = 0
+        self.persister = BeliefStatePersister(self.memorize,
+                                              rospy.get_param('~checkpoint_dir',
+                                                              os.path.join(get_ros_home(),
+                                                                           'refills_perception_interface',
+                                                                           'checkpoints')),
+                                              rospy.get_param('~max_checkpoints', 5))
+        # seconds between checkpoints, 0 disables them
+        checkpoint_period = rospy.get_param('~checkpoint_period', 0.0)
+        self.checkpoint_timer = None
+        if checkpoint_period > 0:
+            self.checkpoint_timer = rospy.Timer(rospy.Duration(checkpoint_period), self.checkpoint)
+        self.reset_object_state_publisher = None
+        if not self.replay_path and not isinstance(self.prolog, FakeProlog):
+            rospy.wait_for_service('/visualization_marker_array')
+            self.reset_object_state_publisher = rospy.ServiceProxy('/visualization_marker_array',
+                                                                   Trigger)
 
     def print_with_prefix(self, msg):
         """
@@ -74,18 +215,238 @@ class KnowRob(object):
         """
         print_with_prefix(msg, self.prefix)
 
-    def once(self, q):
-        r = self.all_solutions(q)
+    def make_fake_prolog(self):
+        """
+        Stand-in for KnowRob with a synthetic shop as initial belief state, whose frames are published on tf.
+        The shop replaces the left right json, if there is none.
+        :rtype: FakeProlog
+        """
+        start = time()
+        shop = SyntheticShop(rospy.get_param('~fake_shop_shelf_systems', 10),
+                             rospy.get_param('~fake_shop_layers', 5),
+                             rospy.get_param('~fake_shop_facings', 6),
+                             detected=rospy.get_param('~fake_shop_detected', True))
+        prolog = FakeProlog(shop)
+        if not getattr(self, 'left_right_dict', None):
+            self.left_right_dict = shop.left_right_dict
+        self.tf_broadcaster = StaticTransformBroadcaster()
+        prolog.on_frames_changed = self.publish_fake_frames
+        self.publish_fake_frames(prolog.get_transforms())
+        self.print_with_prefix('using fake prolog with {} shelf systems, created in {:.3f}s'.format(
+            len(shop.shelf_system_ids), time() - start))
+        return prolog
+
+    def publish_fake_frames(self, transforms):
+        """
+        :param transforms: list of (parent frame, child frame, position, orientation)
+        :type transforms: list
+        """
+        msgs = []
+        for parent, child, position, orientation in transforms:
+            msg = TransformStamped()
+            msg.header.stamp = rospy.get_rostime()
+            msg.header.frame_id = parent
+            msg.child_frame_id = child
+            msg.transform.translation.x, msg.transform.translation.y, msg.transform.translation.z = position
+            msg.transform.rotation.x, msg.transform.rotation.y, msg.transform.rotation.z, \
+                msg.transform.rotation.w = orientation
+            msgs.append(msg)
+        # static transforms replace each other, so all of them are sent every time
+        self.tf_broadcaster.sendTransform(msgs)
+
+    def once(self, q, read_only=False, cache=True, timeout=None, schema=None, background=False, invalidates=()):
+        r = self.all_solutions(q, read_only, cache, timeout, schema, background, invalidates)
         if len(r) == 0:
             return []
         return r[0]
 
-    def all_solutions(self, q):
-        self.print_with_prefix(q)
-        r = self.prolog.all_solutions(q)
-        self.print_with_prefix('result: {}'.format(r))
+    def all_solutions(self, q, read_only=False, cache=True, timeout=None, schema=None, background=False,
+                      invalidates=()):
+        """
+        :param read_only: read only queries run in parallel on the prolog pool, everything else is considered a write
+                            and runs exclusively on the writer session.
+        :type read_only: bool
+        :param cache: solutions of read only queries are cached, until a write makes them stale.
+                        Don't modify the returned solutions of such queries.
+        :type cache: bool
+        :param timeout: the query is finished after this many seconds and QueryTimeout is raised,
+                        defaults to ~query_timeout
+        :type timeout: float
+        :param schema: maps variable names to decoders from prolog_decoding, solutions are decoded before they are
+                        cached. Use the same schema for the same query.
+        :type schema: dict
+        :param background: for long read only queries, writes still wait for them, but other reads don't wait for
+                            those writes, see ReadWriteLock.
+        :type background: bool
+        :param invalidates: tags of the cached queries that a write makes stale, see QueryCache.invalidate.
+                            They are evicted before the write lock is released, such that no read can see them.
+        :type invalidates: iterable
+        :raises QueryCancelled: if cancel_queries was called while the query was running
+        :rtype: list
+        """
+        if timeout is None:
+            timeout = self.query_timeout
+        cache = read_only and cache
+        if cache:
+            hit, r = self.query_cache.get(q)
+            if hit:
+                return r
+        if read_only:
+            with self.query_lock.read(background):
+                with self.prolog_pool.session() as prolog:
+                    start = time()
+                    r = self.run_query(prolog, q, timeout)
+                    latency = time() - start
+                if schema is not None:
+                    r = decode(r, schema)
+                if cache:
+                    # still holding the read lock, such that no write can happen in between
+                    self.query_cache.put(q, r)
+        else:
+            with self.query_lock.write():
+                self.num_of_writes += 1
+                start = time()
+                try:
+                    r = self.run_query(self.prolog, q, timeout)
+                except QueryCancelled:
+                    # we don't know how much of the write happened
+                    self.forget_beliefstate()
+                    raise
+                finally:
+                    # also after errors, part of the write might have happened
+                    if invalidates:
+                        self.query_cache.invalidate(*invalidates)
+                latency = time() - start
+            if schema is not None:
+                r = decode(r, schema)
+        self.query_stats.record(q, latency, r)
+        if self.query_log_sample_rate > 0 and random() < self.query_log_sample_rate:
+            self.print_with_prefix('{} took {:.4f}s, result: {}'.format(q, latency, r))
         return r
 
+    def run_query(self, prolog, q, timeout):
+        """
+        Runs q on the rosprolog side and finishes it there, if it takes longer than timeout or is canceled.
+        :type prolog: Prolog
+        :type q: str
+        :type timeout: float
+        :rtype: list
+        """
+        start = time()
+        # iterative, such that the solutions are computed by the next solution calls, which finish can abort.
+        # Opening only starts the query.
+        query = prolog.query(q)
+        deadline = start + timeout
+        with self.running_queries_lock:
+            self.running_queries[query] = (current_thread(), None, deadline)
+            if self.next_deadline is None or deadline < self.next_deadline:
+                self.running_queries_lock.notify()
+        try:
+            r = list(query.solutions())
+            if self.query_trace is not None:
+                self.query_trace.record(q, r, time() - start)
+            return r
+        except Exception as e:
+            with self.running_queries_lock:
+                finished_by = self.running_queries[query][1]
+            if self.query_trace is not None and finished_by is None:
+                self.query_trace.record(q, [], time() - start, str(e))
+            if finished_by == FINISHED_BY_TIMEOUT:
+                raise QueryTimeout('query did not finish within {}s: {}'.format(timeout, q))
+            if finished_by == FINISHED_BY_CANCEL:
+                raise QueryCancelled('query was cancelled: {}'.format(q))
+            raise
+        finally:
+            with self.running_queries_lock:
+                _, finished_by, _ = self.running_queries.pop(query)
+            if finished_by is None:
+                query.finish()
+
+    def watch_query_deadlines(self):
+        """
+        Finishes queries that run into their deadline, one thread for all queries.
+        """
+        while True:
+            with self.running_queries_lock:
+                now = time()
+                deadlines = [deadline for _, finished_by, deadline in self.running_queries.values()
+                             if finished_by is None]
+                expired = [query for query, (_, finished_by, deadline) in self.running_queries.items()
+                           if finished_by is None and deadline <= now]
+                if not expired:
+                    self.next_deadline = min(deadlines) if deadlines else None
+                    self.running_queries_lock.wait(None if self.next_deadline is None else self.next_deadline - now)
+                    continue
+            for query in expired:
+                self.finish_query(query, FINISHED_BY_TIMEOUT)
+
+    def finish_query(self, query, reason):
+        """
+        Finishes a running query on the rosprolog side, unless it is already finished.
+        :type query: rosprolog_client.PrologQuery
+        :param reason: FINISHED_BY_TIMEOUT or FINISHED_BY_CANCEL
+        :type reason: str
+        :return: whether the query was still running
+        :rtype: bool
+        """
+        with self.running_queries_lock:
+            if query not in self.running_queries or self.running_queries[query][1] is not None:
+                return False
+            thread, _, deadline = self.running_queries[query]
+            self.running_queries[query] = (thread, reason, deadline)
+        if reason == FINISHED_BY_TIMEOUT:
+            rospy.logwarn('finishing query that ran into its deadline')
+        try:
+            query.finish()
+        except Exception as e:
+            rospy.logwarn('failed to finish query: {}'.format(e))
+        return True
+
+    def cancel_queries(self, thread=None):
+        """
+        Finishes running queries, the callers get a QueryCancelled exception.
+        :param thread: only queries that were started by this thread are cancelled, all if None
+        :type thread: threading.Thread
+        :return: number of cancelled queries
+        :rtype: int
+        """
+        with self.running_queries_lock:
+            queries = [query for query, (query_thread, _, _) in self.running_queries.items()
+                       if thread is None or query_thread == thread]
+        cancelled = sum(self.finish_query(query, FINISHED_BY_CANCEL) for query in queries)
+        if cancelled:
+            self.print_with_prefix('cancelled {} queries'.format(cancelled))
+        return cancelled
+
+    def publish_query_stats(self, event=None):
+        """
+        Publishes latency and result size percentiles of all queries so far, one DiagnosticStatus per predicate.
+        """
+        msg = DiagnosticArray()
+        msg.header.stamp = rospy.get_rostime()
+        for predicate, stats in self.query_stats.get_stats().items():
+            status = DiagnosticStatus()
+            status.level = DiagnosticStatus.OK
+            status.name = '{}: prolog {}'.format(rospy.get_name(), predicate)
+            status.hardware_id = 'knowrob'
+            status.message = '{} calls, p95 {:.1f}ms'.format(stats['count'], stats['latency_p95'] * 1000)
+            status.values = [KeyValue(key, str(value)) for key, value in sorted(stats.items())]
+            msg.status.append(status)
+        cache_status = DiagnosticStatus()
+        cache_status.level = DiagnosticStatus.OK
+        cache_status.name = '{}: query cache'.format(rospy.get_name())
+        cache_status.hardware_id = 'knowrob'
+        cache_status.values = [KeyValue(key, str(value)) for key, value in sorted(self.get_query_cache_stats().items())]
+        msg.status.append(cache_status)
+        self.diagnostics_pub.publish(msg)
+
+    def get_query_cache_stats(self):
+        """
+        :return: dict with number of cache hits, which is the number of saved Prolog calls, misses and size.
+        :rtype: dict
+        """
+        return self.query_cache.get_stats()
+
     def pose_to_prolog(self, pose_stamped):
         """
         :type pose_stamped: PoseStamped
@@ -150,39 +511,54 @@ class KnowRob(object):
     def get_shelf_pose(self, shelf_system_id):
         return lookup_pose("map", self.get_object_frame_id(shelf_system_id))
 
+    def get_shelf_type(self, shelf_system_id):
+        """
+        Resolves number of tiles, heavy or light, layer types and size of a shelf system with one cached query.
+        :type shelf_system_id: str
+        :rtype: ShelfType
+        """
+        solution = self.once(SHELF_TYPE_QUERY.format(shelf_system_id), read_only=True, schema=SHELF_TYPE_SCHEMA)
+        if not solution:
+            raise Exception('Could not identify shelf type of {}.'.format(shelf_system_id))
+        return self.shelf_type_from_solution(solution)
+
+    def shelf_type_from_solution(self, solution):
+        """
+        :param solution: decoded solution of SHELF_TYPE_QUERY
+        :type solution: dict
+        :rtype: ShelfType
+        """
+        tiles = solution['Tiles']
+        return ShelfType(num_of_tiles=NUM_OF_TILES[min(tiles)] if tiles else None,
+                         heavy=solution['Heavy'],
+                         bottom_layer_type=solution['BottomLayerType'],
+                         layer_type=solution['LayerType'],
+                         width=solution['W'],
+                         height=solution['H'])
+
     def get_num_of_tiles(self, shelf_system_id):
-        if self.is_5tile_system(shelf_system_id):
-            return 5
-        elif self.is_6tile_system(shelf_system_id):
-            return 6
-        elif self.is_7tile_system(shelf_system_id):
-            return 7
-        else:
+        num_of_tiles = self.get_shelf_type(shelf_system_id).num_of_tiles
+        if num_of_tiles is None:
             raise Exception('Could not identify number of tiles for shelf {}.'.format(shelf_system_id))
+        return num_of_tiles
 
     def is_5tile_system(self, shelf_system_id):
-        q = 'instance_of(\'{}\', {})'.format(shelf_system_id, SHELF_T5)
-        return self.once(q) == {}
+        return self.get_shelf_type(shelf_system_id).num_of_tiles == 5
 
     def is_heavy_system(self, shelf_system_id):
-        q = 'instance_of(\'{}\', {})'.format(shelf_system_id, SHELF_H)
-        return self.once(q) == {}
+        return self.get_shelf_type(shelf_system_id).heavy
 
     def is_6tile_system(self, shelf_system_id):
-        q = 'instance_of(\'{}\', {})'.format(shelf_system_id, SHELF_T6)
-        return self.once(q) == {}
+        return self.get_shelf_type(shelf_system_id).num_of_tiles == 6
 
     def is_7tile_system(self, shelf_system_id):
-        q = 'instance_of(\'{}\', {})'.format(shelf_system_id, SHELF_T7)
-        return self.once(q) == {}
+        return self.get_shelf_type(shelf_system_id).num_of_tiles == 7
 
     def get_bottom_layer_type(self, shelf_system_id):
-        q = 'shelf_bottom_floor_type(\'{}\', LayerType).'.format(shelf_system_id)
-        return self.once(q)['LayerType']
+        return self.get_shelf_type(shelf_system_id).bottom_layer_type
 
     def get_shelf_layer_type(self, shelf_system_id):
-        q = 'shelf_floor_type(\'{}\', LayerType).'.format(shelf_system_id)
-        return self.once(q)['LayerType']
+        return self.get_shelf_type(shelf_system_id).layer_type
 
     def get_shelf_layer_from_system(self, shelf_system_id):
         """
@@ -195,23 +571,60 @@ class KnowRob(object):
             'object_feature_type(Floor, Feature, dmshop:\'DMShelfPerceptionFeature\'),' \
             'object_frame_name(Feature, FeatureFrame).'.format(shelf_system_id, SHELF_FLOOR)
 
-        solutions = self.all_solutions(q)
-        floors = []
-        shelf_frame_id = self.get_perceived_frame_id(shelf_system_id)
-        for solution in solutions:
-            floor_id = solution['Floor'].replace('\'', '')
-            floor_pose = lookup_pose(shelf_frame_id, solution['FeatureFrame'].replace('\'', ''))
-            floors.append((floor_id, floor_pose))
+        solutions = self.all_solutions(q, read_only=True, schema={'Floor': iri, 'FeatureFrame': iri})
+        floors = [(solution['Floor'], solution['FeatureFrame']) for solution in solutions]
+        self.floors = self.sort_shelf_layers(self.get_perceived_frame_id(shelf_system_id), floors)
+        return self.floors
+
+    def get_all_shelf_layers(self):
+        """
+        Like get_shelf_layer_from_system, but for all shelf systems with two queries.
+        :return: dict mapping shelf system and floor ids to their perceived frame id,
+                    dict mapping shelf system id to an OrderedDict, which maps floor id to pose,
+                    ordered from lowest to highest
+        :rtype: tuple
+        """
+        q = 'findall([S, FeatureFrame], ' \
+            '(instance_of(S, {}), ' \
+            'object_feature(S, Feature, dmshop:\'DMShelfPerceptionFeature\'), ' \
+            'holds(Feature, knowrob:frameName, FeatureFrame)), Ss).'.format(SHELF_SYSTEM)
+        frame_ids = dict(self.once(q, read_only=True, schema={'Ss': rows(iri, iri)})['Ss'])
+        shelf_system_ids = list(frame_ids.keys())
+        q = 'findall([S, Floor, FeatureFrame], ' \
+            '(instance_of(S, {}), triple(S, dul:hasComponent, Floor), instance_of(Floor, {}), ' \
+            'object_feature_type(Floor, Feature, dmshop:\'DMShelfPerceptionFeature\'), ' \
+            'object_frame_name(Feature, FeatureFrame)), Fs).'.format(SHELF_SYSTEM, SHELF_FLOOR)
+        floors = defaultdict(list)
+        for shelf_system_id, floor_id, frame_id in self.once(q, read_only=True, schema={'Fs': rows(iri, iri, iri)})['Fs']:
+            floors[shelf_system_id].append((floor_id, frame_id))
+            frame_ids[floor_id] = frame_id
+        shelf_layers = {shelf_system_id: self.sort_shelf_layers(frame_ids[shelf_system_id], floors[shelf_system_id])
+                        for shelf_system_id in shelf_system_ids}
+        return frame_ids, shelf_layers
+
+    def sort_shelf_layers(self, shelf_frame_id, floors):
+        """
+        :param shelf_frame_id: perceived frame id of the shelf system
+        :type shelf_frame_id: str
+        :param floors: list of (floor id, perceived frame id of the floor)
+        :type floors: list
+        :return: dict mapping floor id to pose in shelf frame ordered from lowest to highest,
+                    floors above MAX_SHELF_HEIGHT are skipped
+        :rtype: OrderedDict
+        """
+        floors = [(floor_id, lookup_pose(shelf_frame_id, frame_id)) for floor_id, frame_id in floors]
         floors = list(sorted(floors, key=lambda x: x[1].pose.position.z))
         floors = [x for x in floors if x[1].pose.position.z < MAX_SHELF_HEIGHT]
-        self.floors = OrderedDict(floors)
-        return self.floors
+        return OrderedDict(floors)
 
     def get_object_of_facing(self, facing_id):
+        facing = self.get_facing_info(facing_id)
+        if facing:
+            return facing.product_type
         q = 'shelf_facing_product_type(\'{}\', P)'.format(facing_id)
-        solutions = self.all_solutions(q)
+        solutions = self.all_solutions(q, read_only=True, schema={'P': iri})
         if solutions:
-            return solutions[0]['P'].replace('\'','')
+            return solutions[0]['P']
 
     def get_object_dimensions(self, object_class):
         """
@@ -219,7 +632,7 @@ class KnowRob(object):
         :return: [x length/depth, y length/width, z length/height]
         """
         q = 'object_dimensions(\'{}\', X_num, Y_num, Z_num).'.format(object_class)
-        solutions = self.once(q)
+        solutions = self.once(q, read_only=True)
         if solutions:
             return [solutions['Y_num'], solutions['X_num'], solutions['Z_num']]
 
@@ -231,15 +644,92 @@ class KnowRob(object):
         """
         shelf_system_id = self.get_shelf_system_from_layer(shelf_layer_id)
         q = 'findall([F, P], (shelf_facing(\'{}\', F),is_at(F, P)), Fs).'.format(shelf_layer_id)
-        solutions = self.all_solutions(q)[0]
-        facings = []
-        for facing_id, pose in solutions['Fs']:
-            facing_pose = self.prolog_to_pose_msg(pose)
-            facing_pose = transform_pose(self.get_perceived_frame_id(shelf_layer_id), facing_pose)
-            facings.append((facing_id, facing_pose))
+        solutions = self.all_solutions(q, read_only=True, schema={'Fs': rows(iri, pose)})[0]
+        return self.sort_facings(shelf_system_id, self.get_perceived_frame_id(shelf_layer_id), solutions['Fs'])
+
+    def get_layer_snapshot(self, shelf_layer_id):
+        """
+        Ids, positions and widths of all facings of a shelf layer with one query and one transform lookup.
+        :type shelf_layer_id: str
+        :rtype: LayerSnapshot
+        """
+        q = 'findall([F, P, W], (shelf_facing(\'{}\', F), is_at(F, P), ' \
+            '(comp_facingWidth(F, W_XSD) -> atom_number(W_XSD, W) ; W = none)), Fs).'.format(shelf_layer_id)
+        return self.make_layer_snapshot(self.get_shelf_system_from_layer(shelf_layer_id),
+                                        self.get_perceived_frame_id(shelf_layer_id),
+                                        self.once(q, read_only=True, schema={'Fs': rows(iri, pose, optional_float)})['Fs'])
+
+    def get_all_layer_snapshots(self):
+        """
+        Like get_layer_snapshot, but for all shelf layers with facings with one query.
+        :return: maps shelf layer id to LayerSnapshot
+        :rtype: dict
+        """
+        q = 'findall([S, L, LayerFrame, F, P, W], ' \
+            '(instance_of(L, {}), shelf_layer_frame(L, S), ' \
+            'object_feature_type(L, Feature, dmshop:\'DMShelfPerceptionFeature\'), ' \
+            'object_frame_name(Feature, LayerFrame), ' \
+            'shelf_facing(L, F), is_at(F, P), ' \
+            '(comp_facingWidth(F, W_XSD) -> atom_number(W_XSD, W) ; W = none)), Fs).'.format(SHELF_FLOOR)
+        facings = defaultdict(list)
+        layers = {}
+        schema = {'Fs': rows(iri, iri, iri, iri, pose, optional_float)}
+        for shelf_system_id, shelf_layer_id, layer_frame_id, facing_id, facing_pose, width in \
+                self.once(q, read_only=True, schema=schema)['Fs']:
+            layers[shelf_layer_id] = (shelf_system_id, layer_frame_id)
+            facings[shelf_layer_id].append((facing_id, facing_pose, width))
+        return {shelf_layer_id: self.make_layer_snapshot(shelf_system_id, layer_frame_id, facings[shelf_layer_id])
+                for shelf_layer_id, (shelf_system_id, layer_frame_id) in layers.items()}
+
+    def make_layer_snapshot(self, shelf_system_id, shelf_layer_frame_id, facings):
+        """
+        :type shelf_system_id: str
+        :param shelf_layer_frame_id: perceived frame id of the shelf layer
+        :type shelf_layer_frame_id: str
+        :param facings: list of (facing id, PrologPose, width or nan)
+        :type facings: list
+        :rtype: LayerSnapshot
+        """
+        ids = [facing_id for facing_id, _, _ in facings]
+        xs = np.zeros(len(facings))
+        widths = np.array([width for _, _, width in facings], dtype=float)
+        frame_ids = np.array([facing_pose.frame_id for _, facing_pose, _ in facings])
+        positions = np.array([facing_pose.position for _, facing_pose, _ in facings], dtype=float).reshape(-1, 3)
+        for frame_id in set(frame_ids.tolist()):
+            rows = frame_ids == frame_id
+            if frame_id == shelf_layer_frame_id:
+                xs[rows] = positions[rows, 0]
+            else:
+                xs[rows] = transform_positions(positions[rows], lookup_transform(shelf_layer_frame_id, frame_id))[:, 0]
+        is_left = 1 if self.is_left(shelf_system_id) else -1
+        order = np.argsort(xs * is_left, kind='mergesort')
+        return LayerSnapshot(shelf_layer_frame_id, [ids[i] for i in order], xs[order], widths[order])
+
+    def sort_facings(self, shelf_system_id, shelf_layer_frame_id, facings):
+        """
+        :type shelf_system_id: str
+        :param shelf_layer_frame_id: perceived frame id of the shelf layer
+        :type shelf_layer_frame_id: str
+        :param facings: list of (facing id, PrologPose)
+        :type facings: list
+        :return: dict mapping facing id to pose in shelf layer frame, ordered from left to right
+        :rtype: OrderedDict
+        """
+        transforms = {}
+        sorted_facings = []
+        for facing_id, prolog_pose in facings:
+            facing_pose = PoseStamped()
+            facing_pose.header.frame_id = prolog_pose.frame_id
+            facing_pose.pose.position = Point(*prolog_pose.position)
+            facing_pose.pose.orientation = Quaternion(*prolog_pose.orientation)
+            source_frame_id = facing_pose.header.frame_id
+            if source_frame_id not in transforms:
+                transforms[source_frame_id] = lookup_transform(shelf_layer_frame_id, source_frame_id)
+            facing_pose = transform_pose(shelf_layer_frame_id, facing_pose, transforms[source_frame_id])
+            sorted_facings.append((facing_id, facing_pose))
         is_left = 1 if self.is_left(shelf_system_id) else -1
-        facings = list(sorted(facings, key=lambda x: x[1].pose.position.x * is_left))
-        return OrderedDict(facings)
+        sorted_facings = list(sorted(sorted_facings, key=lambda x: x[1].pose.position.x * is_left))
+        return OrderedDict(sorted_facings)
 
     def get_label_ids(self, layer_id):
         """
@@ -251,7 +741,7 @@ class KnowRob(object):
         """
         q = 'findall([L, X], (triple(\'{}\', dul:hasComponent, L), instance_of(L, dmshop:\'DMShelfLabel\'), is_at(L, [\'{}\' ,[X,_,_], _])), Ls).'.format(
             layer_id, layer_id)
-        solutions = self.all_solutions(q)[0]
+        solutions = self.all_solutions(q, read_only=True)[0]
         sorted_solutions = list(sorted(solutions['Ls'], key=lambda x: x[1]))
         return [solution[0] for solution in sorted_solutions]
 
@@ -264,8 +754,8 @@ class KnowRob(object):
         :rtype: str
         """
         q = 'triple(\'{}\', shop:articleNumberOfLabel, _AN), triple(_AN, shop:dan, DAN).'.format(label_id)
-        solution = self.once(q)
-        return solution['DAN'][1:-1]
+        solution = self.once(q, read_only=True, schema={'DAN': string_})
+        return solution['DAN']
 
     def get_label_pos(self, label_id):
         """
@@ -277,7 +767,7 @@ class KnowRob(object):
         """
         q = 'triple(_Layer, dul:hasComponent, \'{}\'), instance_of(_Layer, shop:\'ShelfLayer\'), is_at(\'{}\', [_Layer,[Pos,_,_],_]), object_dimensions(_Layer, _, Width, _).'.format(
             label_id, label_id)
-        solution = self.once(q)
+        solution = self.once(q, read_only=True)
         return solution['Pos'] + solution['Width'] / 2.0
 
 
@@ -287,17 +777,70 @@ class KnowRob(object):
         :return: Read label information, ready for export.
         :rtype: list
         """
-        labels = []
-        for shelf_id in self.get_shelf_system_ids(filter_with_left_right_dict=False):
-            for layer_num, layer_id in enumerate(self.get_shelf_layer_from_system(shelf_id).keys()):
-                for label_num, label_id in enumerate(self.get_label_ids(layer_id)):
-                    labels.append({
-                        "label_num": label_num+1,
-                        "shelf_id": shelf_id,
-                        "layer_num": layer_num + 1,
-                        "dan": self.get_label_dan(label_id),
-                        "pos": self.get_label_pos(label_id)})
-        return labels
+        return list(self.iter_labels())
+
+    def iter_labels(self):
+        """
+        Fetches all labels of the shop with two queries and yields them shelf by shelf, layer by layer,
+        from left to right. Layers are ordered by their height in the shelf, like in get_shelf_layer_from_system.
+        :return: generator of dicts with the keys in LABEL_FIELDS
+        """
+        q = 'findall([S, L, Z, W], ' \
+            '(instance_of(S, {}), triple(S, dul:hasComponent, L), instance_of(L, {}), ' \
+            'object_feature_type(S, SF, dmshop:\'DMShelfPerceptionFeature\'), ' \
+            'object_feature_type(L, LF, dmshop:\'DMShelfPerceptionFeature\'), ' \
+            'is_at(LF, [SF, [_, _, Z], _]), object_dimensions(L, _, W, _)), Ls).'.format(SHELF_SYSTEM, SHELF_FLOOR)
+        layers = defaultdict(list)
+        layer_widths = {}
+        for shelf_id, layer_id, z, width in self.once(q, read_only=True, cache=False,
+                                                      schema={'Ls': rows(iri, iri, float, float)})['Ls']:
+            if z < MAX_SHELF_HEIGHT:
+                layers[shelf_id].append((z, layer_id))
+            layer_widths[layer_id] = width
+
+        q = 'findall([L, Label, X, DAN], ' \
+            '(instance_of(L, {}), triple(L, dul:hasComponent, Label), instance_of(Label, {}), ' \
+            'is_at(Label, [L, [X, _, _], _]), ' \
+            '(triple(Label, shop:articleNumberOfLabel, AN), triple(AN, shop:dan, DAN) -> true ; DAN = none)), ' \
+            'Ls).'.format(SHELF_FLOOR, BARCODE)
+        labels = defaultdict(list)
+        for layer_id, _, x, dan in self.once(q, read_only=True, cache=False,
+                                             schema={'Ls': rows(iri, None, float, optional_string)})['Ls']:
+            labels[layer_id].append((x, dan))
+
+        for shelf_id, shelf_layers in layers.items():
+            for layer_num, (_, layer_id) in enumerate(sorted(shelf_layers)):
+                for label_num, (x, dan) in enumerate(sorted(labels[layer_id], key=lambda x: x[0])):
+                    yield {'label_num': label_num + 1,
+                           'shelf_id': shelf_id,
+                           'layer_num': layer_num + 1,
+                           'dan': dan,
+                           'pos': x + layer_widths[layer_id] / 2.0}
+
+    def export_labels(self, path, format='jsonl'):
+        """
+        Streams all labels into a file, one row per label.
+        :type path: str
+        :param format: 'jsonl' or 'csv'
+        :type format: str
+        :return: number of exported labels
+        :rtype: int
+        """
+        num_of_labels = 0
+        with open(path, 'w') as f:
+            if format == 'csv':
+                writer = csv.DictWriter(f, fieldnames=LABEL_FIELDS)
+                writer.writeheader()
+                write_row = writer.writerow
+            elif format == 'jsonl':
+                write_row = lambda row: f.write(json.dumps(row) + '\n')
+            else:
+                raise ValueError('unknown label export format {}'.format(format))
+            for label in self.iter_labels():
+                write_row(label)
+                num_of_labels += 1
+        self.print_with_prefix('exported {} labels to {}'.format(num_of_labels, path))
+        return num_of_labels
 
     def shelf_system_exists(self, shelf_system_id):
         """
@@ -312,7 +855,7 @@ class KnowRob(object):
         :rtype: bool
         """
         q = 'shelf_layer_frame(\'{}\', _).'.format(shelf_layer_id)
-        return self.once(q) == {}
+        return self.once(q, read_only=True) == {}
 
     def facing_exists(self, facing_id):
         """
@@ -320,34 +863,63 @@ class KnowRob(object):
         :rtype: bool
         """
         q = 'shelf_facing(L, \'{}\').'.format(facing_id)
-        return len(self.all_solutions(q)) != 0
+        return len(self.all_solutions(q, read_only=True)) != 0
+
+    def get_facing_table(self, shelf_layer_id):
+        """
+        Fetches width, height, depth, separators and product type of all facings of a shelf layer with one query.
+        Width, height or depth are nan, if they can't be computed, the other fields None.
+        :type shelf_layer_id: str
+        :return: maps facing id to FacingInfo
+        :rtype: OrderedDict
+        """
+        q = 'findall([F, W, H, D, L, R, P], ' \
+            '(shelf_facing(\'{}\', F), ' \
+            '(comp_facingWidth(F, W_XSD) -> atom_number(W_XSD, W) ; W = none), ' \
+            '(comp_facingHeight(F, H_XSD) -> atom_number(H_XSD, H) ; H = none), ' \
+            '(comp_facingDepth(F, D_XSD) -> atom_number(D_XSD, D) ; D = none), ' \
+            '(triple(F, shop:leftSeparator, L) -> true ; L = none), ' \
+            '(triple(F, shop:rightSeparator, R) -> true ; R = none), ' \
+            '(shelf_facing_product_type(F, P) -> true ; P = none)), Fs).'.format(shelf_layer_id)
+        schema = {'Fs': rows(iri, optional_float, optional_float, optional_float, optional_iri, optional_iri,
+                             optional_iri)}
+        solution = self.once(q, read_only=True, schema=schema)
+        table = OrderedDict()
+        if solution:
+            for row in solution['Fs']:
+                table[row[0]] = FacingInfo(*row[1:])
+        return table
+
+    def get_facing_info(self, facing_id):
+        """
+        :type facing_id: str
+        :return: row of the facing table of the facing's shelf layer, None if it is not on the layer
+        :rtype: FacingInfo
+        """
+        shelf_layer_id = self.get_shelf_layer_from_facing(facing_id)
+        return self.get_facing_table(shelf_layer_id).get(self.remove_quotes(facing_id))
 
     def get_facing_depth(self, facing_id):
-        q = 'comp_facingDepth(\'{}\', W_XSD),atom_number(W_XSD,W)'.format(facing_id)
-        solutions = self.once(q)
-        if solutions:
-            return solutions['W']
+        facing = self.get_facing_info(facing_id)
+        if facing and not isnan(facing.depth):
+            return facing.depth
         raise Exception('can\'t compute facing depth')
 
     def get_facing_separator(self, facing_id):
-        q = 'triple(\'{}\', shop:leftSeparator, L), triple(\'{}\', shop:rightSeparator, R)'.format(facing_id,
-                                                                                                        facing_id)
-        solutions = self.once(q)
-        if solutions:
-            return solutions['L'].replace('\'', ''), solutions['R'].replace('\'', '')
+        facing = self.get_facing_info(facing_id)
+        if facing and facing.left_separator is not None and facing.right_separator is not None:
+            return facing.left_separator, facing.right_separator
 
     def get_facing_height(self, facing_id):
-        q = 'comp_facingHeight(\'{}\',W_XSD),atom_number(W_XSD,W)'.format(facing_id)
-        solutions = self.once(q)
-        if solutions:
-            return solutions['W']
+        facing = self.get_facing_info(facing_id)
+        if facing and not isnan(facing.height):
+            return facing.height
         raise Exception('can\' compute facing height')
 
     def get_facing_width(self, facing_id):
-        q = 'comp_facingWidth(\'{}\', W_XSD),atom_number(W_XSD,W)'.format(facing_id)
-        solutions = self.once(q)
-        if solutions:
-            return solutions['W']
+        facing = self.get_facing_info(facing_id)
+        if facing and not isnan(facing.width):
+            return facing.width
         raise Exception('can\' compute facing width')
 
     def belief_at_update(self, id, pose):
@@ -356,7 +928,7 @@ class KnowRob(object):
         :type pose: PoseStamped
         """
         q = 'is_at(\'{}\', {})'.format(id, self.pose_to_prolog(pose))
-        return self.once(q)
+        return self.once(q, invalidates=[id])
 
     # def get_objects(self, object_type):
     #     """
@@ -381,8 +953,7 @@ class KnowRob(object):
 
     def get_all_individuals_of(self, object_type):
         q = ' findall(R, instance_of(R, {}), Rs).'.format(object_type)
-        solutions = self.once(q)['Rs']
-        return [self.remove_quotes(solution) for solution in solutions]
+        return self.once(q, read_only=True, schema={'Rs': list_of(iri)})['Rs']
 
     def remove_quotes(self, s):
         return s.replace('\'', '')
@@ -402,12 +973,8 @@ class KnowRob(object):
         :return: the frame_id of an object according to the specifications in our wiki.
         :rtype: str
         """
-        if object_id not in self.perceived_frame_id_map:
-            q = 'object_feature(\'{}\', Feature, dmshop:\'DMShelfPerceptionFeature\'),' \
-                'holds(Feature, knowrob:frameName, FeatureFrame).'.format(
-                    object_id)
-            self.perceived_frame_id_map[object_id] = self.once(q)['FeatureFrame'].replace('\'', '')
-        return self.perceived_frame_id_map[object_id]
+        q = PERCEIVED_FRAME_ID_QUERY.format(object_id)
+        return self.once(q, read_only=True, schema=PERCEIVED_FRAME_ID_SCHEMA)['FeatureFrame']
 
     def get_object_frame_id(self, object_id):
         """
@@ -415,8 +982,77 @@ class KnowRob(object):
         :return: frame_id of the center of mesh.
         :rtype: str
         """
-        q = 'holds(\'{}\', knowrob:frameName, R).'.format(object_id)
-        return self.once(q)['R'].replace('\'', '')
+        q = OBJECT_FRAME_ID_QUERY.format(object_id)
+        return self.once(q, read_only=True, schema=OBJECT_FRAME_ID_SCHEMA)['R']
+
+    def prewarm(self):
+        """
+        Fills the query cache with frame ids, dimensions and the number of tiles of every shelf system, shelf layer
+        and facing, instead of one query per object during the first scan.
+        The metadata is read from ~metadata_cache_dir, if it was saved for the same initial beliefstate and json,
+        otherwise it is queried with a few bulk queries and saved.
+        :return: number of cache entries that were added
+        :rtype: int
+        """
+        start = time()
+        key = None
+        entries = None
+        if self.metadata_cache_dir:
+            metadata_cache = MetadataCache(self.metadata_cache_dir)
+            key = content_key([self.initial_beliefstate, getattr(self, 'path_to_json', None)],
+                              [METADATA_CACHE_VERSION, PERCEIVED_FRAME_ID_QUERY, OBJECT_FRAME_ID_QUERY,
+                               OBJECT_DIMENSIONS_QUERY, SHELF_TYPE_QUERY])
+            if key is not None:
+                entries = metadata_cache.load(key)
+        source = 'metadata cache'
+        if entries is None:
+            source = 'knowrob'
+            entries = self.query_metadata()
+            if key is not None:
+                try:
+                    metadata_cache.save(key, entries)
+                except (IOError, OSError) as e:
+                    rospy.logwarn('failed to save metadata cache: {}'.format(e))
+        for q, solutions in entries.items():
+            self.query_cache.put(q, solutions)
+        self.print_with_prefix('prewarmed {} queries from {} in {:.3f}s'.format(len(entries), source, time() - start))
+        return len(entries)
+
+    def query_metadata(self):
+        """
+        Bulk queries for prewarm.
+        :return: maps the per object query of the lazy getters to its solutions
+        :rtype: dict
+        """
+        shelf_system_ids = [str(x) for x in self.shop_topology.get_shelf_system_ids()]
+        object_ids = [str(x) for x in self.shop_topology.get_all_ids()]
+        entries = {}
+
+        q = 'findall([O, Feature, FeatureFrame], (member(O, {}), ' \
+            'object_feature(O, Feature, dmshop:\'DMShelfPerceptionFeature\'), ' \
+            'holds(Feature, knowrob:frameName, FeatureFrame)), Xs).'.format(object_ids)
+        for object_id, feature, frame_id in self.once(q, read_only=True, cache=False,
+                                                      schema={'Xs': rows(iri, None, iri)})['Xs']:
+            entries[PERCEIVED_FRAME_ID_QUERY.format(object_id)] = [{'Feature': feature, 'FeatureFrame': frame_id}]
+
+        q = 'findall([O, R], (member(O, {}), holds(O, knowrob:frameName, R)), Xs).'.format(object_ids)
+        for object_id, frame_id in self.once(q, read_only=True, cache=False, schema={'Xs': rows(iri, iri)})['Xs']:
+            entries[OBJECT_FRAME_ID_QUERY.format(object_id)] = [{'R': frame_id}]
+
+        q = 'findall([O, D, W, H], (member(O, {}), object_dimensions(O, D, W, H)), Xs).'.format(object_ids)
+        for object_id, depth, width, height in self.once(q, read_only=True, cache=False,
+                                                         schema={'Xs': rows(iri, None, None, None)})['Xs']:
+            entries[OBJECT_DIMENSIONS_QUERY.format(object_id)] = [{'D': depth, 'W': width, 'H': height}]
+
+        q = 'findall([S, Tiles, Heavy, BottomLayerType, LayerType, D, W, H], (member(S, {}), {}), Xs).'.format(
+            shelf_system_ids, SHELF_TYPE_GOAL.format(shelf='S', tile_classes=', '.join(TILE_CLASSES), heavy=SHELF_H))
+        schema = {'Xs': rows(iri, list_of(int), boolean, optional_iri, optional_iri, None, None, None)}
+        for shelf_system_id, tiles, heavy, bottom_layer_type, layer_type, depth, width, height in \
+                self.once(q, read_only=True, cache=False, schema=schema)['Xs']:
+            entries[SHELF_TYPE_QUERY.format(shelf_system_id)] = \
+                [{'Tiles': tiles, 'Heavy': heavy, 'BottomLayerType': bottom_layer_type, 'LayerType': layer_type,
+                  'D': depth, 'W': width, 'H': height}]
+        return entries
 
     # floor
     def add_shelf_layers(self, shelf_system_id, shelf_layer_heights):
@@ -429,20 +1065,33 @@ class KnowRob(object):
         :rtype: bool
         """
         shelf_layer_heights = merge_close_shelf_layers(shelf_layer_heights)
-        for i, height in enumerate(sorted(shelf_layer_heights)):
-            if i == 0:
-                layer_type = self.get_bottom_layer_type(shelf_system_id)
-            else:
-                if 'hack' in self.left_right_dict[shelf_system_id] and self.left_right_dict[shelf_system_id]['hack']:
-                    shelf_layer = self.get_shelf_layer_type(shelf_system_id)
-                    depth_id = shelf_layer.find('DMFloorT') + 8
-                    old_depth = int(shelf_layer[depth_id])
-                    new_depth = old_depth + 1
-                    layer_type = shelf_layer.replace('DMFloorT{}'.format(old_depth), 'DMFloorT{}'.format(new_depth))
-                else:
-                    layer_type = self.get_shelf_layer_type(shelf_system_id)
-            q = 'belief_shelf_part_at(\'{}\', \'{}\', {}, R)'.format(shelf_system_id, layer_type, height)
-            self.once(q)
+        shelf_type = self.get_shelf_type(shelf_system_id)
+        layers = plan_shelf_layers(shelf_layer_heights, shelf_type.bottom_layer_type, shelf_type.layer_type,
+                                   deeper_layers=self.left_right_dict[shelf_system_id].get('hack', False))
+        return self.insert_shelf_layers(shelf_system_id, layers)
+
+    def insert_shelf_layers(self, shelf_system_id, layers):
+        """
+        :param shelf_system_id: layers will be attached to this shelf system.
+        :type shelf_system_id: str
+        :param layers: list of [layer type, height], as returned by plan_shelf_layers
+        :type layers: list
+        :raises Exception: if a layer type is missing, nothing is inserted then
+        :rtype: bool
+        """
+        for layer_type, height in layers:
+            if layer_type is None:
+                raise Exception('Could not identify the layer type at height {} of {}.'.format(height,
+                                                                                             shelf_system_id))
+        if self.bulk_insert_shelf_layers:
+            q = 'forall(member([Type, Height], {}), belief_shelf_part_at(\'{}\', Type, Height, _))'.format(
+                [[str(layer_type), float(height)] for layer_type, height in layers], shelf_system_id)
+            self.once(q, invalidates=(shelf_system_id,) + SHELF_LAYER_TAGS)
+        else:
+            for layer_type, height in layers:
+                q = 'belief_shelf_part_at(\'{}\', \'{}\', {}, R)'.format(shelf_system_id, layer_type, height)
+                self.once(q, invalidates=(shelf_system_id,) + SHELF_LAYER_TAGS)
+        self.shop_topology.update_shelf_system(shelf_system_id)
         return True
 
     def update_shelf_layer_position(self, shelf_layer_id, separators):
@@ -457,7 +1106,8 @@ class KnowRob(object):
             current_floor_pose = lookup_pose(MAP, self.get_object_frame_id(shelf_layer_id))
             current_floor_pose.pose.position.z += new_floor_height - old_p.pose.position.z
             q = 'is_at(\'{}\', {})'.format(shelf_layer_id, self.pose_to_prolog(current_floor_pose))
-            self.once(q)
+            self.once(q, invalidates=[shelf_layer_id])
+            self.shop_topology.update_shelf_system(self.get_shelf_system_from_layer(shelf_layer_id))
 
     def add_separators(self, shelf_layer_id, separators):
         """
@@ -470,7 +1120,7 @@ class KnowRob(object):
         for p in separators:
             q = 'belief_shelf_part_at(\'{}\', {}, {}, _)'.format(shelf_layer_id, SEPARATOR, p.pose.position.x)
             try:
-                self.once(q)
+                self.once(q, invalidates=(shelf_layer_id,) + FACING_TAGS)
             except Exception as e:
                 traceback.print_exc()
                 return False
@@ -484,21 +1134,27 @@ class KnowRob(object):
         :type barcodes: dict
         """
         # TODO check success
+        self.create_unknown_barcodes(barcodes)
         for barcode, p in barcodes.items():
-            if not self.does_DAN_exist(barcode):
-                q = 'create_article_number(dan(\'{}\'),AN), ' \
-                    'create_article_type(AN,[{},{},{}],ProductType).'.format(barcode, 0.4, 0.015, 0.1)
-                r = self.once(q)
             q = 'belief_shelf_barcode_at(\'{}\', {}, dan(\'{}\'), {}, _).'.format(shelf_layer_id, BARCODE,
                                                                                   barcode, p.pose.position.x)
-            self.once(q)
+            self.once(q, invalidates=(shelf_layer_id,) + FACING_TAGS + LABEL_TAGS)
 
     def create_unknown_barcodes(self, barcodes):
-        for barcode, p in barcodes.items():
-            if not self.does_DAN_exist(barcode):
-                q = 'create_article_number(dan(\'{}\'),AN), ' \
-                    'create_article_type(AN,[{},{},{}],ProductType).'.format(barcode, 0.4, 0.015, 0.1)
-                r = self.once(q)
+        """
+        Creates article numbers and types for all barcodes that are not in the dan index with one query.
+        :param barcodes: barcodes as str, dict keys are used as barcodes
+        :type barcodes: iterable
+        """
+        dan_index = self.get_dan_index()
+        unknown_barcodes = [str(barcode) for barcode in barcodes if barcode not in dan_index]
+        if not unknown_barcodes:
+            return
+        q = 'forall(member(DAN, {}), ' \
+            '(create_article_number(dan(DAN),AN), ' \
+            'create_article_type(AN,[{},{},{}],ProductType))).'.format(unknown_barcodes, 0.4, 0.015, 0.1)
+        self.once(q, invalidates=unknown_barcodes + list(ARTICLE_TAGS))
+        dan_index.update(unknown_barcodes)
 
     def add_separators_and_barcodes(self, shelf_layer_id, separators, barcodes):
         t = lookup_transform(self.get_perceived_frame_id(shelf_layer_id), 'map')
@@ -513,19 +1169,109 @@ class KnowRob(object):
         separators_xs = add_edge_separators(separators_xs)
         separators_xs = merge_close_separators(separators_xs)
 
+        # a re-scanned layer still has the parts of the earlier scan
+        old_parts = self.get_shelf_layer_part_ids(shelf_layer_id)
         q = 'bulk_insert_floor(\'{}\', separators({}), labels({}))'.format(shelf_layer_id, separators_xs, barcodes)
-        self.once(q)
-        rospy.sleep(5)
+        self.once(q, invalidates=(shelf_layer_id,) + FACING_TAGS + LABEL_TAGS)
+        self.wait_for_bulk_insert_floor(shelf_layer_id, len(separators_xs) + len(barcodes), old_parts)
         q = 'shelf_facings_mark_dirty(\'{}\')'.format(shelf_layer_id)
-        self.once(q)
+        # reads during the insertion might have cached a partially inserted layer
+        self.once(q, invalidates=(shelf_layer_id,) + FACING_TAGS + LABEL_TAGS)
+        self.shop_topology.update_shelf_layer(shelf_layer_id)
+        return self.last_bulk_insert_wait
 
-    # def assert_confidence(self, facing_id, confidence):
-    #     q = 'tell(holds(\'{}\', knowrob:confidence, \'{}\')).'.format(facing_id, confidence)
-    #     self.once(q)
+    def get_shelf_layer_part_ids(self, shelf_layer_id):
+        """
+        :type shelf_layer_id: str
+        :return: ids of the separators and labels attached to the shelf layer, bypasses the cache
+        :rtype: set
+        """
+        q = 'findall(C, (triple(\'{}\', dul:hasComponent, C), (instance_of(C, {}) ; instance_of(C, {}))), ' \
+            'Cs).'.format(shelf_layer_id, SEPARATOR, BARCODE)
+        solution = self.once(q, read_only=True, cache=False, schema={'Cs': list_of(iri)})
+        if not solution:
+            return set()
+        return set(solution['Cs'])
+
+    def wait_for_bulk_insert_floor(self, shelf_layer_id, num_of_parts, old_parts=(), timeout=None, max_backoff=1.0):
+        """
+        Polls KnowRob with exponential backoff, until all separators and labels inserted by bulk_insert_floor
+        are attached to the shelf layer. bulk_insert_floor may merge or drop parts, so it also counts as finished,
+        once new parts showed up and did not change between two polls.
+        :type shelf_layer_id: str
+        :param num_of_parts: number of separators and labels passed to bulk_insert_floor
+        :type num_of_parts: int
+        :param old_parts: ids of the parts that were attached before the insert, they are not counted
+        :type old_parts: set
+        :param timeout: give up after this many seconds, defaults to ~bulk_insert_timeout
+        :type timeout: float
+        :return: time spent waiting in seconds, also saved in last_bulk_insert_wait
+        :rtype: float
+        """
+        if timeout is None:
+            timeout = self.bulk_insert_timeout
+        old_parts = set(old_parts)
+        start = time()
+        backoff = 0.05
+        last_new_parts = None
+        while True:
+            new_parts = self.get_shelf_layer_part_ids(shelf_layer_id) - old_parts
+            if len(new_parts) >= num_of_parts or (new_parts and new_parts == last_new_parts):
+                break
+            last_new_parts = new_parts
+            remaining = timeout - (time() - start)
+            if remaining <= 0:
+                rospy.logwarn('bulk_insert_floor of {} did not finish within {}s'.format(shelf_layer_id, timeout))
+                break
+            rospy.sleep(min(backoff, remaining))
+            backoff = min(backoff * 2, max_backoff)
+        self.last_bulk_insert_wait = time() - start
+        self.print_with_prefix('waited {:.3f}s for bulk_insert_floor of {}'.format(self.last_bulk_insert_wait,
+                                                                                  shelf_layer_id))
+        return self.last_bulk_insert_wait
+
+    def assert_confidence(self, facing_id, confidence):
+        """
+        :type facing_id: str
+        :param confidence: of the product count of the facing
+        :type confidence: float
+        """
+        self.assert_confidences({facing_id: confidence})
+
+    def assert_confidences(self, confidences):
+        """
+        Stores the confidences of the product counts of several facings with a single query.
+        :param confidences: maps facing id to confidence
+        :type confidences: dict
+        """
+        confidences = [[str(facing_id), float(confidence)] for facing_id, confidence in confidences.items()]
+        if not confidences:
+            return
+        q = 'forall(member([F, C], {}), tell(holds(F, knowrob:confidence, C)))'.format(confidences)
+        self.once(q, invalidates=[facing_id for facing_id, _ in confidences] + list(CONFIDENCE_TAGS))
+
+    def get_confidence(self, facing_id):
+        """
+        :type facing_id: str
+        :return: confidence of the last product count of the facing, None if it was not counted
+        :rtype: float
+        """
+        solution = self.once('holds(\'{}\', knowrob:confidence, C)'.format(facing_id), read_only=True)
+        if solution:
+            return float(solution['C'])
 
     def does_DAN_exist(self, dan):
-        q = 'article_number_of_dan(\'{}\', _)'.format(dan)
-        return self.once(q) == {}
+        return dan in self.get_dan_index()
+
+    def get_dan_index(self):
+        """
+        Local copy of all dans in the belief state. It is filled with one query the first time it is needed
+        and kept up to date by create_unknown_barcodes until the belief state is cleared.
+        :rtype: set
+        """
+        if self.dan_index is None:
+            self.dan_index = set(self.get_all_product_dan())
+        return self.dan_index
 
     def get_all_product_dan(self):
         """
@@ -533,8 +1279,7 @@ class KnowRob(object):
         :rtype: list
         """
         q = 'findall(DAN, triple(AN, shop:dan, DAN), DANS).'
-        dans = self.once(q)['DANS']
-        return dans
+        return self.once(q, read_only=True, schema={'DANS': list_of(string_)})['DANS']
 
     def add_objects(self, facing_id, number):
         """
@@ -542,27 +1287,65 @@ class KnowRob(object):
         :type facing_id: str
         :type number: int
         """
-        for i in range(number):
-            q = 'product_spawn_front_to_back(\'{}\', ObjId)'.format(facing_id)
-            self.once(q)
+        self.add_objects_to_facings({facing_id: number})
+
+    def add_objects_to_facings(self, numbers):
+        """
+        Spawns the products of several facings with a single query.
+        :param numbers: maps facing id to number of objects that will be added to it
+        :type numbers: dict
+        """
+        numbers = [[str(facing_id), int(number)] for facing_id, number in numbers.items() if number > 0]
+        if not numbers:
+            return
+        q = 'forall(member([F, N], {}), forall(between(1, N, _), product_spawn_front_to_back(F, _)))'.format(
+            numbers)
+        self.once(q, invalidates=[facing_id for facing_id, _ in numbers] + list(PRODUCT_TAGS))
 
-    def save_beliefstate(self, path=None):  ### beleifstate.owl might not be created. the data is stored in tripledb
+    def save_beliefstate(self, path=None, wait=False):  ### beleifstate.owl might not be created. the data is stored in tripledb
         """
+        Saves the belief state in the background, queries keep being answered in the meantime, writes wait for it.
         :type path: str
+        :param wait: if True, returns after the belief state was saved
+        :type wait: bool
+        :rtype: refills_perception_interface.beliefstate_persister.SaveJob
         """
-        # pass
         if path is None:
             path = '{}/data/beliefstate.owl'.format(RosPack().get_path('refills_second_review'))
+        job = self.persister.save(path)
+        if wait:
+            job.wait()
+        return job
+
+    def memorize(self, path):
+        """
+        Dumps the belief state to path. Writes wait until the dump is complete, other reads keep being answered,
+        even if a write is waiting. The dump occupies one session of the prolog pool meanwhile.
+        :type path: str
+        :rtype: bool
+        """
         q = 'memorize(\'{}\')'.format(path)
-        self.once(q)
+        return self.once(q, read_only=True, cache=False, timeout=self.beliefstate_timeout, background=True) != []
+
+    def checkpoint(self, event=None):
+        """
+        Saves the belief state to ~checkpoint_dir in the background, if anything was written since the last checkpoint.
+        Only the newest ~max_checkpoints are kept.
+        :rtype: refills_perception_interface.beliefstate_persister.SaveJob
+        """
+        num_of_writes = self.num_of_writes
+        if num_of_writes == self.num_of_writes_at_checkpoint:
+            return None
+        self.num_of_writes_at_checkpoint = num_of_writes
+        return self.persister.checkpoint()
 
     def get_shelf_layer_width(self, shelf_layer_id):
         """
         :type shelf_layer_id: str
         :rtype: float
         """
-        q = 'object_dimensions(\'{}\', D, W, H).'.format(shelf_layer_id)
-        solution = self.once(q)
+        q = OBJECT_DIMENSIONS_QUERY.format(shelf_layer_id)
+        solution = self.once(q, read_only=True)
         if solution:
             width = solution['W']
             return width
@@ -574,31 +1357,25 @@ class KnowRob(object):
         :type shelf_system_id: str
         :rtype: float
         """
-        q = 'object_dimensions(\'{}\', D, W, H).'.format(shelf_system_id)
-        solution = self.once(q)
-        width = solution['W']
-        return width
+        return self.get_shelf_type(shelf_system_id).width
 
     def get_shelf_system_height(self, shelf_system_id):
         """
         :type shelf_system_id: str
         :rtype: float
         """
-        q = 'object_dimensions(\'{}\', D, W, H).'.format(shelf_system_id)
-        solution = self.once(q)
-        height = solution['H']
-        return height
+        return self.get_shelf_type(shelf_system_id).height
 
     def get_all_empty_facings(self):
         q = 'findall(Facing, (has_type(Facing, shop:\'ProductFacingStanding\'),\+holds(Facing, shop:productInFacing,_)),Fs)'
-        solution = self.once(q)
+        solution = self.once(q, read_only=True)
         if solution:
             return solution['Fs']
         return []
 
     def get_empty_facings_from_layer(self, shelf_layer_id):
         q = 'findall(F, (shelf_facing(\'{}\', F), \+holds(F, shop:productInFacing, _)),Fs)'.format(shelf_layer_id)
-        solution = self.once(q)
+        solution = self.once(q, read_only=True)
         if solution:
             return solution['Fs']
         return []
@@ -608,22 +1385,16 @@ class KnowRob(object):
         :type shelf_layer_id: str
         :rtype: str
         """
-        if shelf_layer_id not in self.shelf_system_from_layer:
-            q = 'shelf_layer_frame(\'{}\', Frame).'.format(shelf_layer_id)
-            shelf_system_id = self.once(q)['Frame']
-            self.shelf_system_from_layer[shelf_layer_id] = shelf_system_id
-        return self.shelf_system_from_layer[shelf_layer_id]
+        q = 'shelf_layer_frame(\'{}\', Frame).'.format(shelf_layer_id)
+        return self.once(q, read_only=True, schema={'Frame': iri})['Frame']
 
     def get_shelf_layer_from_facing(self, facing_id):
         """
         :type facing_id: str
         :rtype: str
         """
-        if facing_id not in self.shelf_layer_from_facing:
-            q = 'shelf_facing(Layer, \'{}\').'.format(facing_id)
-            layer_id =  self.once(q)['Layer']
-            self.shelf_layer_from_facing[facing_id] = layer_id
-        return self.shelf_layer_from_facing[facing_id]
+        q = 'shelf_facing(Layer, \'{}\').'.format(facing_id)
+        return self.once(q, read_only=True, schema={'Layer': iri})['Layer']
 
     def get_shelf_layer_above(self, shelf_layer_id):
         """
@@ -632,7 +1403,7 @@ class KnowRob(object):
         :rtype: str
         """
         q = 'shelf_layer_above(\'{}\', Above).'.format(shelf_layer_id)
-        solution = self.once(q)
+        solution = self.once(q, read_only=True, schema={'Above': iri})
         if isinstance(solution, dict):
             return solution['Above']
 
@@ -651,7 +1422,7 @@ class KnowRob(object):
         :rtype: str
         """
         q = 'instance_of(\'{}\', {})'.format(shelf_layer_id, SHELF_BOTTOM_LAYER)
-        return self.once(q) != []
+        return self.once(q, read_only=True) != []
 
     def clear_beliefstate(self, initial_beliefstate=None):
         """
@@ -664,27 +1435,106 @@ class KnowRob(object):
         # Works only if the beliefstate.owl is loaded with namespace beliefstate
         q = 'tripledb:tripledb_graph_drop(' + \
             'beliefstate)'.format(initial_beliefstate)
-        result = self.once(q) != []
-        self.reset_object_state_publisher.call(TriggerRequest())
+        result = self.once(q, timeout=self.beliefstate_timeout) != []
+        self.forget_beliefstate()
+        self.reset_object_state()
         return result
 
+    def reset_object_state(self):
+        """
+        Makes the object state publisher republish all objects, does nothing while replaying a query trace.
+        """
+        if self.reset_object_state_publisher is not None:
+            self.reset_object_state_publisher.call(TriggerRequest())
+
+    def forget_beliefstate(self):
+        """
+        Drops everything that was cached about the belief state, call this when it was replaced.
+        """
+        self.query_cache.clear()
+        self.dan_index = None
+        self.shop_topology.clear()
+
     def reset_beliefstate(self, inital_beliefstate=None):
         """
+        Restores the snapshot of the initial belief state, if there is one,
+        otherwise the initial belief state is loaded from scratch.
+        Restoring the snapshot replaces the entire KnowRob memory, not only the belief state, anything else that
+        was asserted since the snapshot was taken is gone afterwards. Set ~beliefstate_snapshot_dir to an empty
+        string to only reload the belief state.
         :rtype: bool
         """
+        if self.snapshot_of is not None and self.snapshot_of == rospy.get_param('~initial_beliefstate'):
+            return self.restore_beliefstate_snapshot()
         return self.load_initial_beliefstate()
 
     def load_initial_beliefstate(self):
+        start = time()
         self.initial_beliefstate = rospy.get_param('~initial_beliefstate')
+        self.snapshot_of = None
         self.clear_beliefstate(self.initial_beliefstate)
-        if self.start_episode(self.initial_beliefstate):
-            print_with_prefix('loaded initial beliefstate {}'.format(self.initial_beliefstate), self.prefix)
-            self.reset_object_state_publisher.call(TriggerRequest())
+        try:
+            loaded = self.load_owl(self.initial_beliefstate)
+        except Exception as e:
+            rospy.logwarn('error while loading initial beliefstate: {}'.format(e))
+            loaded = False
+        if loaded:
+            print_with_prefix('loaded initial beliefstate {} in {:.3f}s'.format(self.initial_beliefstate,
+                                                                               time() - start), self.prefix)
+            self.take_beliefstate_snapshot()
+            self.shop_topology.build()
+            if self.prewarm_enabled:
+                self.prewarm()
+            self.reset_object_state()
             return True
         else:
             print_with_prefix('error loading initial beliefstate {}'.format(self.initial_beliefstate), self.prefix)
             return False
 
+    def take_beliefstate_snapshot(self):
+        """
+        Dumps the current belief state to ~beliefstate_snapshot_dir, such that reset_beliefstate can restore it
+        instead of loading the initial belief state again.
+        :rtype: bool
+        """
+        if not self.snapshot_dir:
+            return False
+        start = time()
+        if not self.memorize(self.snapshot_dir):
+            rospy.logwarn('failed to save beliefstate snapshot to {}'.format(self.snapshot_dir))
+            return False
+        self.snapshot_of = self.initial_beliefstate
+        print_with_prefix('saved beliefstate snapshot to {} in {:.3f}s'.format(self.snapshot_dir, time() - start),
+                          self.prefix)
+        return True
+
+    def restore_beliefstate_snapshot(self):
+        """
+        Replaces the entire KnowRob memory, not only the belief state, with the snapshot taken by
+        take_beliefstate_snapshot. If that fails, the memory might be empty, so the initial belief state is loaded
+        from scratch instead.
+        :return: whether the snapshot or the initial belief state was loaded
+        :rtype: bool
+        """
+        start = time()
+        q = 'mem_clear_memory, remember(\'{}\')'.format(self.snapshot_dir)
+        try:
+            restored = self.once(q, timeout=self.beliefstate_timeout) != []
+        except Exception as e:
+            rospy.logwarn('error while restoring beliefstate snapshot: {}'.format(e))
+            restored = False
+        self.forget_beliefstate()
+        if not restored:
+            rospy.logwarn('failed to restore beliefstate snapshot, reloading {}'.format(self.snapshot_of))
+            return self.load_initial_beliefstate()
+        print_with_prefix('restored beliefstate snapshot {} in {:.3f}s'.format(self.snapshot_dir, time() - start),
+                          self.prefix)
+        self.shop_topology.build()
+        if self.prewarm_enabled:
+            self.prewarm()
+        self.reset_object_state()
+        return True
+
 
     def load_owl(self, path):
         """
@@ -693,7 +1543,9 @@ class KnowRob(object):
         :rtype: bool
         """
         q = 'tripledb_load(\'{}\')'.format(path+"/beliefstate.owl")
-        return self.once(q) != []
+        result = self.once(q, timeout=self.beliefstate_timeout) != []
+        self.forget_beliefstate()
+        return result
 
     ### NEEM logging ?
    
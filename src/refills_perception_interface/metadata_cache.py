@@ -0,0 +1,82 @@
+import hashlib
+import json
+import os
+
+from refills_perception_interface.utils import print_with_prefix
+
+
+def content_key(paths, extra=()):
+    """
+    Hash of the content of some files, such that a cache entry keyed by it becomes stale, once one of them changes.
+    :param paths: list of file paths
+    :type paths: list
+    :param extra: additional strings that are part of the key, e.g. the queries that produced the cached data
+    :type extra: iterable
+    :return: hex digest or None, if one of the files can't be read
+    :rtype: str
+    """
+    h = hashlib.sha1()
+    for path in paths:
+        try:
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    h.update(chunk)
+        except (IOError, OSError, TypeError):
+            return None
+        h.update(b'\0')
+    for s in extra:
+        h.update(s.encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+class MetadataCache(object):
+    """
+    Stores query solutions on disk, one json file per key.
+    """
+    prefix = 'metadata_cache'
+
+    def __init__(self, directory):
+        """
+        :param directory: created if it does not exist
+        :type directory: str
+        """
+        self.directory = directory
+
+    def get_path(self, key):
+        return os.path.join(self.directory, '{}.json'.format(key))
+
+    def load(self, key):
+        """
+        :type key: str
+        :return: maps query to solutions, None if there is no valid entry for key
+        :rtype: dict
+        """
+        path = self.get_path(key)
+        if not os.path.isfile(path):
+            return None
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+            if data['key'] != key:
+                print_with_prefix('ignoring stale {}'.format(path), self.prefix)
+                return None
+            return data['entries']
+        except (IOError, OSError, ValueError, KeyError, TypeError) as e:
+            print_with_prefix('ignoring broken {}: {}'.format(path, e), self.prefix)
+            return None
+
+    def save(self, key, entries):
+        """
+        :type key: str
+        :param entries: maps query to solutions
+        :type entries: dict
+        """
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        path = self.get_path(key)
+        tmp_path = '{}.tmp'.format(path)
+        with open(tmp_path, 'w') as f:
+            json.dump({'key': key, 'entries': entries}, f)
+        # readers never see a half written file
+        os.rename(tmp_path, path)
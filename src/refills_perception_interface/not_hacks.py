@@ -93,6 +93,29 @@ def merge_close_things(things, threshold):
             return tmp
 
 
+def plan_shelf_layers(shelf_layer_heights, bottom_layer_type, layer_type, deeper_layers=False):
+    """
+    Decides which layer type is added at which height, the lowest layer is a bottom layer.
+    :param shelf_layer_heights: list of floats
+    :type shelf_layer_heights: list
+    :type bottom_layer_type: str
+    :type layer_type: str
+    :param deeper_layers: if True, all layers except the bottom one are one DMFloorT deeper than layer_type
+    :type deeper_layers: bool
+    :return: list of [layer type, height], ordered by height
+    :rtype: list
+    """
+    if deeper_layers and layer_type is not None:
+        depth_id = layer_type.find('DMFloorT') + 8
+        old_depth = int(layer_type[depth_id])
+        new_depth = old_depth + 1
+        layer_type = layer_type.replace('DMFloorT{}'.format(old_depth), 'DMFloorT{}'.format(new_depth))
+    layers = []
+    for i, height in enumerate(sorted(shelf_layer_heights)):
+        layers.append([bottom_layer_type if i == 0 else layer_type, height])
+    return layers
+
+
 def update_shelf_system_pose(knowrob, top_layer_id, separators):
     """
     :type knowrob: refills_perception_interface.knowrob_wrapper.KnowRob
@@ -315,12 +315,13 @@ class Paths(object):
         :type facing_id: str
         :rtype: FullBodyPosture
         """
+        facing_id = self.knowrob.remove_quotes(facing_id)
         shelf_layer_id = self.knowrob.get_shelf_layer_from_facing(facing_id)
         shelf_system_id = self.knowrob.get_shelf_system_from_layer(shelf_layer_id)
         # shelf_system_width = self.knowrob.get_shelf_system_width(shelf_system_id)
         # shelf_system_frame_id = self.knowrob.get_perceived_frame_id(shelf_system_id)
-        shelf_layer_frame_id = self.knowrob.get_perceived_frame_id(shelf_layer_id)
-        facing_frame_id = self.knowrob.get_object_frame_id(facing_id)
+        layer_snapshot = self.knowrob.shop_topology.get_layer_snapshot(shelf_layer_id)
+        shelf_layer_frame_id = layer_snapshot.frame_id
 
         # get height of next layer
         # shelf_layer_above_id = self.knowrob.get_shelf_layer_above(shelf_layer_id)
@@ -340,10 +341,15 @@ class Paths(object):
         goal_angle = radians(-20)
         full_body_pose = self.get_cam_pose(torso_rot_1_height, goal_angle, self.is_left(shelf_system_id))
 
-        facing_pose_on_layer = lookup_pose(shelf_layer_frame_id, facing_frame_id)
+        if facing_id in layer_snapshot.ids:
+            facing_x = float(layer_snapshot.xs[layer_snapshot.ids.index(facing_id)])
+        else:
+            # the snapshot is stale
+            facing_frame_id = self.knowrob.get_object_frame_id(facing_id)
+            facing_x = lookup_pose(shelf_layer_frame_id, facing_frame_id).pose.position.x
 
         # base_pose = self.cam_pose_in_front_of_facing(facing_id, x=0, x_limit=0, goal_angle=goal_angle)
-        base_pose = self.cam_pose_in_front_of_layer(shelf_layer_id, x=facing_pose_on_layer.pose.position.x,
+        base_pose = self.cam_pose_in_front_of_layer(shelf_layer_id, x=facing_x,
                                                     y=-.55,
                                                     goal_angle=goal_angle)
 
@@ -0,0 +1,88 @@
+from __future__ import division
+
+import numpy as np
+
+# scales the median absolute deviation to the standard deviation of normally distributed data
+MAD_TO_STD = 1.4826
+
+
+def pose_to_row(pose):
+    """
+    :type pose: geometry_msgs.msg._PoseStamped.PoseStamped
+    :return: [x, y, z, qx, qy, qz, qw]
+    :rtype: list
+    """
+    position = pose.pose.position
+    orientation = pose.pose.orientation
+    return [position.x, position.y, position.z, orientation.x, orientation.y, orientation.z, orientation.w]
+
+
+def poses_to_array(poses):
+    """
+    :param poses: list of PoseStamped
+    :type poses: list
+    :return: N*7 array of positions and quaternions
+    :rtype: np.ndarray
+    """
+    return np.array([pose_to_row(p) for p in poses], dtype=float).reshape(-1, 7)
+
+
+def inlier_mask(positions, threshold=3.5, min_deviation=0.002):
+    """
+    Rejects positions, whose distance to the median position is more than threshold robust standard deviations above
+    the median distance. The standard deviation is estimated with the median absolute deviation.
+    :param positions: N*3
+    :type positions: np.ndarray
+    :type threshold: float
+    :param min_deviation: lower bound for the estimated standard deviation in meters, such that almost identical
+                            positions are not rejected because of noise below the sensor accuracy.
+    :type min_deviation: float
+    :return: N bools, True for inliers
+    :rtype: np.ndarray
+    """
+    positions = np.asarray(positions, dtype=float)
+    distances = np.linalg.norm(positions - np.median(positions, axis=0), axis=1)
+    median_distance = np.median(distances)
+    deviation = max(MAD_TO_STD * np.median(np.abs(distances - median_distance)), min_deviation)
+    return distances <= median_distance + threshold * deviation
+
+
+def average_quaternion(quaternions, weights=None):
+    """
+    Eigenvector of the largest eigenvalue of sum(w * q * q^T), which ignores the sign ambiguity of quaternions,
+    unlike averaging them component wise.
+    :param quaternions: N*4 in x, y, z, w order
+    :type quaternions: np.ndarray
+    :param weights: N
+    :type weights: np.ndarray
+    :return: normalized quaternion with w >= 0
+    :rtype: np.ndarray
+    """
+    quaternions = np.asarray(quaternions, dtype=float)
+    quaternions = quaternions / np.linalg.norm(quaternions, axis=1)[:, None]
+    if weights is None:
+        m = quaternions.T.dot(quaternions)
+    else:
+        m = (quaternions * np.asarray(weights, dtype=float)[:, None]).T.dot(quaternions)
+    _, eigenvectors = np.linalg.eigh(m)
+    q = eigenvectors[:, -1]
+    if q[3] < 0:
+        q = -q
+    return q
+
+
+def aggregate_poses(poses, threshold=3.5, min_deviation=0.002):
+    """
+    Averages poses after rejecting position outliers with inlier_mask.
+    :param poses: N*7 array as returned by poses_to_array
+    :type poses: np.ndarray
+    :return: the average pose as array of length 7 and the inlier mask
+    :rtype: tuple
+    """
+    poses = np.asarray(poses, dtype=float)
+    if len(poses) == 0:
+        raise ValueError('can\'t aggregate an empty list of poses')
+    inliers = inlier_mask(poses[:, :3], threshold, min_deviation)
+    position = poses[inliers, :3].mean(axis=0)
+    orientation = average_quaternion(poses[inliers, 3:])
+    return np.concatenate((position, orientation)), inliers
@@ -0,0 +1,106 @@
+from collections import namedtuple
+
+# pose as returned by is_at, positions and orientations are tuples of floats
+PrologPose = namedtuple('PrologPose', ['frame_id', 'position', 'orientation'])
+
+
+def iri(value):
+    """
+    Atoms, like object ids, class names and frame ids, come back with quotes.
+    :type value: str
+    :rtype: str
+    """
+    return value.replace('\'', '')
+
+
+def optional_iri(value):
+    """
+    :param value: atom or none
+    :type value: str
+    :rtype: str
+    """
+    if value == 'none':
+        return None
+    return iri(value)
+
+
+def string(value):
+    """
+    Quoted strings, like dans, keep inner quotes.
+    :type value: str
+    :rtype: str
+    """
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in '\'"':
+        return value[1:-1]
+    return value
+
+
+def optional_string(value):
+    """
+    :param value: quoted string or none
+    :type value: str
+    :rtype: str
+    """
+    if value == 'none':
+        return None
+    return string(value)
+
+
+def optional_float(value):
+    """
+    :param value: number or none
+    :return: float, nan for none
+    :rtype: float
+    """
+    if value == 'none':
+        return float('nan')
+    return float(value)
+
+
+def boolean(value):
+    """
+    :param value: true or false atom
+    :rtype: bool
+    """
+    return value == 'true'
+
+
+def pose(value):
+    """
+    :param value: [frame id, child frame id, [x, y, z], [x, y, z, w]]
+    :type value: list
+    :rtype: PrologPose
+    """
+    return PrologPose(iri(value[0]), tuple(value[2]), tuple(value[3]))
+
+
+def list_of(decoder):
+    """
+    :return: decoder for findall results, that applies decoder to every element
+    """
+    return lambda values: [decoder(x) for x in values]
+
+
+def rows(*decoders):
+    """
+    :return: decoder for findall results of lists like [F, P, W], that turns every row into a tuple,
+                whose elements are decoded with the corresponding decoder. None keeps the element as it is.
+    """
+    def decode_rows(values):
+        return [tuple(x if decoder is None else decoder(x) for decoder, x in zip(decoders, row)) for row in values]
+    return decode_rows
+
+
+def decode(solutions, schema):
+    """
+    Decodes the bindings of every solution in place, bindings that are not in the schema are kept as they are.
+    :type solutions: list
+    :param schema: maps variable names to decoders
+    :type schema: dict
+    :rtype: list
+    """
+    for solution in solutions:
+        for var, decoder in schema.items():
+            if var in solution:
+                solution[var] = decoder(solution[var])
+    return solutions
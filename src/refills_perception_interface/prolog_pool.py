@@ -0,0 +1,33 @@
+from Queue import Queue
+from contextlib import contextmanager
+
+
+class PrologPool(object):
+    """
+    Fixed number of rosprolog client sessions, each with its own service connections,
+    such that independent queries can run in parallel.
+    """
+
+    def __init__(self, size, prolog_factory):
+        """
+        :param size: number of sessions
+        :type size: int
+        :param prolog_factory: creates a new session, e.g. rosprolog_client.Prolog
+        """
+        if size < 1:
+            raise ValueError('prolog pool needs at least one session, got {}'.format(size))
+        self.size = size
+        self.sessions = Queue()
+        for i in range(size):
+            self.sessions.put(prolog_factory())
+
+    @contextmanager
+    def session(self):
+        """
+        Blocks until a session is free and returns it to the pool afterwards.
+        """
+        prolog = self.sessions.get()
+        try:
+            yield prolog
+        finally:
+            self.sessions.put(prolog)
@@ -1,5 +1,6 @@
 from multiprocessing import Lock
 import datetime
+import os
 import rospy
 from refills_msgs.msg import FullBodyPosture, JointPosition
 from refills_msgs.srv import QueryShelfSystems, QueryShelfLayers, QueryFacings, QueryDetectShelfLayersPath, \
@@ -44,6 +45,8 @@ class QueryBehavior(MyBahaviour):
                                                              QueryCountProductsPosture,
                                                              self.query_count_products_posture_cb)
         self.query_reset_beliefstate_srv = rospy.Service('~reset_beliefstate', Trigger, self.query_reset_beliefstate)
+        self.query_reload_beliefstate_srv = rospy.Service('~reload_beliefstate', Trigger,
+                                                          self.query_reload_beliefstate)
 
         self.visualization_marker_pub = rospy.Publisher('visualization_marker', Marker, queue_size=10)
 
@@ -80,16 +83,36 @@ class QueryBehavior(MyBahaviour):
         m.action = Marker.DELETEALL
         self.visualization_marker_pub.publish(m)
         rospy.sleep(.3)
+        # every belief state is saved to a new directory in there before it is reset, empty string disables it
+        save_dir = rospy.get_param('~save_beliefstate_before_reset', '')
+        if save_dir:
+            now = datetime.datetime.now()
+            # the reset has to wait for the dump anyway, but other queries are answered in the meantime
+            path = os.path.join(save_dir, 'belief_state_{}'.format(now.strftime('%Y-%m-%d-%H-%M-%S')))
+            if not self.get_knowrob().save_beliefstate(path, wait=True).success:
+                self.get_knowrob().print_with_prefix('failed to save beliefstate before reset')
         try:
             if not self.get_knowrob().stop_episode():
                 rospy.logwarn('failed to stop episode')
-            # now = datetime.datetime.now()
-            # self.get_knowrob().save_beliefstate('/home/arrina/rosout_logs/belief_state_{}-{}-{}-{}-{}-{}.owl'.format(now.year, now.month, now.day, now.hour, now.minute, now.second))
         except Exception as e:
-            self.get_knowrob().print_with_prefix('failed to save beliefstate before reset')
+            self.get_knowrob().print_with_prefix('failed to stop episode before reset')
         r.success = self.get_knowrob().reset_beliefstate()
         return r
 
+    def query_reload_beliefstate(self, req):
+        """
+        Like reset_beliefstate, but loads the initial beliefstate from scratch instead of restoring its snapshot.
+        :type req: std_srvs.srv._Trigger.TriggerRequest
+        :rtype: TriggerResponse
+        """
+        r = TriggerResponse()
+        m = Marker()
+        m.action = Marker.DELETEALL
+        self.visualization_marker_pub.publish(m)
+        rospy.sleep(.3)
+        r.success = self.get_knowrob().load_initial_beliefstate()
+        return r
+
     def query_shelf_systems_cb(self, data):
         """
         :type data: QueryShelfSystemsRequest
@@ -98,7 +121,7 @@ class QueryBehavior(MyBahaviour):
         prefix = 'query_shelf_systems'
         print_with_prefix('called', prefix)
         r = QueryShelfSystemsResponse()
-        r.ids = self.get_knowrob().get_shelf_system_ids()
+        r.ids = self.get_knowrob().shop_topology.get_shelf_system_ids()
         self.wait_for_update()
         return r
 
@@ -110,9 +133,10 @@ class QueryBehavior(MyBahaviour):
         prefix = 'query_shelf_layers'
         print_with_prefix('called', prefix)
         r = QueryShelfLayersResponse()
-        if self.get_knowrob().shelf_system_exists(data.id):
+        shop_topology = self.get_knowrob().shop_topology
+        if shop_topology.shelf_system_exists(data.id):
             r.error = QueryShelfLayersResponse.SUCCESS
-            r.ids = self.get_knowrob().get_shelf_layer_from_system(data.id).keys()
+            r.ids = shop_topology.get_shelf_layer_ids(data.id)
         else:
             print_with_prefix('invalid id', prefix)
             r.error = QueryShelfLayersResponse.INVALID_ID
@@ -127,9 +151,10 @@ class QueryBehavior(MyBahaviour):
         prefix = 'query_facings'
         print_with_prefix('called', prefix)
         r = QueryFacingsResponse()
-        if self.get_knowrob().shelf_layer_exists(data.id):
+        shop_topology = self.get_knowrob().shop_topology
+        if shop_topology.shelf_layer_exists(data.id):
             r.error = QueryFacingsResponse.SUCCESS
-            r.ids = self.get_knowrob().get_facing_ids_from_layer(data.id).keys()
+            r.ids = shop_topology.get_facing_ids(data.id)
         else:
             print_with_prefix('invalid id', prefix)
             r.error = QueryFacingsResponse.INVALID_ID
@@ -0,0 +1,96 @@
+import re
+from collections import defaultdict
+from multiprocessing import Lock
+
+PREDICATE_PATTERN = re.compile(r'([a-z_][a-zA-Z0-9_]*)\(')
+QUOTED_ATOM_PATTERN = re.compile(r'\'([^\']*)\'')
+PREFIXED_NAME_PATTERN = re.compile(r'\b([a-z_][a-zA-Z0-9_]*:(?:[a-zA-Z_][a-zA-Z0-9_]*|\'[^\']*\'))')
+
+
+def query_tags(q):
+    """
+    Everything a cached query result can depend on: the names of the predicates it calls, every quoted atom
+    (object ids, class names, dans) and every prefixed name like shop:dan or shop:'ShelfLayer', the latter without
+    quotes.
+    :type q: str
+    :rtype: set
+    """
+    tags = set(PREDICATE_PATTERN.findall(q))
+    tags.update(QUOTED_ATOM_PATTERN.findall(q))
+    tags.update(name.replace('\'', '') for name in PREFIXED_NAME_PATTERN.findall(q))
+    return tags
+
+
+class QueryCache(object):
+    """
+    Maps read-only Prolog queries to their solutions.
+    Entries are indexed by the tags of their query, such that writes to the belief state can evict exactly the
+    entries that mention the objects, predicates or properties they touch.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.entries = {}
+        self.tag_index = defaultdict(set)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, q):
+        """
+        :type q: str
+        :return: (True, solutions) on a hit, (False, None) on a miss
+        :rtype: tuple
+        """
+        with self.lock:
+            if q in self.entries:
+                self.hits += 1
+                return True, self.entries[q]
+            self.misses += 1
+            return False, None
+
+    def put(self, q, solutions):
+        """
+        :type q: str
+        :type solutions: list
+        """
+        with self.lock:
+            self.entries[q] = solutions
+            for tag in query_tags(q):
+                self.tag_index[tag].add(q)
+
+    def invalidate(self, *tags):
+        """
+        Removes all entries whose query mentions at least one of the tags.
+        :return: number of evicted entries
+        :rtype: int
+        """
+        with self.lock:
+            stale = set()
+            for tag in tags:
+                stale.update(self.tag_index.pop(tag, ()))
+            for q in stale:
+                self.entries.pop(q, None)
+                for tag in query_tags(q):
+                    if tag in self.tag_index:
+                        self.tag_index[tag].discard(q)
+            return len(stale)
+
+    def clear(self):
+        with self.lock:
+            self.entries = {}
+            self.tag_index = defaultdict(set)
+
+    def reset_stats(self):
+        with self.lock:
+            self.hits = 0
+            self.misses = 0
+
+    def get_stats(self):
+        """
+        :return: hits, misses and size of the cache. Every hit is one Prolog call saved.
+        :rtype: dict
+        """
+        with self.lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'size': len(self.entries)}
@@ -0,0 +1,98 @@
+from collections import deque, OrderedDict
+from multiprocessing import Lock
+
+import numpy as np
+
+from refills_perception_interface.query_cache import PREDICATE_PATTERN
+
+# control and list predicates, that say nothing about what a query does
+META_PREDICATES = {'findall', 'forall', 'once', 'ignore', 'member', 'between', 'length', 'atom_number', 'sort',
+                   'nth0', 'nth1', 'sum_list', 'max_list', 'min_list'}
+PERCENTILES = [50, 95, 99]
+
+
+def query_predicate(q):
+    """
+    Name of the first predicate in a query that is not a control or list predicate,
+    e.g. shelf_facing for 'findall(F, shelf_facing(L, F), Fs)'.
+    :type q: str
+    :rtype: str
+    """
+    predicates = PREDICATE_PATTERN.findall(q)
+    for predicate in predicates:
+        if predicate not in META_PREDICATES:
+            return predicate
+    if predicates:
+        return predicates[0]
+    return q.strip().rstrip('.')
+
+
+def result_size(solutions):
+    """
+    Number of solutions, a solution with list bindings, like the one of a findall, counts as many as its longest list.
+    :type solutions: list
+    :rtype: int
+    """
+    size = 0
+    for solution in solutions:
+        list_lengths = [len(v) for v in solution.values() if isinstance(v, list)]
+        size += max(list_lengths) if list_lengths else 1
+    return size
+
+
+class QueryStats(object):
+    """
+    Rolling latency and result size windows of Prolog queries, grouped by predicate.
+    """
+
+    def __init__(self, window_size=1000):
+        """
+        :param window_size: number of recent queries per predicate the percentiles are computed over
+        :type window_size: int
+        """
+        self.window_size = window_size
+        self.lock = Lock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.latencies = {}
+            self.result_sizes = {}
+            self.counts = {}
+
+    def record(self, q, latency, solutions):
+        """
+        :type q: str
+        :param latency: in seconds
+        :type latency: float
+        :type solutions: list
+        """
+        predicate = query_predicate(q)
+        size = result_size(solutions)
+        with self.lock:
+            if predicate not in self.latencies:
+                self.latencies[predicate] = deque(maxlen=self.window_size)
+                self.result_sizes[predicate] = deque(maxlen=self.window_size)
+                self.counts[predicate] = 0
+            self.latencies[predicate].append(latency)
+            self.result_sizes[predicate].append(size)
+            self.counts[predicate] += 1
+
+    def get_stats(self):
+        """
+        :return: maps predicate to a dict with the total number of calls and p50/p95/p99 of latency in seconds and
+                    result size over the window, predicates with the highest total time come first
+        :rtype: OrderedDict
+        """
+        with self.lock:
+            windows = [(predicate, np.array(self.latencies[predicate]), np.array(self.result_sizes[predicate]),
+                        self.counts[predicate]) for predicate in self.latencies]
+        windows.sort(key=lambda x: x[1].sum(), reverse=True)
+        stats = OrderedDict()
+        for predicate, latencies, sizes, count in windows:
+            stats[predicate] = {'count': count}
+            for name, percentile in zip(PERCENTILES, np.percentile(latencies, PERCENTILES)):
+                stats[predicate]['latency_p{}'.format(name)] = percentile
+            for name, percentile in zip(PERCENTILES, np.percentile(sizes, PERCENTILES)):
+                stats[predicate]['size_p{}'.format(name)] = percentile
+        return stats
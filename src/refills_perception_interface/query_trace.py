@@ -0,0 +1,149 @@
+import gzip
+import json
+from collections import deque, defaultdict
+from multiprocessing import Lock
+from time import sleep
+
+
+class QueryNotInTrace(Exception):
+    pass
+
+
+class TracedQueryError(Exception):
+    pass
+
+
+def open_trace(path, mode):
+    """
+    Traces ending with .gz are compressed.
+    :type path: str
+    :param mode: 'rb' or 'ab'
+    :type mode: str
+    """
+    if path.endswith('.gz'):
+        return gzip.open(path, mode)
+    return open(path, mode)
+
+
+def load_trace(path):
+    """
+    :param path: trace written by QueryTraceRecorder
+    :type path: str
+    :return: list of dicts with q, the query, r, its solutions, t, its latency in seconds and e, the error message of
+                queries that failed
+    :rtype: list
+    """
+    with open_trace(path, 'rb') as f:
+        return [json.loads(line.decode('utf-8')) for line in f if line.strip()]
+
+
+class QueryTraceRecorder(object):
+    """
+    Appends every query with its undecoded solutions and latency as one json line to a trace file.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: appended to, if it exists
+        :type path: str
+        """
+        self.path = path
+        self.lock = Lock()
+        self.file = open_trace(path, 'ab')
+        self.num_of_queries = 0
+
+    def record(self, q, solutions, latency, error=None):
+        """
+        Has to be called before the solutions are modified, e.g. by decoding them.
+        :type q: str
+        :type solutions: list
+        :param latency: in seconds
+        :type latency: float
+        :param error: message, if the query failed
+        :type error: str
+        """
+        entry = {'q': q, 'r': solutions, 't': round(latency, 6)}
+        if error is not None:
+            entry['e'] = error
+        line = json.dumps(entry, separators=(',', ':')) + '\n'
+        with self.lock:
+            self.file.write(line.encode('utf-8'))
+            self.file.flush()
+            self.num_of_queries += 1
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+class ReplayQuery(object):
+    def __init__(self, entry, replay_latency):
+        self.entry = entry
+        self.replay_latency = replay_latency
+
+    def solutions(self):
+        if self.replay_latency:
+            sleep(self.entry['t'])
+        if 'e' in self.entry:
+            raise TracedQueryError(self.entry['e'])
+        for solution in self.entry['r']:
+            yield solution
+
+    def finish(self):
+        pass
+
+
+class ReplayProlog(object):
+    """
+    Drop in replacement for rosprolog_client.Prolog, that answers queries from a trace instead of KnowRob.
+    Every query string has its own fifo of recorded answers, such that the replay does not depend on how
+    queries of different threads were interleaved. Once a fifo is empty, its last answer is repeated.
+    """
+
+    def __init__(self, trace, replay_latency=False):
+        """
+        :param trace: as returned by load_trace
+        :type trace: list
+        :param replay_latency: if True, every answer is delayed by the recorded latency,
+                                otherwise only the Python side overhead is measured.
+        :type replay_latency: bool
+        """
+        self.replay_latency = replay_latency
+        self.lock = Lock()
+        self.answers = defaultdict(deque)
+        for entry in trace:
+            self.answers[entry['q']].append(entry)
+        self.last_answers = {}
+        self.num_of_replayed = 0
+        self.num_of_repeated = 0
+
+    def query(self, q):
+        """
+        :type q: str
+        :rtype: ReplayQuery
+        :raises QueryNotInTrace: if q was never recorded
+        """
+        with self.lock:
+            answers = self.answers.get(q)
+            if answers:
+                entry = answers.popleft()
+                self.last_answers[q] = entry
+            elif q in self.last_answers:
+                entry = self.last_answers[q]
+                self.num_of_repeated += 1
+            else:
+                raise QueryNotInTrace(q)
+            self.num_of_replayed += 1
+        # solutions are decoded in place, don't hand out the recorded ones
+        return ReplayQuery(json.loads(json.dumps(entry)), self.replay_latency)
+
+    def get_stats(self):
+        """
+        :return: dict with the number of replayed queries, how many of them repeated an answer and
+                    the number of recorded answers that were never replayed
+        :rtype: dict
+        """
+        with self.lock:
+            return {'replayed': self.num_of_replayed,
+                    'repeated': self.num_of_repeated,
+                    'unused': sum(len(answers) for answers in self.answers.values())}
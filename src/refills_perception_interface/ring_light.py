@@ -0,0 +1,120 @@
+from threading import Thread, Condition
+from time import time
+
+from refills_perception_interface.utils import print_with_prefix
+
+
+class RingLight(object):
+    """
+    Switches the ring light on a background thread and remembers its state, such that requests that would not
+    change anything don't cause service calls. If idle_timeout is set, the light goes off after it was not
+    requested for that many seconds, except while it is held for a running detection.
+    """
+    prefix = 'ring light'
+
+    def __init__(self, switch, idle_timeout=0.0):
+        """
+        :param switch: called with True or False on the background thread, returns whether that worked
+        :param idle_timeout: in seconds, 0 keeps the light on until it is switched off
+        :type idle_timeout: float
+        """
+        self.switch = switch
+        self.idle_timeout = idle_timeout
+        self.condition = Condition()
+        self.wanted = False
+        # None until the first switch worked, because we don't know in which state the light was left
+        self.state = None
+        self.pending = False
+        self.last_request = time()
+        # number of running detections that need the light, the idle timeout is paused while it is > 0
+        self.holders = 0
+        self.running = True
+        self.thread = Thread(target=self.run, name='ring_light')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def set(self, value=True):
+        """
+        Returns immediately, use wait to block until the light is switched.
+        :type value: bool
+        """
+        with self.condition:
+            if value:
+                self.last_request = time()
+            if self.wanted == value and (self.state == value or self.pending):
+                return
+            self.wanted = value
+            self.pending = True
+            self.condition.notify_all()
+
+    def hold(self):
+        """
+        Switches the light on and keeps it on until release is called, for detections that need it for longer
+        than the idle timeout.
+        """
+        with self.condition:
+            self.holders += 1
+        self.set(True)
+
+    def release(self):
+        """
+        Undoes one hold, the idle timeout starts once no detection holds the light anymore.
+        """
+        with self.condition:
+            self.holders = max(0, self.holders - 1)
+            self.last_request = time()
+            self.condition.notify_all()
+
+    def wait(self, timeout=None):
+        """
+        :param timeout: in seconds, None waits forever
+        :type timeout: float
+        :return: whether the light is in the requested state
+        :rtype: bool
+        """
+        deadline = None if timeout is None else time() + timeout
+        with self.condition:
+            while self.pending and self.running:
+                if deadline is None:
+                    self.condition.wait()
+                else:
+                    remaining = deadline - time()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+            return self.state == self.wanted
+
+    def run(self):
+        with self.condition:
+            while self.running:
+                if self.pending:
+                    value = self.wanted
+                    self.condition.release()
+                    try:
+                        success = self.switch(value)
+                    except Exception as e:
+                        print_with_prefix('failed to switch ring light: {}'.format(e), self.prefix)
+                        success = False
+                    finally:
+                        self.condition.acquire()
+                    self.state = value if success else None
+                    # a new request might have come in while switching
+                    self.pending = self.wanted != value
+                    self.condition.notify_all()
+                    continue
+                timeout = None
+                if self.idle_timeout > 0 and self.state and not self.holders:
+                    timeout = self.last_request + self.idle_timeout - time()
+                    if timeout <= 0:
+                        print_with_prefix('switching off after {}s without request'.format(self.idle_timeout),
+                                          self.prefix)
+                        self.wanted = False
+                        self.pending = True
+                        continue
+                self.condition.wait(timeout)
+
+    def shutdown(self, timeout=None):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        self.thread.join(timeout)
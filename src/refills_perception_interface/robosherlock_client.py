@@ -0,0 +1,139 @@
+from Queue import Queue
+from threading import Thread, Event, current_thread
+
+import rospy
+from rospy import ROSException, ServiceException
+
+from refills_perception_interface.utils import print_with_prefix
+
+
+class RoboSherlockFuture(object):
+    """
+    Result of a call that runs on the RoboSherlockClient thread, behaviors can check done on every tick.
+    """
+
+    def __init__(self):
+        self._done = Event()
+        self._result = None
+        self._exception = None
+
+    def set_result(self, result):
+        self._result = result
+        self._done.set()
+
+    def set_exception(self, exception):
+        self._exception = exception
+        self._done.set()
+
+    def done(self):
+        """
+        :rtype: bool
+        """
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        """
+        :param timeout: in seconds, None waits forever
+        :type timeout: float
+        :raises: the exception of the call, or ROSException if it is not done after timeout
+        """
+        if not self._done.wait(timeout):
+            raise ROSException('robosherlock call did not finish within {}s'.format(timeout))
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+
+def completed_future(function, *args):
+    """
+    Runs function right away, for implementations that don't need a thread.
+    :rtype: RoboSherlockFuture
+    """
+    future = RoboSherlockFuture()
+    try:
+        future.set_result(function(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+class RoboSherlockClient(object):
+    """
+    Keeps one persistent connection to the RoboSherlock query service, instead of connecting for every call,
+    and opens a new one if it breaks.
+    All calls run one after the other on a worker thread, such that they keep their order, whether they were
+    made with call or submit.
+    """
+    prefix = 'robosherlock client'
+
+    def __init__(self, srv_name, srv_type, reconnect_timeout=5.0):
+        """
+        :type srv_name: str
+        :param reconnect_timeout: how long to wait for the service, when the connection broke
+        :type reconnect_timeout: float
+        """
+        self.srv_name = srv_name
+        self.srv_type = srv_type
+        self.reconnect_timeout = reconnect_timeout
+        self.proxy = None
+        self.connect()
+        self.jobs = Queue()
+        self.thread = Thread(target=self.run, name='robosherlock_client')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def connect(self):
+        if self.proxy is not None:
+            self.proxy.close()
+        self.proxy = rospy.ServiceProxy(self.srv_name, self.srv_type, persistent=True)
+
+    def _call(self, req):
+        try:
+            return self.proxy.call(req)
+        except (ServiceException, ROSException) as e:
+            print_with_prefix('connection lost ({}), reconnecting'.format(e), self.prefix)
+            rospy.wait_for_service(self.srv_name, timeout=self.reconnect_timeout)
+            self.connect()
+            return self.proxy.call(req)
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            future, function, args = job
+            try:
+                future.set_result(function(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+    def submit(self, function, *args):
+        """
+        Runs function on the worker thread, it may use call.
+        :rtype: RoboSherlockFuture
+        """
+        future = RoboSherlockFuture()
+        self.jobs.put((future, function, args))
+        return future
+
+    def call_async(self, req):
+        """
+        :type req: robosherlock_msgs.srv.RSQueryServiceRequest
+        :rtype: RoboSherlockFuture
+        """
+        return self.submit(self._call, req)
+
+    def call(self, req):
+        """
+        Blocks until the answer is there.
+        :type req: robosherlock_msgs.srv.RSQueryServiceRequest
+        :rtype: robosherlock_msgs.srv.RSQueryServiceResponse
+        """
+        if current_thread() is self.thread:
+            return self._call(req)
+        return self.call_async(req).result()
+
+    def shutdown(self):
+        self.jobs.put(None)
+        self.thread.join()
+        self.proxy.close()
@@ -1,6 +1,9 @@
 from __future__ import print_function, division
 
 import json
+from collections import OrderedDict, defaultdict
+from time import time
+
 import numpy as np
 
 import rospy
@@ -12,11 +15,16 @@ from rospy_message_converter import message_converter
 from refills_perception_interface.barcode_detection import BarcodeDetector
 from refills_perception_interface.knowrob_wrapper import KnowRob
 from refills_perception_interface.not_hacks import add_bottom_layer_if_not_present
+from refills_perception_interface.pose_aggregation import aggregate_poses, poses_to_array, inlier_mask
+from refills_perception_interface.ring_light import RingLight
+from refills_perception_interface.robosherlock_client import RoboSherlockClient, completed_future
 from refills_perception_interface.separator_detection import SeparatorClustering
 from refills_perception_interface.tfwrapper import transform_pose
 from refills_perception_interface.utils import print_with_prefix, error_with_refix
 
 MAP = 'map'
+# answers whose front area differs more than this fraction from the expected one are rejected
+MAX_FRONT_AREA_ERROR = 0.3
 
 
 class FakeRoboSherlock(object):
@@ -114,6 +122,17 @@ class FakeRoboSherlock(object):
             return 1
         return 0
 
+    def count_products(self, facing_ids):
+        """
+        Like count_product for several facings, the confidences are stored with one query.
+        :type facing_ids: list
+        :return: OrderedDict mapping facing id to (count, confidence)
+        :rtype: OrderedDict
+        """
+        counts = OrderedDict((facing_id, (int(np.random.random() * 2), 0.88)) for facing_id in facing_ids)
+        self.knowrob.assert_confidences({facing_id: confidence for facing_id, (_, confidence) in counts.items()})
+        return counts
+
     def start_detect_shelf_layers(self, shelf_system_id):
         """
         :type shelf_system_id: str
@@ -136,16 +155,71 @@ class FakeRoboSherlock(object):
         detected_shelf_layers = heights
         return add_bottom_layer_if_not_present(detected_shelf_layers.tolist(), shelf_system_id, self.knowrob)
 
-    def see(self, depth, width, height):
+    def see(self, depth, width, height, timeout=None, max_calls=None, tolerance=None):
+        """
+        Like see_with_quality, but only returns the pose.
+        :return: pose in map, None if nothing was seen
+        :rtype: PoseStamped
+        """
+        return self.see_with_quality(depth, width, height, timeout, max_calls, tolerance)[0]
+
+    def see_with_quality(self, depth, width, height, timeout=None, max_calls=None, tolerance=None):
+        """
+        :return: pose in map and quality
+        :rtype: tuple
+        """
         p = PoseStamped()
         p.header.frame_id = 'map'
         p.pose.position = Point(2.7, 1.9, 0.8)
         p.pose.orientation.w = 1
-        return p
+        return p, 1.0
 
     def set_ring_light(self, value=True):
         pass
 
+    def run_async(self, function, *args):
+        """
+        :rtype: refills_perception_interface.robosherlock_client.RoboSherlockFuture
+        """
+        return completed_future(function, *args)
+
+    def get_worker_thread(self):
+        """
+        :return: thread that runs the async calls, None if they run right away
+        :rtype: threading.Thread
+        """
+        return None
+
+    def start_detect_shelf_layers_async(self, shelf_system_id):
+        """
+        :type shelf_system_id: str
+        :rtype: refills_perception_interface.robosherlock_client.RoboSherlockFuture
+        """
+        return self.run_async(self.start_detect_shelf_layers, shelf_system_id)
+
+    def count_product_async(self, facing_id):
+        """
+        :type facing_id: str
+        :return: future of count_product
+        :rtype: refills_perception_interface.robosherlock_client.RoboSherlockFuture
+        """
+        return self.run_async(self.count_product, facing_id)
+
+    def count_products_async(self, facing_ids):
+        """
+        :type facing_ids: list
+        :return: future of count_products
+        :rtype: refills_perception_interface.robosherlock_client.RoboSherlockFuture
+        """
+        return self.run_async(self.count_products, facing_ids)
+
+    def see_async(self, depth, width, height, timeout=None, max_calls=None, tolerance=None):
+        """
+        :return: future of see
+        :rtype: refills_perception_interface.robosherlock_client.RoboSherlockFuture
+        """
+        return self.run_async(self.see, depth, width, height, timeout, max_calls, tolerance)
+
 class RoboSherlock(FakeRoboSherlock):
     def __init__(self, knowrob, name='RoboSherlock', check_camera=True):
         self.check_camera = check_camera
@@ -157,12 +231,35 @@ class RoboSherlock(FakeRoboSherlock):
         self.barcode_detection = BarcodeDetector(knowrob)
 
         self.robosherlock_srv_name = rospy.get_param('~robosherlock_srv_name', '/{}/query'.format(name))
+        # defaults of see
+        self.see_timeout = rospy.get_param('~see_timeout', 10.0)
+        self.see_max_calls = rospy.get_param('~see_max_calls', 20)
+        self.see_tolerance = rospy.get_param('~see_tolerance', 0.005)
+        self.see_min_samples = rospy.get_param('~see_min_samples', 3)
+        # pause before asking again, after RoboSherlock found nothing useful
+        self.see_retry_delay = rospy.get_param('~see_retry_delay', 0.1)
         from iai_ringlight.srv import iai_ringlight_in
         self.ring_light_srv = rospy.ServiceProxy('iai_ringlight_controller', iai_ringlight_in)
+        # seconds without request after which the ring light is switched off, 0 disables it
+        self.ring_light = RingLight(self.switch_ring_light, rospy.get_param('~ring_light_idle_timeout', 0.0))
+        # how long counting waits for the ring light to be switched on
+        self.ring_light_timeout = rospy.get_param('~ring_light_timeout', 1.0)
 
         self.wait_for_robosherlock()
 
     def set_ring_light(self, value=True):
+        """
+        Switches the ring light in the background, nothing happens if it already is in that state.
+        :type value: bool
+        """
+        self.ring_light.set(value)
+
+    def switch_ring_light(self, value):
+        """
+        :type value: bool
+        :return: whether the ring light switch answered
+        :rtype: bool
+        """
         from iai_ringlight.srv import iai_ringlight_inRequest
         rospy.loginfo('calling ring light switch')
         if value:
@@ -175,6 +272,7 @@ class RoboSherlock(FakeRoboSherlock):
         except:
             self.print_with_prefix('ring_light_switch not available')
         self.print_with_prefix('ring light switch returned {}'.format(r))
+        return r is not None
 
     def wait_for_robosherlock(self):
         self.print_with_prefix('waiting for RoboSherlock')
@@ -183,9 +281,20 @@ class RoboSherlock(FakeRoboSherlock):
         except ROSException as e:
             self.error_with_prefix('robosherlock unavailable ({})'.format(self.robosherlock_srv_name))
             raise e
-        self.robosherlock_service = rospy.ServiceProxy(self.robosherlock_srv_name, RSQueryService)
+        self.robosherlock_service = RoboSherlockClient(self.robosherlock_srv_name, RSQueryService,
+                                                       rospy.get_param('~robosherlock_reconnect_timeout', 5.0))
         self.print_with_prefix('connected to RoboSherlock')
 
+    def run_async(self, function, *args):
+        """
+        Runs function on the thread of the RoboSherlock connection, in the order of the calls.
+        :rtype: refills_perception_interface.robosherlock_client.RoboSherlockFuture
+        """
+        return self.robosherlock_service.submit(function, *args)
+
+    def get_worker_thread(self):
+        return self.robosherlock_service.thread
+
     def wait_for_rgb_camera(self):
         if self.check_camera:
             self.rgb_topic = rospy.get_param('~rgb_topic')
@@ -209,22 +318,24 @@ class RoboSherlock(FakeRoboSherlock):
             self.print_with_prefix('realsense camera found')
 
     def start_separator_detection(self, floor_id):
-        self.set_ring_light(True)
+        self.ring_light.hold()
         self.separator_detection.start_listening_separators(floor_id)
 
     def stop_separator_detection(self, frame_id):
+        self.ring_light.release()
         return self.separator_detection.stop_listening()
 
     def start_barcode_detection(self, floor_id):
-        self.set_ring_light(True)
+        self.ring_light.hold()
         self.barcode_detection.start_listening(floor_id)
         pass
 
     def stop_barcode_detection(self, frame_id):
+        self.ring_light.release()
         return self.barcode_detection.stop_listening()
 
     def start_detect_shelf_layers(self, shelf_system_id):
-        self.set_ring_light(True)
+        self.ring_light.hold()
         req = RSQueryServiceRequest()
         q = {"scan":
                  {"type": "shelf",
@@ -254,6 +365,7 @@ class RoboSherlock(FakeRoboSherlock):
         :return: list of shelf layer heights
         :rtype: list
         """
+        self.ring_light.release()
         shelf_frame = self.knowrob.get_perceived_frame_id(shelf_system_id)
         req = RSQueryServiceRequest()
         q = {'scan':
@@ -293,6 +405,7 @@ class RoboSherlock(FakeRoboSherlock):
         req = RSQueryServiceRequest()
         req.query = json.dumps(q)
         rospy.sleep(0.4)
+        self.ring_light.wait(self.ring_light_timeout)
         result = self.robosherlock_service.call(req)
         self.print_with_prefix('received: {}'.format(result))
         count = 0
@@ -309,54 +422,166 @@ class RoboSherlock(FakeRoboSherlock):
         count = max(0, len(result.answer) - 1)
         return count
 
-    def see(self, depth, width, height):
+    def count_products(self, facing_ids):
+        """
+        Counts the products of all facings that are visible from the current posture with one RoboSherlock request
+        per shelf system, instead of one per facing.
+        Every detection has to name the facing it belongs to, like {'source': ..., 'facing': ..., 'confidence': ...}.
+        As in count_product, a facing has one FacingDetection, which carries the confidence, plus one answer for
+        every product. The confidences are stored in KnowRob with one query.
+        :type facing_ids: list
+        :return: OrderedDict mapping facing id to (count, confidence), confidence is 0.01 for facings without
+                    FacingDetection
+        :rtype: OrderedDict
+        """
+        self.set_ring_light(True)
+        facings_of_shelf = OrderedDict()
+        for facing_id in facing_ids:
+            shelf_layer_id = self.knowrob.get_shelf_layer_from_facing(facing_id)
+            shelf_system_id = self.knowrob.get_shelf_system_from_layer(shelf_layer_id)
+            perceived_shelf_frame_id = self.knowrob.get_perceived_frame_id(shelf_system_id)
+            facings_of_shelf.setdefault(perceived_shelf_frame_id, []).append(facing_id)
+        # one pause for all facings, instead of one per facing
+        rospy.sleep(0.4)
+        self.ring_light.wait(self.ring_light_timeout)
+        counts = defaultdict(int)
+        confidences = {}
+        for perceived_shelf_frame_id, facings in facings_of_shelf.items():
+            q = {'detect': {
+                'facings': facings,
+                'location': perceived_shelf_frame_id
+            }}
+            self.print_with_prefix('sending: {}'.format(q))
+            req = RSQueryServiceRequest()
+            req.query = json.dumps(q)
+            result = self.robosherlock_service.call(req)
+            self.print_with_prefix('received: {}'.format(result))
+            for answer in result.answer:
+                try:
+                    detection = json.loads(answer)['rs.annotation.Detection'][0]
+                    facing_id = detection['facing']
+                except (ValueError, KeyError, IndexError, TypeError):
+                    rospy.logerr('can\'t assign answer to a facing: {}'.format(answer))
+                    continue
+                if detection.get('source') == 'FacingDetection':
+                    confidences[facing_id] = detection.get('confidence', 0.01)
+                else:
+                    counts[facing_id] += 1
+        counts = OrderedDict((facing_id, (counts[facing_id], confidences.get(facing_id, 0.01)))
+                             for facing_id in facing_ids)
+        self.knowrob.assert_confidences({facing_id: confidence for facing_id, (_, confidence) in counts.items()})
+        return counts
+
+    def see_with_quality(self, depth, width, height, timeout=None, max_calls=None, tolerance=None):
+        """
+        Asks RoboSherlock for the pose of an object with the given dimensions, until the averaged pose converges,
+        timeout is over or max_calls were made.
+        :param timeout: in seconds, defaults to ~see_timeout
+        :type timeout: float
+        :param max_calls: defaults to ~see_max_calls
+        :type max_calls: int
+        :param tolerance: the pose counts as converged, once the samples without outliers are within this many
+                            meters of their mean and a new sample moves that mean less than this,
+                            defaults to ~see_tolerance
+        :type tolerance: float
+        :return: pose in map and its quality between 0 and 1, which is the fraction of accepted answers times
+                    how close the samples are to the pose relative to tolerance. (None, 0) if nothing was accepted.
+        :rtype: tuple
+        """
+        if timeout is None:
+            timeout = self.see_timeout
+        if max_calls is None:
+            max_calls = self.see_max_calls
+        if tolerance is None:
+            tolerance = self.see_tolerance
         q = {'detect': {'pose': ''}}
         self.print_with_prefix('sending: {}'.format(q))
         req = RSQueryServiceRequest()
         req.query = json.dumps(q)
         rospy.sleep(0.4)
+        deadline = time() + timeout
         objects = []
-        expected_volume = self.volume(depth, width, height)
-        while len(objects) < 5:
+        positions = []
+        estimate = None
+        converged = False
+        num_of_calls = 0
+        while num_of_calls < max_calls and time() < deadline:
             result = self.robosherlock_service.call(req)
-            answers = [json.loads(x) for x in result.answer]
-            if not answers:
-                continue
-            real_object = min(answers, key=lambda x: abs(self.answer_volume(x) - expected_volume))
-            if abs(1-self.answer_front_area(real_object) / (width * height)) > 0.3:#175: # reject if more than x% diff
+            num_of_calls += 1
+            pose = self.best_answer_pose([json.loads(x) for x in result.answer], depth, width, height)
+            if pose is None:
+                rospy.sleep(self.see_retry_delay)
                 continue
-            try:
-                pose = message_converter.convert_dictionary_to_ros_message('geometry_msgs/PoseStamped',
-                                                                           real_object['poses'][0]['pose_stamped'])
-            except:
-                continue
-            pose.pose.position.z += real_object['boundingbox']['dimensions-3D']['height']/2.
             objects.append(pose)
-            self.print_with_prefix('found pose number {}'.format(len(objects)))
-        objects = self.filter_outlier(objects)
-        p = self.avg_pose(objects)
+            positions.append([pose.pose.position.x, pose.pose.position.y, pose.pose.position.z])
+            last_estimate = estimate
+            inliers = np.array(positions)[inlier_mask(positions)]
+            estimate = inliers.mean(axis=0)
+            # unlike the shift of the mean, the spread doesn't shrink just because there are more samples
+            spread = np.median(np.linalg.norm(inliers - estimate, axis=1))
+            if len(inliers) >= max(2, self.see_min_samples) and spread < tolerance and \
+                    np.linalg.norm(estimate - last_estimate) < tolerance:
+                converged = True
+                break
+        self.print_with_prefix('accepted {} of {} answers, converged: {}'.format(len(objects), num_of_calls,
+                                                                                 converged))
+        if not objects:
+            return None, 0.
+        p, inliers = self.avg_pose(objects)
+        spread = np.median(np.linalg.norm(np.array(positions)[inliers] - [p.pose.position.x,
+                                                                            p.pose.position.y,
+                                                                            p.pose.position.z], axis=1))
+        quality = inliers.sum() / num_of_calls * min(1., tolerance / max(spread, 1e-9))
         # p.pose.position.z += depth/2.
-        return transform_pose('map', p)
+        return transform_pose('map', p), quality
+
+    def best_answer_pose(self, answers, depth, width, height):
+        """
+        Scores all answers of one RoboSherlock call at once and picks the one, whose volume is closest to the
+        expected one. Answers without bounding box are skipped.
+        :type answers: list
+        :return: center of the best answer or None, if its front area is too far off or there are no answers
+        :rtype: PoseStamped
+        """
+        valid_answers = []
+        dimensions = []
+        for answer in answers:
+            try:
+                dimensions.append([float(answer['boundingbox']['dimensions-3D'][x])
+                                   for x in ('depth', 'width', 'height')])
+                valid_answers.append(answer)
+            except (KeyError, TypeError, ValueError):
+                continue
+        if not valid_answers:
+            return None
+        answers = valid_answers
+        dimensions = np.array(dimensions)
+        volume_error = np.abs(np.prod(dimensions, axis=1) - self.volume(depth, width, height))
+        front_area_error = np.abs(1 - dimensions[:, 0] * dimensions[:, 1] / (width * height))
+        best = int(np.argmin(volume_error))
+        if front_area_error[best] > MAX_FRONT_AREA_ERROR:
+            return None
+        try:
+            pose = message_converter.convert_dictionary_to_ros_message('geometry_msgs/PoseStamped',
+                                                                       answers[best]['poses'][0]['pose_stamped'])
+        except:
+            return None
+        pose.pose.position.z += dimensions[best, 2] / 2.
+        return pose
 
     def avg_pose(self, poses):
-        avg_position = np.array([np.array([p.pose.position.x,
-                                           p.pose.position.y,
-                                           p.pose.position.z]) for p in poses]).mean(axis=0)
-        avg_orientation = np.array([np.array([p.pose.orientation.x,
-                                              p.pose.orientation.y,
-                                              p.pose.orientation.z,
-                                              p.pose.orientation.w]) for p in poses]).mean(axis=0)
-        avg_orientation = avg_orientation / np.linalg.norm(avg_orientation)
+        """
+        :param poses: list of PoseStamped in the same frame
+        :type poses: list
+        :return: average of the poses without position outliers and a mask of the poses that were used
+        :rtype: tuple
+        """
+        avg_pose, inliers = aggregate_poses(poses_to_array(poses))
         avg = PoseStamped()
         avg.header.frame_id = poses[0].header.frame_id
-        avg.pose.position = Point(*avg_position)
-        avg.pose.orientation = Quaternion(*avg_orientation)
-        return avg
-
-    def filter_outlier(self, objects, threshold=0.0007):
-        positions = np.array([np.array([p.pose.position.x, p.pose.position.y, p.pose.position.z]) for p in objects])
-        avg = positions.mean(axis=0)
-        return [x for i, x in enumerate(objects) if np.linalg.norm(positions[i] - avg) > threshold]
+        avg.pose.position = Point(*avg_pose[:3])
+        avg.pose.orientation = Quaternion(*avg_pose[3:])
+        return avg, inliers
 
     def answer_volume(self, answer):
         return self.volume(answer['boundingbox']['dimensions-3D']['depth'],
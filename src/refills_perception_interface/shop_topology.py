@@ -0,0 +1,176 @@
+from collections import OrderedDict
+from multiprocessing import Lock
+
+from refills_perception_interface.utils import print_with_prefix
+
+
+class ShopTopology(object):
+    """
+    In memory index of shelf systems -> ordered shelf layers -> ordered facings, with perceived frame ids,
+    layer poses in shelf frames and snapshots of the facings of every layer.
+    It is built with a few bulk queries and updated, whenever layers or facings are written to KnowRob,
+    such that the query services don't need any Prolog or tf calls.
+    """
+    prefix = 'shop_topology'
+
+    def __init__(self, knowrob):
+        """
+        :type knowrob: refills_perception_interface.knowrob_wrapper.KnowRob
+        """
+        self.knowrob = knowrob
+        self.lock = Lock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.shelf_system_ids = []
+            # shelf system id -> OrderedDict mapping shelf layer id to PoseStamped in shelf frame
+            self.shelf_layers = {}
+            # shelf layer id -> LayerSnapshot
+            self.facings = {}
+            self.shelf_system_of_layer = {}
+            self.frame_ids = {}
+            self.built = False
+
+    def build(self):
+        """
+        Indexes the whole shop.
+        """
+        shelf_system_ids = self.knowrob.get_shelf_system_ids()
+        frame_ids, all_shelf_layers = self.knowrob.get_all_shelf_layers()
+        all_facings = self.knowrob.get_all_layer_snapshots()
+        with self.lock:
+            self.shelf_system_ids = list(shelf_system_ids)
+            self.shelf_layers = {}
+            self.facings = {}
+            self.shelf_system_of_layer = {}
+            self.frame_ids = frame_ids
+            for shelf_system_id in self.shelf_system_ids:
+                shelf_layers = all_shelf_layers.get(shelf_system_id, OrderedDict())
+                self._set_shelf_layers(shelf_system_id, shelf_layers)
+                for shelf_layer_id in shelf_layers:
+                    if shelf_layer_id in all_facings:
+                        self.facings[shelf_layer_id] = all_facings[shelf_layer_id]
+                    else:
+                        self.facings[shelf_layer_id] = self.knowrob.make_layer_snapshot(
+                            shelf_system_id, self.frame_ids[shelf_layer_id], [])
+            self.built = True
+        print_with_prefix('indexed {} shelf systems, {} shelf layers and {} facings'.format(
+            len(self.shelf_system_ids), len(self.shelf_system_of_layer),
+            sum(len(x.ids) for x in self.facings.values())), self.prefix)
+
+    def _set_shelf_layers(self, shelf_system_id, shelf_layers):
+        for old_shelf_layer_id in self.shelf_layers.get(shelf_system_id, ()):
+            if old_shelf_layer_id not in shelf_layers:
+                self.shelf_system_of_layer.pop(old_shelf_layer_id, None)
+                self.facings.pop(old_shelf_layer_id, None)
+        self.shelf_layers[shelf_system_id] = shelf_layers
+        for shelf_layer_id in shelf_layers:
+            self.shelf_system_of_layer[shelf_layer_id] = shelf_system_id
+
+    def update_shelf_system(self, shelf_system_id):
+        """
+        Re-reads the shelf layers of a shelf system, call this after layers were added.
+        :type shelf_system_id: str
+        """
+        shelf_layers = self.knowrob.get_shelf_layer_from_system(shelf_system_id)
+        frame_ids = {object_id: self.knowrob.get_perceived_frame_id(object_id)
+                     for object_id in [shelf_system_id] + list(shelf_layers.keys())}
+        with self.lock:
+            self._set_shelf_layers(shelf_system_id, shelf_layers)
+            self.frame_ids.update(frame_ids)
+
+    def update_shelf_layer(self, shelf_layer_id):
+        """
+        Re-reads the facings of a shelf layer, call this after separators or labels were added.
+        :type shelf_layer_id: str
+        """
+        snapshot = self.knowrob.get_layer_snapshot(shelf_layer_id)
+        with self.lock:
+            self.facings[shelf_layer_id] = snapshot
+
+    def get_shelf_system_ids(self):
+        """
+        :rtype: list
+        """
+        if not self.built:
+            self.build()
+        with self.lock:
+            return list(self.shelf_system_ids)
+
+    def get_shelf_layer_ids(self, shelf_system_id):
+        """
+        :type shelf_system_id: str
+        :return: shelf layer ids ordered from lowest to highest
+        :rtype: list
+        """
+        if shelf_system_id not in self.shelf_layers:
+            self.update_shelf_system(shelf_system_id)
+        with self.lock:
+            return list(self.shelf_layers[shelf_system_id].keys())
+
+    def get_facing_ids(self, shelf_layer_id):
+        """
+        :type shelf_layer_id: str
+        :return: facing ids ordered from left to right
+        :rtype: list
+        """
+        return list(self.get_layer_snapshot(shelf_layer_id).ids)
+
+    def get_layer_snapshot(self, shelf_layer_id):
+        """
+        :type shelf_layer_id: str
+        :rtype: refills_perception_interface.knowrob_wrapper.LayerSnapshot
+        """
+        if shelf_layer_id not in self.facings:
+            self.update_shelf_layer(shelf_layer_id)
+        with self.lock:
+            return self.facings[shelf_layer_id]
+
+    def get_all_ids(self):
+        """
+        :return: ids of all indexed shelf systems, shelf layers and facings
+        :rtype: list
+        """
+        if not self.built:
+            self.build()
+        with self.lock:
+            return self.shelf_system_ids + list(self.shelf_system_of_layer.keys()) + \
+                   [facing_id for snapshot in self.facings.values() for facing_id in snapshot.ids]
+
+    def get_shelf_layer_pose(self, shelf_layer_id):
+        """
+        :type shelf_layer_id: str
+        :return: pose of the shelf layer in the perceived frame of its shelf system
+        :rtype: PoseStamped
+        """
+        with self.lock:
+            return self.shelf_layers[self.shelf_system_of_layer[shelf_layer_id]][shelf_layer_id]
+
+    def get_frame_id(self, object_id):
+        """
+        :param object_id: shelf system or shelf layer id
+        :type object_id: str
+        :return: perceived frame id
+        :rtype: str
+        """
+        with self.lock:
+            return self.frame_ids[object_id]
+
+    def shelf_system_exists(self, shelf_system_id):
+        """
+        :type shelf_system_id: str
+        :rtype: bool
+        """
+        return shelf_system_id in self.get_shelf_system_ids()
+
+    def shelf_layer_exists(self, shelf_layer_id):
+        """
+        Layers that are not indexed, e.g. because they are too high, are looked up in KnowRob.
+        :type shelf_layer_id: str
+        :rtype: bool
+        """
+        with self.lock:
+            if shelf_layer_id in self.shelf_system_of_layer:
+                return True
+        return self.knowrob.shelf_layer_exists(shelf_layer_id)
@@ -2,7 +2,7 @@ import PyKDL
 import rospy
 from geometry_msgs.msg import PoseStamped, Vector3Stamped, PointStamped, TransformStamped, Pose, Quaternion
 from std_msgs.msg import Header
-from tf.transformations import quaternion_from_matrix
+from tf.transformations import quaternion_from_matrix, quaternion_matrix
 from tf2_geometry_msgs import do_transform_pose, do_transform_vector3, do_transform_point
 from tf2_py._tf2 import ExtrapolationException
 from tf2_ros import Buffer, TransformListener
@@ -109,6 +109,21 @@ def lookup_transform(target_frame, source_frame, time=rospy.Time()):
         return None
 
 
+def transform_positions(positions, transform):
+    """
+    Applies one transform to many positions at once.
+    :param positions: Nx3 array
+    :type positions: np.ndarray
+    :type transform: TransformStamped
+    :return: Nx3 array
+    :rtype: np.ndarray
+    """
+    r = transform.transform.rotation
+    t = transform.transform.translation
+    rotation = quaternion_matrix([r.x, r.y, r.z, r.w])[:3, :3]
+    return np.dot(np.asarray(positions, dtype=float), rotation.T) + np.array([t.x, t.y, t.z])
+
+
 def lookup_pose(target_frame, source_frame):
     """
     :type target_frame: str
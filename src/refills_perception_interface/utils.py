@@ -1,5 +1,6 @@
 from contextlib import contextmanager
 from multiprocessing import Lock
+from threading import Condition
 import PyKDL
 from geometry_msgs.msg import PoseStamped, Pose, Quaternion
 import numpy as np
@@ -24,6 +25,58 @@ class TimeoutLock(object):
     def release(self):
         self._lock.release()
 
+
+class ReadWriteLock(object):
+    """
+    Allows many readers or one writer at a time.
+    Waiting writers block new readers, such that a stream of reads can't starve a write.
+    Background readers are the exception, while one of them holds the lock, new readers are let in even if a writer
+    is waiting, because the writer has to wait for the background reader anyway.
+    """
+    def __init__(self):
+        self._cond = Condition()
+        self._readers = 0
+        self._background_readers = 0
+        self._writing = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self, background=False):
+        """
+        :param background: for long reads, like dumping the belief state, that should not block other reads
+        :type background: bool
+        """
+        with self._cond:
+            while self._writing or (self._waiting_writers > 0 and self._background_readers == 0):
+                self._cond.wait()
+            self._readers += 1
+            if background:
+                self._background_readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if background:
+                    self._background_readers -= 1
+                if self._readers == 0 or background:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writing or self._readers > 0:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
+
 def print_with_prefix(msg, prefix):
     rospy.loginfo('[{}] {}'.format(prefix, msg))
 
@@ -0,0 +1,65 @@
+import os
+from threading import Event
+
+from refills_perception_interface.beliefstate_persister import BeliefStatePersister
+
+
+def memorize(path):
+    os.makedirs(path)
+    return True
+
+
+def test_save(tmpdir):
+    saved = []
+    persister = BeliefStatePersister(lambda path: saved.append(path) or True, str(tmpdir))
+    job = persister.save('a.owl')
+    assert job.wait(5)
+    assert saved == ['a.owl']
+    persister.save('b.owl')
+    # queued saves are done before shutdown returns
+    persister.shutdown(5)
+    assert saved == ['a.owl', 'b.owl']
+
+
+def test_failed_save(tmpdir):
+    def fail(path):
+        raise RuntimeError('knowrob died')
+    persister = BeliefStatePersister(fail, str(tmpdir))
+    assert persister.save('a.owl').wait(5) is False
+    assert persister.checkpoint().wait(5) is False
+    assert len(persister.checkpoints) == 0
+    persister.shutdown(5)
+
+
+def test_checkpoints_are_bounded(tmpdir):
+    checkpoint_dir = str(tmpdir.join('checkpoints'))
+    persister = BeliefStatePersister(memorize, checkpoint_dir, max_checkpoints=2)
+    for _ in range(4):
+        assert persister.checkpoint().wait(5)
+    persister.shutdown(5)
+    assert sorted(os.listdir(checkpoint_dir)) == [os.path.basename(path) for path in persister.checkpoints]
+    assert [os.path.basename(path).split('_')[1] for path in persister.checkpoints] == ['2', '3']
+
+    # existing checkpoints count towards the limit after a restart
+    persister = BeliefStatePersister(memorize, checkpoint_dir, max_checkpoints=2)
+    assert persister.checkpoint().wait(5)
+    persister.shutdown(5)
+    assert [os.path.basename(path).split('_')[1] for path in persister.checkpoints] == ['3', '4']
+    assert len(os.listdir(checkpoint_dir)) == 2
+
+
+def test_pending_checkpoints_are_merged(tmpdir):
+    release = Event()
+
+    def slow_save(path):
+        release.wait(5)
+        return True
+    persister = BeliefStatePersister(slow_save, str(tmpdir))
+    blocking = persister.save('a.owl')
+    first = persister.checkpoint()
+    assert persister.checkpoint() is first
+    release.set()
+    assert blocking.wait(5)
+    assert first.wait(5)
+    assert persister.checkpoint() is not first
+    persister.shutdown(5)
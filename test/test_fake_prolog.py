@@ -0,0 +1,101 @@
+from refills_perception_interface.fake_prolog import FakeProlog, SyntheticShop, TripleStore, normalize
+
+SHELF_SYSTEM = 'dmshop:\'DMShelfFrame\''
+SHELF_FLOOR = 'shop:\'ShelfLayer\''
+SEPARATOR = 'dmshop:\'DMShelfSeparator4Tiles\''
+BARCODE = 'dmshop:\'DMShelfLabel\''
+
+
+def once(prolog, q):
+    solutions = list(prolog.query(q).solutions())
+    if solutions:
+        return solutions[0]
+    return []
+
+
+def shelf_layers(prolog, shelf_system_id):
+    q = 'triple(\'{}\', dul:hasComponent, Floor), ' \
+        'instance_of(Floor, {}), ' \
+        'object_feature_type(Floor, Feature, dmshop:\'DMShelfPerceptionFeature\'),' \
+        'object_frame_name(Feature, FeatureFrame).'.format(shelf_system_id, SHELF_FLOOR)
+    return [solution['Floor'] for solution in prolog.query(q).solutions()]
+
+
+def test_normalize():
+    assert normalize(' findall(R, instance_of(R, dmshop:\'DM Frame\'), Rs).') == \
+           'findall(R,instance_of(R,dmshop:\'DM Frame\'),Rs)'
+
+
+def test_triple_store():
+    store = TripleStore()
+    store.add('a', 'p', 'b')
+    store.add('a', 'p', 'c')
+    store.add('d', 'p', 'b')
+    assert store.objects('a', 'p') == ['b', 'c']
+    assert store.subjects('p', 'b') == ['a', 'd']
+    store.set('a', 'p', 'e')
+    assert store.objects('a', 'p') == ['e']
+    assert store.subjects('p', 'b') == ['d']
+    store.remove_subject('e')
+    assert store.objects('a', 'p') == []
+
+
+def test_synthetic_shop():
+    shop = SyntheticShop(num_of_shelf_systems=3, num_of_layers=4, num_of_facings=5)
+    prolog = FakeProlog(shop)
+    shelf_system_ids = once(prolog, ' findall(R, instance_of(R, {}), Rs).'.format(SHELF_SYSTEM))['Rs']
+    assert shelf_system_ids == shop.shelf_system_ids == list(shop.left_right_dict.keys())
+    layers = shelf_layers(prolog, shelf_system_ids[0])
+    assert len(layers) == 4
+    assert once(prolog, 'instance_of(\'{}\', dmshop:\'DMShelfBFloor\')'.format(layers[0])) == {}
+    assert once(prolog, 'shelf_layer_above(\'{}\', Above).'.format(layers[0]))['Above'] == layers[1]
+    assert once(prolog, 'shelf_layer_above(\'{}\', Above).'.format(layers[-1])) == []
+    q = 'findall([F, P, W], (shelf_facing(\'{}\', F), is_at(F, P), ' \
+        '(comp_facingWidth(F, W_XSD) -> atom_number(W_XSD, W) ; W = none)), Fs).'.format(layers[0])
+    facings = once(prolog, q)['Fs']
+    assert len(facings) == 5
+    assert once(prolog, 'shelf_facing(Layer, \'{}\').'.format(facings[0][0]))['Layer'] == layers[0]
+    assert once(prolog, 'shelf_facing_product_type(\'{}\', P)'.format(facings[0][0]))['P'].endswith('Product_000000')
+
+
+def test_detection_writes():
+    prolog = FakeProlog(SyntheticShop(num_of_shelf_systems=1, detected=False))
+    shelf_system_id = once(prolog, ' findall(R, instance_of(R, {}), Rs).'.format(SHELF_SYSTEM))['Rs'][0]
+    layer_types = [['http://knowrob.org/kb/dm-market.owl#DMBFloorT5W100', 0.15],
+                   ['http://knowrob.org/kb/dm-market.owl#DMFloorT4W100', 0.5]]
+    q = 'forall(member([Type, Height], {}), belief_shelf_part_at(\'{}\', Type, Height, _))'.format(layer_types,
+                                                                                                 shelf_system_id)
+    assert once(prolog, q) == {}
+    layer_id = shelf_layers(prolog, shelf_system_id)[0]
+    q = 'bulk_insert_floor(\'{}\', separators({}), labels({}))'.format(layer_id, [0.0, 0.5, 1.0],
+                                                                       [(0.25, '123456'), (0.75, '654321')])
+    assert once(prolog, q) == {}
+    q = 'findall(C, (triple(\'{}\', dul:hasComponent, C), (instance_of(C, {}) ; instance_of(C, {}))), ' \
+        'Cs).'.format(layer_id, SEPARATOR, BARCODE)
+    assert len(once(prolog, q)['Cs']) == 5
+    q = 'findall(F, (shelf_facing(\'{}\', F), \\+holds(F, shop:productInFacing, _)),Fs)'.format(layer_id)
+    facing_ids = once(prolog, q)['Fs']
+    assert len(facing_ids) == 2
+    q = 'forall(member([F, N], {}), forall(between(1, N, _), product_spawn_front_to_back(F, _)))'.format(
+        [[facing_ids[0], 3]])
+    assert once(prolog, q) == {}
+    q = 'findall(F, (shelf_facing(\'{}\', F), \\+holds(F, shop:productInFacing, _)),Fs)'.format(layer_id)
+    assert once(prolog, q)['Fs'] == facing_ids[1:]
+    q = 'forall(member([F, C], {}), tell(holds(F, knowrob:confidence, C)))'.format([[facing_ids[0], 0.88]])
+    assert once(prolog, q) == {}
+    assert once(prolog, 'holds(\'{}\', knowrob:confidence, C)'.format(facing_ids[0]))['C'] == 0.88
+    assert once(prolog, 'holds(\'{}\', knowrob:confidence, C)'.format(facing_ids[1])) == []
+    assert once(prolog, 'findall(DAN, triple(AN, shop:dan, DAN), DANS).')['DANS'][-2:] == ['\'123456\'',
+                                                                                          '\'654321\'']
+
+
+def test_snapshot():
+    prolog = FakeProlog(SyntheticShop(num_of_shelf_systems=1, detected=False))
+    shelf_system_id = once(prolog, ' findall(R, instance_of(R, {}), Rs).'.format(SHELF_SYSTEM))['Rs'][0]
+    assert once(prolog, 'memorize(\'/tmp/snapshot\')') == {}
+    q = 'belief_shelf_part_at(\'{}\', \'{}\', {}, R)'.format(
+        shelf_system_id, 'http://knowrob.org/kb/dm-market.owl#DMBFloorT5W100', 0.15)
+    assert 'R' in once(prolog, q)
+    assert len(shelf_layers(prolog, shelf_system_id)) == 1
+    assert once(prolog, 'mem_clear_memory, remember(\'/tmp/snapshot\')') == {}
+    assert shelf_layers(prolog, shelf_system_id) == []
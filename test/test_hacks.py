@@ -1,6 +1,7 @@
 from __future__ import division
 
-from refills_perception_interface.not_hacks import add_separator_between_barcodes, merge_close_separators
+from refills_perception_interface.not_hacks import add_separator_between_barcodes, merge_close_separators, \
+    plan_shelf_layers
 
 
 def test_add_separator_between_barcodes1():
@@ -55,3 +56,13 @@ def test_merge_close_separators5():
     separators = [0.0, 0.057, 0.058, 0.1, 0.12, 0.2]
     separators = merge_close_separators(separators)
     assert len(separators) == 4
+
+
+def test_plan_shelf_layers():
+    layers = plan_shelf_layers([1.2, 0.15, 0.6], 'shop#DMFloorT6W100B', 'shop#DMFloorT4W100')
+    assert layers == [['shop#DMFloorT6W100B', 0.15], ['shop#DMFloorT4W100', 0.6], ['shop#DMFloorT4W100', 1.2]]
+
+
+def test_plan_shelf_layers_deeper():
+    layers = plan_shelf_layers([0.15, 0.6], 'shop#DMFloorT6W100B', 'shop#DMFloorT4W100', deeper_layers=True)
+    assert layers == [['shop#DMFloorT6W100B', 0.15], ['shop#DMFloorT5W100', 0.6]]
@@ -0,0 +1,33 @@
+from refills_perception_interface.metadata_cache import MetadataCache, content_key
+
+Q = 'holds(\'http://knowrob.org/kb/shop.owl#ShelfLayer_xyz\', knowrob:frameName, R).'
+
+
+def test_content_key(tmpdir):
+    owl = tmpdir.join('beliefstate.owl')
+    owl.write('<rdf/>')
+    json_file = tmpdir.join('shelves.json')
+    json_file.write('{}')
+    key = content_key([str(owl), str(json_file)], [Q])
+    assert key == content_key([str(owl), str(json_file)], [Q])
+    assert key != content_key([str(owl), str(json_file)], ['other query'])
+    owl.write('<rdf>changed</rdf>')
+    assert key != content_key([str(owl), str(json_file)], [Q])
+    assert content_key([str(tmpdir.join('missing.owl'))]) is None
+    assert content_key([None]) is None
+
+
+def test_save_and_load(tmpdir):
+    cache = MetadataCache(str(tmpdir.join('cache')))
+    assert cache.load('abc') is None
+    cache.save('abc', {Q: [{'R': 'shelf_layer_frame'}]})
+    assert cache.load('abc') == {Q: [{'R': 'shelf_layer_frame'}]}
+    assert cache.load('def') is None
+
+
+def test_broken_file(tmpdir):
+    cache = MetadataCache(str(tmpdir))
+    tmpdir.join('abc.json').write('{"key": "ab')
+    assert cache.load('abc') is None
+    tmpdir.join('abc.json').write('{"key": "def", "entries": {}}')
+    assert cache.load('abc') is None
@@ -20,7 +20,9 @@ from sensor_msgs.msg import JointState
 from std_srvs.srv import Trigger, TriggerRequest
 
 from giskardpy.urdf_object import URDFObject
+from refills_perception_interface.knowrob_wrapper import KnowRob
 from refills_perception_interface.move_base import MoveBase
+from refills_perception_interface.prolog_decoding import iri, list_of
 
 NUM_SHELVES = 4
 NUM_LAYER = 4
@@ -52,6 +54,30 @@ def setup(request, ros):
     return i
 
 
+@pytest.fixture(scope='module')
+def knowrob(ros):
+    """
+    Talks to the same KnowRob as the interface.
+    :rtype: KnowRob
+    """
+    return KnowRob()
+
+
+def get_stored_shelf_layers(knowrob, shelf_system_id):
+    """
+    :type knowrob: KnowRob
+    :type shelf_system_id: str
+    :return: list of (asserted types, height in mm) ordered from lowest to highest
+    :rtype: list
+    """
+    layers = []
+    for floor_id, pose in knowrob.get_shelf_layer_from_system(shelf_system_id).items():
+        q = 'findall(T, triple(\'{}\', rdf:type, T), Ts)'.format(floor_id)
+        types = knowrob.once(q, read_only=True, cache=False, schema={'Ts': list_of(iri)})['Ts']
+        layers.append((sorted(set(types)), int(round(pose.pose.position.z * 1000))))
+    return layers
+
+
 @pytest.fixture()
 def interface_no_move(setup):
     """
@@ -96,6 +122,8 @@ class InterfaceWrapper(object):
 
         self.query_reset_belief_state_srv = rospy.ServiceProxy(DummyInterfaceNodeName + '/reset_beliefstate',
                                                                Trigger)
+        self.query_reload_belief_state_srv = rospy.ServiceProxy(DummyInterfaceNodeName + '/reload_beliefstate',
+                                                                Trigger)
 
         self.query_shelf_detection_path_srv = rospy.ServiceProxy(
             DummyInterfaceNodeName + '/query_detect_shelf_layers_path',
@@ -184,6 +212,9 @@ class InterfaceWrapper(object):
     def query_reset_belief_state(self):
         assert self.query_reset_belief_state_srv.call(TriggerRequest())
 
+    def query_reload_belief_state(self):
+        assert self.query_reload_belief_state_srv.call(TriggerRequest()).success
+
     # -------------------------------------------------------layer------------------------------------------------------
     def query_shelf_layers(self, shelf_id, expected_error=QueryShelfLayersResponse.SUCCESS):
         """
@@ -338,6 +369,29 @@ class TestPerceptionInterface(object):
     def test_finish_perception_no_job(self, interface):
         interface.finish_perception(expected_error=FinishPerceptionResponse.NO_RUNNING_JOB)
 
+    def test_reset_belief_state_faster_than_reload(self, interface):
+        shelf_systems = interface.query_shelf_systems()
+        t = time()
+        interface.query_reload_belief_state()
+        reload_time = time() - t
+        assert shelf_systems == interface.query_shelf_systems()
+        t = time()
+        interface.query_reset_belief_state()
+        reset_time = time() - t
+        assert shelf_systems == interface.query_shelf_systems()
+        print('reload: {:.3f}s, reset from snapshot: {:.3f}s'.format(reload_time, reset_time))
+        assert reset_time < reload_time
+
+    def test_save_belief_state_before_reset(self, interface, tmpdir):
+        rospy.set_param(DummyInterfaceNodeName + '/save_beliefstate_before_reset', str(tmpdir))
+        try:
+            interface.query_reset_belief_state()
+        finally:
+            rospy.delete_param(DummyInterfaceNodeName + '/save_beliefstate_before_reset')
+        dumps = tmpdir.listdir(lambda x: x.basename.startswith('belief_state_'))
+        assert len(dumps) == 1
+        assert dumps[0].listdir()
+
     # -------------------------------------------------------layer------------------------------------------------------
     def test_query_shelf_layers_invalid_id(self, interface):
         interface.query_shelf_layers('', QueryFacingsResponse.INVALID_ID)
@@ -370,6 +424,24 @@ class TestPerceptionInterface(object):
             assert layers == interface.query_shelf_layers(shelf_system_id)
             assert layers == interface.query_shelf_layers(shelf_system_id)
 
+    def test_insert_shelf_layers_bulk(self, interface, knowrob):
+        # bulk insertion has to result in the same layers as inserting them one by one
+        shelf_system_id = interface.query_shelf_systems()[0]
+        shelf_type = knowrob.get_shelf_type(shelf_system_id)
+        layers = [[shelf_type.bottom_layer_type, 0.15], [shelf_type.layer_type, 0.6], [shelf_type.layer_type, 1.0]]
+        stored = {}
+        for bulk in [False, True]:
+            interface.reset()
+            # the interface reset the belief state behind the back of this KnowRob wrapper
+            knowrob.forget_beliefstate()
+            knowrob.bulk_insert_shelf_layers = bulk
+            assert knowrob.insert_shelf_layers(shelf_system_id, layers)
+            stored[bulk] = get_stored_shelf_layers(knowrob, shelf_system_id)
+            assert len(stored[bulk]) == len(layers)
+        interface.reset()
+        # the ids are new after every reset, so only types and heights can be compared
+        assert stored[False] == stored[True]
+
     def test_detect_shelf_layers_without_move(self, interface_no_move):
         shelf_systems = interface_no_move.query_shelf_systems()
         for shelf_system_id in shelf_systems:
@@ -441,7 +513,7 @@ class TestPerceptionInterface(object):
         interface.get_count_products_result(expected_state=GoalStatus.ABORTED,
                                             expected_error=DetectShelfLayersResult.INVALID_ID)
 
-    def test_count_products(self, interface):
+    def test_count_products(self, interface, knowrob):
         shelf_system_ids = interface.query_shelf_systems()
         for shelf_system_id in shelf_system_ids:
             shelf_layers = interface.detect_shelf_layers(shelf_system_id, None)
@@ -449,6 +521,8 @@ class TestPerceptionInterface(object):
                 facings = interface.detect_facings(layer_id, None)
                 for facing_id in facings:
                     interface.count_products(facing_id)
+                    # the confidence of the count is kept in the belief state
+                    assert knowrob.get_confidence(facing_id) is not None
 
     # def test_cancel_count_products(self, interface):
     # FIXME counting can not be canceled atm
@@ -0,0 +1,40 @@
+import numpy as np
+
+from refills_perception_interface.pose_aggregation import aggregate_poses, average_quaternion, inlier_mask
+
+
+def test_inlier_mask():
+    rng = np.random.RandomState(0)
+    positions = np.array([1., 2., 0.8]) + rng.normal(scale=0.003, size=(20, 3))
+    positions[[3, 11]] += [0.2, 0., 0.]
+    mask = inlier_mask(positions)
+    assert not mask[3] and not mask[11]
+    assert mask.sum() == 18
+
+
+def test_identical_positions_are_inliers():
+    assert inlier_mask(np.ones((5, 3))).all()
+    assert inlier_mask(np.ones((1, 3))).all()
+
+
+def test_average_quaternion_ignores_sign():
+    q = np.array([0., 0., np.sin(0.25), np.cos(0.25)])
+    avg = average_quaternion([q, -q, q])
+    assert np.allclose(avg, q)
+    # component wise averaging would end up close to 0
+    assert np.allclose(average_quaternion([q, -q]), q)
+
+
+def test_average_quaternion_weights():
+    a = np.array([0., 0., 0., 1.])
+    b = np.array([0., 0., 1., 0.])
+    assert np.allclose(average_quaternion([a, b], weights=[1., 0.]), a)
+
+
+def test_aggregate_poses():
+    poses = np.zeros((6, 7))
+    poses[:, 6] = 1
+    poses[:, 0] = [1., 1.001, 0.999, 1., 1.002, 3.]
+    avg, inliers = aggregate_poses(poses)
+    assert inliers.tolist() == [True] * 5 + [False]
+    assert np.allclose(avg, [1.0004, 0, 0, 0, 0, 0, 1])
@@ -0,0 +1,33 @@
+from math import isnan
+
+from refills_perception_interface.prolog_decoding import decode, iri, optional_iri, string, optional_string, \
+    optional_float, boolean, pose, list_of, rows
+
+LAYER = '\'http://knowrob.org/kb/shop.owl#ShelfLayer_xyz\''
+
+
+def test_atoms():
+    assert iri(LAYER) == 'http://knowrob.org/kb/shop.owl#ShelfLayer_xyz'
+    assert optional_iri('none') is None
+    assert optional_iri(LAYER) == iri(LAYER)
+    assert string('\'123456\'') == '123456'
+    assert string('"12\'34"') == '12\'34'
+    assert optional_string('none') is None
+    assert boolean('true') and not boolean('false')
+    assert isnan(optional_float('none'))
+    assert optional_float(0.5) == 0.5
+
+
+def test_pose():
+    p = pose(['\'map\'', 'facing', [1, 2, 3], [0, 0, 0, 1]])
+    assert p.frame_id == 'map'
+    assert p.position == (1, 2, 3)
+    assert p.orientation == (0, 0, 0, 1)
+
+
+def test_decode():
+    solutions = [{'Fs': [[LAYER, 0.1, 'none'], [LAYER, 0.2, '\'42\'']], 'Ids': [LAYER], 'X': 'raw'}]
+    decode(solutions, {'Fs': rows(iri, None, optional_string), 'Ids': list_of(iri), 'Missing': iri})
+    assert solutions[0]['Fs'] == [(iri(LAYER), 0.1, None), (iri(LAYER), 0.2, '42')]
+    assert solutions[0]['Ids'] == [iri(LAYER)]
+    assert solutions[0]['X'] == 'raw'
@@ -0,0 +1,63 @@
+from refills_perception_interface.query_cache import QueryCache, query_tags
+
+FACING = 'http://knowrob.org/kb/shop.owl#ProductFacingStanding_abc'
+LAYER = 'http://knowrob.org/kb/shop.owl#ShelfLayer_xyz'
+
+
+def test_query_tags():
+    q = 'findall(F, (shelf_facing(\'{}\', F), \\+holds(F, shop:productInFacing, _)),Fs)'.format(LAYER)
+    tags = query_tags(q)
+    assert LAYER in tags
+    assert 'shelf_facing' in tags
+    assert 'holds' in tags
+    assert 'shop:productInFacing' in tags
+
+
+def test_query_tags_of_quoted_prefixed_names():
+    tags = query_tags('findall(L, instance_of(L, shop:\'ShelfLayer\'), Ls)')
+    assert 'shop:ShelfLayer' in tags
+    assert 'ShelfLayer' in tags
+
+
+def test_hit_and_miss():
+    cache = QueryCache()
+    q = 'comp_facingWidth(\'{}\', W_XSD),atom_number(W_XSD,W)'.format(FACING)
+    assert cache.get(q) == (False, None)
+    cache.put(q, [{'W': 0.1}])
+    assert cache.get(q) == (True, [{'W': 0.1}])
+    stats = cache.get_stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+    assert stats['size'] == 1
+
+
+def test_invalidate_by_object():
+    cache = QueryCache()
+    q1 = 'comp_facingWidth(\'{}\', W_XSD),atom_number(W_XSD,W)'.format(FACING)
+    q2 = 'shelf_layer_frame(\'{}\', Frame).'.format(LAYER)
+    cache.put(q1, [{'W': 0.1}])
+    cache.put(q2, [{'Frame': 'shelf'}])
+    assert cache.invalidate(FACING) == 1
+    assert cache.get(q1) == (False, None)
+    assert cache.get(q2) == (True, [{'Frame': 'shelf'}])
+
+
+def test_invalidate_by_property():
+    cache = QueryCache()
+    q1 = 'findall(DAN, triple(AN, shop:dan, DAN), DANS).'
+    q2 = 'article_number_of_dan(\'123456\', _)'
+    q3 = 'article_number_of_dan(\'654321\', _)'
+    cache.put(q1, [{'DANS': []}])
+    cache.put(q2, [])
+    cache.put(q3, [])
+    assert cache.invalidate('123456', 'shop:dan') == 2
+    assert cache.get(q3) == (True, [])
+    assert cache.get_stats()['size'] == 1
+
+
+def test_clear():
+    cache = QueryCache()
+    cache.put('shelf_facing(L, \'{}\').'.format(FACING), [{'L': LAYER}])
+    cache.clear()
+    assert cache.get_stats()['size'] == 0
+    assert cache.invalidate(FACING) == 0
@@ -0,0 +1,39 @@
+from refills_perception_interface.query_stats import QueryStats, query_predicate, result_size
+
+LAYER = 'http://knowrob.org/kb/shop.owl#ShelfLayer_xyz'
+
+
+def test_query_predicate():
+    assert query_predicate('findall(F, shelf_facing(\'{}\', F), Fs)'.format(LAYER)) == 'shelf_facing'
+    assert query_predicate('object_dimensions(\'{}\', D, W, H).'.format(LAYER)) == 'object_dimensions'
+    assert query_predicate('findall(X, member(X, [1,2]), Xs)') == 'findall'
+    assert query_predicate('true.') == 'true'
+
+
+def test_result_size():
+    assert result_size([]) == 0
+    assert result_size([{}]) == 1
+    assert result_size([{'A': 1}, {'A': 2}]) == 2
+    assert result_size([{'Fs': ['a', 'b', 'c'], 'N': 3}]) == 3
+
+
+def test_percentiles():
+    stats = QueryStats()
+    for i in range(100):
+        stats.record('shelf_layer_frame(\'{}\', F).'.format(LAYER), (i + 1) / 1000., [{'F': 'frame'}])
+    stats.record('findall(F, shelf_facing(\'{}\', F), Fs)'.format(LAYER), 1, [{'Fs': ['a', 'b']}])
+    s = stats.get_stats()
+    assert list(s.keys()) == ['shelf_layer_frame', 'shelf_facing']
+    assert s['shelf_layer_frame']['count'] == 100
+    assert abs(s['shelf_layer_frame']['latency_p50'] - 0.0505) < 1e-6
+    assert abs(s['shelf_layer_frame']['latency_p99'] - 0.09901) < 1e-6
+    assert s['shelf_facing']['size_p50'] == 2
+
+
+def test_window():
+    stats = QueryStats(window_size=10)
+    for i in range(20):
+        stats.record('is_at(A, B)', i, [])
+    s = stats.get_stats()['is_at']
+    assert s['count'] == 20
+    assert s['latency_p50'] == 14.5
@@ -0,0 +1,46 @@
+import pytest
+
+from refills_perception_interface.query_trace import QueryTraceRecorder, ReplayProlog, load_trace, QueryNotInTrace, \
+    TracedQueryError
+
+Q = 'shelf_facing(\'layer\', F).'
+
+
+@pytest.fixture(params=['trace.jsonl', 'trace.jsonl.gz'])
+def trace_path(request, tmpdir):
+    return str(tmpdir.join(request.param))
+
+
+def record(path):
+    recorder = QueryTraceRecorder(path)
+    recorder.record(Q, [{'F': '\'facing1\''}], 0.01)
+    recorder.record('true.', [{}], 0.001)
+    recorder.record(Q, [{'F': '\'facing2\''}], 0.02)
+    recorder.record('fail_hard.', [], 0.001, 'existence error')
+    recorder.close()
+
+
+def test_record_and_load(trace_path):
+    record(trace_path)
+    trace = load_trace(trace_path)
+    assert [entry['q'] for entry in trace] == [Q, 'true.', Q, 'fail_hard.']
+    assert trace[0]['r'] == [{'F': '\'facing1\''}]
+    assert trace[2]['t'] == 0.02
+    assert trace[3]['e'] == 'existence error'
+
+
+def test_replay_fifo_per_query(trace_path):
+    record(trace_path)
+    prolog = ReplayProlog(load_trace(trace_path))
+    assert list(prolog.query('true.').solutions()) == [{}]
+    assert list(prolog.query(Q).solutions()) == [{'F': '\'facing1\''}]
+    solutions = list(prolog.query(Q).solutions())
+    assert solutions == [{'F': '\'facing2\''}]
+    solutions[0]['F'] = 'decoded'
+    # once the fifo is empty, the last answer is repeated
+    assert list(prolog.query(Q).solutions()) == [{'F': '\'facing2\''}]
+    with pytest.raises(TracedQueryError):
+        list(prolog.query('fail_hard.').solutions())
+    with pytest.raises(QueryNotInTrace):
+        prolog.query('unknown.')
+    assert prolog.get_stats() == {'replayed': 5, 'repeated': 1, 'unused': 0}
@@ -0,0 +1,83 @@
+from threading import Event
+from time import sleep
+
+from refills_perception_interface.ring_light import RingLight
+
+
+def test_redundant_requests_are_skipped():
+    calls = []
+    ring_light = RingLight(lambda value: calls.append(value) or True)
+    for _ in range(5):
+        ring_light.set(True)
+        assert ring_light.wait(5)
+    ring_light.set(False)
+    assert ring_light.wait(5)
+    ring_light.set(False)
+    assert ring_light.wait(5)
+    ring_light.shutdown(5)
+    assert calls == [True, False]
+
+
+def test_set_does_not_block():
+    release = Event()
+    calls = []
+
+    def slow_switch(value):
+        release.wait(5)
+        calls.append(value)
+        return True
+    ring_light = RingLight(slow_switch)
+    ring_light.set(True)
+    assert not ring_light.wait(0.01)
+    ring_light.set(False)
+    ring_light.set(True)
+    release.set()
+    assert ring_light.wait(5)
+    ring_light.shutdown(5)
+    assert calls[-1] is True
+    assert ring_light.state is True
+
+
+def test_failed_switch_is_retried_on_next_request():
+    results = [False, True]
+    calls = []
+
+    def switch(value):
+        calls.append(value)
+        return results.pop(0)
+    ring_light = RingLight(switch)
+    ring_light.set(True)
+    assert not ring_light.wait(5)
+    ring_light.set(True)
+    assert ring_light.wait(5)
+    ring_light.shutdown(5)
+    assert calls == [True, True]
+
+
+def test_idle_timeout():
+    calls = []
+    ring_light = RingLight(lambda value: calls.append(value) or True, idle_timeout=0.05)
+    ring_light.set(True)
+    assert ring_light.wait(5)
+    for _ in range(100):
+        if ring_light.state is False:
+            break
+        sleep(0.01)
+    ring_light.shutdown(5)
+    assert calls == [True, False]
+
+
+def test_held_light_stays_on():
+    calls = []
+    ring_light = RingLight(lambda value: calls.append(value) or True, idle_timeout=0.02)
+    ring_light.hold()
+    assert ring_light.wait(5)
+    sleep(0.1)
+    assert ring_light.state is True
+    ring_light.release()
+    for _ in range(100):
+        if ring_light.state is False:
+            break
+        sleep(0.01)
+    ring_light.shutdown(5)
+    assert calls == [True, False]
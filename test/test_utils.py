@@ -0,0 +1,85 @@
+from threading import Thread, Event
+from time import sleep
+
+from refills_perception_interface.utils import ReadWriteLock
+
+
+def test_read_write_lock_parallel_readers():
+    lock = ReadWriteLock()
+    with lock.read():
+        got_second_read = Event()
+
+        def reader():
+            with lock.read():
+                got_second_read.set()
+
+        t = Thread(target=reader)
+        t.start()
+        assert got_second_read.wait(1)
+        t.join()
+
+
+def test_read_write_lock_writer_waits_for_readers():
+    lock = ReadWriteLock()
+    log = []
+
+    def writer():
+        with lock.write():
+            log.append('write')
+
+    with lock.read():
+        t = Thread(target=writer)
+        t.start()
+        sleep(0.1)
+        log.append('read')
+    t.join()
+    assert log == ['read', 'write']
+
+
+def test_read_write_lock_waiting_writer_blocks_new_readers():
+    lock = ReadWriteLock()
+    log = []
+
+    def writer():
+        with lock.write():
+            log.append('write')
+
+    def reader():
+        with lock.read():
+            log.append('read2')
+
+    with lock.read():
+        w = Thread(target=writer)
+        w.start()
+        sleep(0.1)
+        r = Thread(target=reader)
+        r.start()
+        sleep(0.1)
+        log.append('read1')
+    w.join()
+    r.join()
+    assert log == ['read1', 'write', 'read2']
+
+
+def test_read_write_lock_background_reader_lets_readers_pass_waiting_writer():
+    lock = ReadWriteLock()
+    log = []
+
+    def writer():
+        with lock.write():
+            log.append('write')
+
+    def reader():
+        with lock.read():
+            log.append('read')
+
+    with lock.read(background=True):
+        w = Thread(target=writer)
+        w.start()
+        sleep(0.1)
+        r = Thread(target=reader)
+        r.start()
+        r.join(1)
+        log.append('background read')
+    w.join()
+    assert log == ['read', 'background read', 'write']